@@ -0,0 +1,39 @@
+from rest_framework import serializers
+
+from thesis.models import Thesis
+
+
+class RecommendedAuthorSerializer(serializers.Serializer):
+    name = serializers.CharField(allow_null=True, required=False)
+
+
+class RecommendedPaperSerializer(serializers.Serializer):
+    """Shape of a paper returned by the Semantic Scholar recommendations endpoint."""
+    paperId = serializers.CharField(allow_null=True, required=False)
+    title = serializers.CharField(allow_null=True, required=False)
+    year = serializers.IntegerField(allow_null=True, required=False)
+    abstract = serializers.CharField(allow_null=True, required=False)
+    authors = RecommendedAuthorSerializer(many=True, required=False)
+
+
+class ThesisSerializer(serializers.ModelSerializer):
+    college = serializers.CharField(source='college.college_name', read_only=True)
+    program = serializers.CharField(source='program.prog_name', read_only=True)
+    tags = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
+
+    class Meta:
+        model = Thesis
+        fields = [
+            'id',
+            'title',
+            'authors',
+            'adviser',
+            'abstract',
+            'year_submitted',
+            'college',
+            'program',
+            'tags',
+            'panel_score',
+            'view_count',
+            'date_added',
+        ]
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from api import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('theses/', views.ThesisListView.as_view(), name='thesis_list'),
+    path('metrics/', views.RequestMetricsView.as_view(), name='metrics'),
+    path('theses/<int:pk>/recommendations/', views.thesis_recommendations, name='thesis_recommendations'),
+]
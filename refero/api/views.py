@@ -1,3 +1,60 @@
-from django.shortcuts import render
+from django.http import Http404, JsonResponse
+from rest_framework import authentication, generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from api.pagination import ThesisCursorPagination
+from api.serializers import RecommendedPaperSerializer, ThesisSerializer
+from thesis import metrics, tag_postings
+from thesis.tag_postings import TagFilter
+from thesis.models import Thesis
+from thesis.semantic_scholar import aget_thesis_recommendations
+
+
+async def thesis_recommendations(request, pk):
+    """
+    Semantic Scholar recommendations for one thesis, loaded by the detail page after render.
+
+    This is a native async view: under ASGI (refero/asgi.py) the upstream calls run on
+    the event loop instead of blocking a worker thread. DRF's APIView is sync-only, so
+    we only borrow its serializer to shape the payload.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    thesis = await Thesis.objects.filter(pk=pk).values('title', 'ss_paper_id').afirst()
+    if thesis is None:
+        raise Http404("No Thesis matches the given query.")
+
+    papers = await aget_thesis_recommendations(thesis['title'], thesis['ss_paper_id'])
+    serializer = RecommendedPaperSerializer(papers, many=True)
+    return JsonResponse({'results': serializer.data})
+
+
+class ThesisListView(generics.ListAPIView):
+    """
+    Newest-first thesis listing, paginated by cursor. Supports the same tag
+    filters as the theses page: repeated ``tag`` parameters must all match (or
+    any of them with ``match=any``) and ``exclude_tag`` removes theses.
+    """
+    serializer_class = ThesisSerializer
+    pagination_class = ThesisCursorPagination
+    authentication_classes = [authentication.SessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Thesis.objects.select_related('college', 'program').prefetch_related('tags')
+        tag_filter = TagFilter.from_params(self.request.query_params)
+        if tag_filter:
+            queryset = queryset.filter(tag_filter.q(tag_postings.snapshot()))
+        return queryset
+
+
+class RequestMetricsView(APIView):
+    """Per-view query counts and latencies recorded by RequestMetricsMiddleware in this process."""
+    authentication_classes = [authentication.SessionAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'anymail',
     'rest_framework',
     'refero',
+    'api',
     'widget_tweaks',
     'django.contrib.sites',
     'allauth',
@@ -68,6 +69,7 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 MIDDLEWARE = [
+    'thesis.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +92,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'thesis.context_processors.site_stats',
             ],
         },
     },
@@ -109,6 +112,39 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Database-backed so cached entries survive restarts and are shared by every
+# worker. Create the table once with `python manage.py createcachetable`.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'refero_cache',
+        # Django culls a database cache past MAX_ENTRIES (300 by default) in key order, not by
+        # age, so it is sized for a few Semantic Scholar entries per thesis in a large catalog.
+        # Past the limit, one tenth of the rows go instead of a third.
+        'OPTIONS': {'MAX_ENTRIES': 200000, 'CULL_FREQUENCY': 10},
+    },
+    # In-memory indexes shared by every worker (thesis/tag_postings.py, thesis/autocomplete.py).
+    # A few large rows in their own table, so churn in the default cache never culls them.
+    'indexes': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'refero_index_cache',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    # Rendered thesis cards (thesis/fragments.py). Keys change whenever a thesis does, so
+    # a per-process cache never serves stale HTML; it just warms up separately in each worker.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'thesis-fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -182,14 +218,43 @@ ACCOUNT_SIGNUP_FIELDS = [
 "password2*",
 ]
 
-EMAIL_BACKEND = "anymail.backends.sendgrid.EmailBackend"
+# Emails are queued in the outbox table and sent by `python manage.py run_worker` (thesis/outbox.py).
+EMAIL_BACKEND = "thesis.outbox.OutboxBackend"
+
+EMAIL_OUTBOX = {
+    # The backend the worker delivers with. For local testing use
+    # "django.core.mail.backends.console.EmailBackend" or ".filebased.EmailBackend" (writes to EMAIL_FILE_PATH).
+    "BACKEND": os.getenv("EMAIL_DELIVERY_BACKEND", "anymail.backends.sendgrid.EmailBackend"),
+    # Messages claimed and sent over one connection per batch.
+    "BATCH_SIZE": 50,
+    # Tries before a message is marked dead, with exponential backoff (seconds) in between.
+    "MAX_ATTEMPTS": 6,
+    "BACKOFF_BASE": 30,
+    "BACKOFF_MAX": 60 * 60,
+    # Messages still "sending" after this many seconds are assumed orphaned by a crashed worker.
+    "STALE_AFTER": 10 * 60,
+    # Sent messages are deleted after this many seconds.
+    "KEEP_SENT": 7 * 24 * 60 * 60,
+}
+
+EMAIL_FILE_PATH = BASE_DIR / "sent_emails"
 
 ANYMAIL = {
     "SENDGRID_API_KEY": os.environ.get('SENDGRID_API_KEY'),
 }
 
 SEMANTIC_SCHOLAR_CONFIG = {
-    "API_KEY": os.environ.get("SEMANTIC_SCHOLAR_API_KEY")
+    "API_KEY": os.environ.get("SEMANTIC_SCHOLAR_API_KEY"),
+    # HTTP client: per-request timeout (seconds), retries on 429/5xx and connection pool size.
+    "TIMEOUT": 10,
+    "RETRIES": 3,
+    "POOL_SIZE": 10,
+    # Seconds a lookup/recommendation result is served without revalidating.
+    "CACHE_TTL": int(os.environ.get("SEMANTIC_SCHOLAR_CACHE_TTL", 60 * 60 * 24)),
+    # Extra seconds a stale result is still served while it is refreshed in the background.
+    "CACHE_STALE_TTL": int(os.environ.get("SEMANTIC_SCHOLAR_CACHE_STALE_TTL", 60 * 60 * 24 * 7)),
+    # Seconds a "no paper found" answer is remembered.
+    "NEGATIVE_CACHE_TTL": int(os.environ.get("SEMANTIC_SCHOLAR_NEGATIVE_CACHE_TTL", 60 * 60 * 6)),
 }
 
 headers = {
@@ -198,4 +263,104 @@ headers = {
 
 DEFAULT_FROM_EMAIL = 'Refero Team <referopalsu@gmail.com>'
 
-SERVER_EMAIL = DEFAULT_FROM_EMAIL
\ No newline at end of file
+SERVER_EMAIL = DEFAULT_FROM_EMAIL
+
+# Background job queue (thesis/jobs.py), drained by `python manage.py run_worker`.
+JOB_QUEUE = {
+    "MAX_ATTEMPTS": 5,
+    # Retry delays double from BACKOFF_BASE up to BACKOFF_MAX seconds.
+    "BACKOFF_BASE": 30,
+    "BACKOFF_MAX": 60 * 60,
+    # Running jobs older than this are assumed orphaned by a crashed worker.
+    "STALE_AFTER": 10 * 60,
+}
+
+# Buffered thesis view counts (thesis/view_counter.py).
+VIEW_COUNTER = {
+    # Buffered views are written to the database after this many seconds...
+    "FLUSH_INTERVAL": 30,
+    # ...or once this many views are pending, whichever comes first.
+    "FLUSH_THRESHOLD": 100,
+    # Repeat views by the same user within this many seconds count once (0 disables).
+    "DEDUPE_WINDOW": 30 * 60,
+    # Recent (thesis, user) views remembered per process for that window; oldest go first.
+    "DEDUPE_MAX_ENTRIES": 100000,
+}
+
+# In-memory tag postings for multi-tag filters and facet counts (thesis/tag_postings.py).
+TAG_POSTINGS = {
+    # Seconds a process trusts its copy before checking the shared version for changes elsewhere.
+    "CHECK_INTERVAL": 5,
+    # How long a built snapshot stays in the shared cache.
+    "TIMEOUT": 24 * 60 * 60,
+    # Filters matching at most this many theses page by primary key instead of scanning tag_ids.
+    "MAX_ID_FILTER": 2000,
+}
+
+# Typeahead suggestions for the search box (thesis/autocomplete.py).
+AUTOCOMPLETE = {
+    # Suggestions returned per kind (titles, authors, tags).
+    "LIMIT": 5,
+    # Seconds a process trusts its copy before checking the shared version for changes elsewhere.
+    "CHECK_INTERVAL": 5,
+    # How long the shared index and its change log stay in the cache.
+    "TIMEOUT": 24 * 60 * 60,
+    # Changes kept in the shared log; a process further behind rebuilds instead of replaying them.
+    "MAX_CHANGES": 1000,
+    # Changes replayed before the patched copy is written back as the shared index.
+    "COMPACT_AFTER": 200,
+    # Keys read per kind for one prefix; bounds the cost of one- and two-letter queries.
+    "SCAN_LIMIT": 2000,
+}
+
+# Local "similar theses" engine (thesis/similarity.py).
+SIMILAR_THESES = {
+    # Neighbours stored and shown per thesis.
+    "NEIGHBOURS": 5,
+    # Cosine similarity below this is not worth showing.
+    "MIN_SCORE": 0.05,
+    # Heaviest TF-IDF terms kept per thesis.
+    "MAX_TERMS": 40,
+    # Terms found in more than this share of theses are ignored.
+    "MAX_DF": 0.5,
+}
+
+# Thesis PDF delivery (thesis/file_serving.py).
+PDF_DELIVERY = {
+    # None streams through Django; "x-sendfile" (Apache/lighttpd) or "x-accel-redirect" (nginx)
+    # hands the file to the web server after the login check.
+    "SENDFILE_BACKEND": os.getenv("PDF_SENDFILE_BACKEND") or None,
+    # nginx "internal" location aliased to MEDIA_ROOT, used with x-accel-redirect.
+    "ACCEL_REDIRECT_PREFIX": "/protected-media/",
+    # Seconds browsers may reuse a PDF before revalidating it.
+    "MAX_AGE": 60 * 60,
+    # Bytes read per chunk when streaming through Django.
+    "BLOCK_SIZE": 64 * 1024,
+}
+
+# Chunked, resumable PDF uploads (thesis/chunked_upload.py).
+CHUNKED_UPLOADS = {
+    # Largest PDF accepted, in bytes.
+    "MAX_FILE_SIZE": 200 * 1024 * 1024,
+    # Largest single chunk, in bytes; the upload page sends chunks of this size.
+    "MAX_CHUNK_SIZE": 8 * 1024 * 1024,
+    # Unfinished uploads are deleted after this many seconds without a new chunk.
+    "EXPIRES_AFTER": 24 * 60 * 60,
+    # Where part files are assembled, relative to MEDIA_ROOT.
+    "DIRECTORY": "partial_uploads",
+}
+
+# First-page PDF thumbnails (thesis/renditions.py).
+RENDITIONS = {
+    # Widths, in pixels, rendered for every thesis; cards pick one through srcset.
+    "WIDTHS": (160, 320, 640),
+    "QUALITY": 80,
+    # Thumbnail URLs change with their content, so browsers may keep them this many seconds.
+    "MAX_AGE": 365 * 24 * 60 * 60,
+}
+
+# Streaming CSV / JSON Lines catalog exports (thesis/export.py).
+EXPORT = {
+    # Theses read per query (their tags are prefetched per chunk) and rows sent per write.
+    "CHUNK_SIZE": 500,
+}
@@ -25,11 +25,20 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.frontend_home, name='home'),
     path('theses/', views.frontend_theses, name='theses'),
+    path('theses/autocomplete/', views.theses_autocomplete, name='theses_autocomplete'),
+    path('theses/export.<slug:fmt>', views.theses_export, name='theses_export'),
     path('upload-thesis/', views.frontend_upload, name='thesis_upload'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_complete, name='upload_complete'),
     path('profile/', views.frontend_profile, name='profile'),
     path('thesis/<int:pk>/', views.thesis_detail, name='thesis_detail'),
+    path('thesis/<int:pk>/pdf/', views.thesis_pdf, name='thesis_pdf'),
+    path('thesis/<int:pk>/thumbnail/<slug:key>-<int:width>.jpg', views.thesis_thumbnail, name='thesis_thumbnail'),
     path('thesis/<int:pk>/edit/', views.thesis_edit, name='thesis_edit'),
     path('thesis/<int:pk>/delete/', views.thesis_delete, name='thesis_delete'),
+
+    path('api/', include('api.urls')),
     
     # Custom Password Reset Views
     path('accounts/password_reset/', views.password_reset_request, name='password_reset'),
@@ -0,0 +1,84 @@
+// Typeahead suggestions under the theses search box, from the autocomplete endpoint (thesis/autocomplete.py).
+// Titles link to the thesis; authors and tags fill in the search. Without fetch the form works as before.
+document.addEventListener('DOMContentLoaded', function() {
+  const form = document.querySelector('form[data-autocomplete]');
+  if (!form || !window.fetch) {
+    return;
+  }
+  const input = form.querySelector('input[name="q"]');
+  const results = form.querySelector('[data-autocomplete-results]');
+  const delayMs = 120;
+  let timer = null;
+  let latest = 0;
+
+  function hide() {
+    results.classList.add('hidden');
+    results.replaceChildren();
+  }
+
+  function section(label, items, build) {
+    if (!items.length) return;
+    const heading = document.createElement('div');
+    heading.className = 'px-2 pt-2 text-xs uppercase tracking-wide text-gray-500';
+    heading.textContent = label;
+    results.appendChild(heading);
+    items.forEach(function(item) {
+      results.appendChild(build(item));
+    });
+  }
+
+  function link(text, href, onClick) {
+    const anchor = document.createElement('a');
+    anchor.className = 'block rounded-lg px-2 py-1 text-gray-200 hover:bg-white/10';
+    anchor.textContent = text;
+    anchor.href = href;
+    if (onClick) anchor.addEventListener('click', onClick);
+    return anchor;
+  }
+
+  function search(text) {
+    return function(event) {
+      event.preventDefault();
+      input.value = text;
+      hide();
+      form.submit();
+    };
+  }
+
+  function render(data) {
+    results.replaceChildren();
+    section('Titles', data.titles, (item) => link(item.title, item.url));
+    section('Authors', data.authors, (item) => link(item.name + ' (' + item.count + ')', '#', search(item.name)));
+    section('Tags', data.tags, (item) => link(item.name + ' (' + item.count + ')', '#', search(item.name)));
+    results.classList.toggle('hidden', !results.childElementCount);
+  }
+
+  async function suggest() {
+    const query = input.value.trim();
+    const request = ++latest;
+    if (!query) {
+      hide();
+      return;
+    }
+    try {
+      const url = form.dataset.autocomplete + '?' + new URLSearchParams({ q: query });
+      const response = await fetch(url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } });
+      const data = await response.json();
+      // Answers can arrive out of order; only the newest one is shown.
+      if (response.ok && request === latest) render(data);
+    } catch (error) {
+      hide();
+    }
+  }
+
+  input.addEventListener('input', function() {
+    clearTimeout(timer);
+    timer = setTimeout(suggest, delayMs);
+  });
+  input.addEventListener('keydown', function(event) {
+    if (event.key === 'Escape') hide();
+  });
+  document.addEventListener('click', function(event) {
+    if (!form.contains(event.target)) hide();
+  });
+});
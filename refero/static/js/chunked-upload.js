@@ -0,0 +1,111 @@
+// Sends the selected PDF in checksummed chunks (thesis/chunked_upload.py) before the form is posted,
+// resuming where the server left off if the connection drops. Without Web Crypto the form posts normally.
+document.addEventListener('DOMContentLoaded', function() {
+  const form = document.querySelector('form[data-chunked-upload]');
+  if (!form || !window.crypto || !window.crypto.subtle || !window.fetch) {
+    return;
+  }
+  const fileInput = form.querySelector('input[type="file"][name="pdf_file"]');
+  const tokenInput = form.querySelector('input[name="upload_token"]');
+  const status = form.querySelector('[data-upload-status]');
+  const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+  const chunkSize = parseInt(form.dataset.chunkSize, 10);
+  const maxAttempts = 5;
+  let busy = false;
+
+  function report(text) {
+    if (status) status.textContent = text;
+  }
+
+  function sleep(ms) {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+  }
+
+  async function sha256(blob) {
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+  }
+
+  async function send(url, options) {
+    const headers = Object.assign({ 'X-CSRFToken': csrfToken, 'Accept': 'application/json' }, options.headers || {});
+    const response = await fetch(url, Object.assign({}, options, { headers: headers, credentials: 'same-origin' }));
+    const data = response.status === 204 ? {} : await response.json();
+    return { ok: response.ok, status: response.status, data: data };
+  }
+
+  // Uploads of the same file pick up the session started by an earlier, interrupted attempt.
+  function storageKey(file) {
+    return 'refero-upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+  }
+
+  async function openSession(file) {
+    const savedUrl = localStorage.getItem(storageKey(file));
+    if (savedUrl) {
+      const saved = await send(savedUrl, { method: 'GET' });
+      if (saved.ok) return saved.data;
+      localStorage.removeItem(storageKey(file));
+    }
+    const body = new FormData();
+    body.append('filename', file.name);
+    body.append('size', file.size);
+    const started = await send(form.dataset.chunkedUpload, { method: 'POST', body: body });
+    if (!started.ok) throw new Error(started.data.error || 'The upload could not be started.');
+    localStorage.setItem(storageKey(file), started.data.url);
+    return started.data;
+  }
+
+  async function upload(file) {
+    let session = await openSession(file);
+    let attempts = 0;
+    while (session.offset < session.size) {
+      const chunk = file.slice(session.offset, session.offset + chunkSize);
+      report('Uploading PDF… ' + Math.floor(100 * session.offset / session.size) + '%');
+      try {
+        const result = await send(session.url, {
+          method: 'PUT',
+          headers: { 'Upload-Offset': String(session.offset), 'Upload-Checksum': await sha256(chunk) },
+          body: chunk,
+        });
+        if (result.ok || result.status === 409) {
+          // On a conflict the server reports the offset it actually has.
+          session = Object.assign(session, { offset: result.data.offset });
+          attempts = result.ok ? 0 : attempts + 1;
+        } else if (result.status !== 400 || ++attempts >= maxAttempts) {
+          throw new Error(result.data.error || 'The upload failed.');
+        }
+      } catch (error) {
+        if (error instanceof TypeError && ++attempts < maxAttempts) {
+          // Network error: wait, ask the server where it got to, and carry on.
+          await sleep(1000 * 2 ** attempts);
+          session = await openSession(file);
+          continue;
+        }
+        throw error;
+      }
+      if (attempts >= maxAttempts) throw new Error('The upload keeps failing; please try again later.');
+    }
+
+    const completed = await send(session.complete_url, { method: 'POST' });
+    localStorage.removeItem(storageKey(file));
+    if (!completed.ok) throw new Error(completed.data.error || 'The upload could not be completed.');
+    return completed.data.upload_id;
+  }
+
+  form.addEventListener('submit', async function(event) {
+    const file = fileInput && fileInput.files[0];
+    if (!file) return;
+    event.preventDefault();
+    if (busy) return;
+    busy = true;
+    try {
+      tokenInput.value = await upload(file);
+      // The file is on the server now; post the form without it.
+      fileInput.value = '';
+      report('PDF uploaded. Saving…');
+      form.submit();
+    } catch (error) {
+      report(error.message);
+      busy = false;
+    }
+  });
+});
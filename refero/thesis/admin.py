@@ -1,6 +1,7 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from .models import College, Program, Tag, Thesis
+from .models import College, Job, OutboxEmail, Program, Tag, Thesis
 
 
 @admin.register(College)
@@ -40,3 +41,52 @@ class ThesisAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
         return queryset.select_related("college", "program", "uploaded_by").prefetch_related("tags")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "max_attempts", "run_at", "date_modified")
+    list_filter = ("status", "name")
+    readonly_fields = ("last_error", "locked_at")
+    actions = ("retry_jobs",)
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status=Job.STATUS_RUNNING).update(
+            status=Job.STATUS_PENDING, attempts=0, run_at=timezone.now(), locked_at=None,
+        )
+        self.message_user(request, f"{updated} jobs queued for retry.")
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "recipients", "status", "attempts", "run_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "recipients")
+    # Bodies hold password reset codes, so they are never shown, and rows are read-only.
+    fields = ("subject", "recipients", "status", "attempts", "max_attempts", "run_at", "locked_at", "sent_at", "last_error")
+    readonly_fields = fields
+    actions = ("retry_emails",)
+
+    # Anyone who can read queued mail can read any account's reset code: superusers only.
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_change_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected emails")
+    def retry_emails(self, request, queryset):
+        updated = queryset.filter(status=OutboxEmail.STATUS_DEAD).update(
+            status=OutboxEmail.STATUS_PENDING, attempts=0, run_at=timezone.now(), locked_at=None,
+        )
+        self.message_user(request, f"{updated} emails queued for retry.")
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ThesisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'thesis'
+
+    def ready(self):
+        from thesis import signals, tasks  # noqa: F401
@@ -0,0 +1,353 @@
+"""
+Typeahead suggestions for the theses search box.
+
+A ``PrefixIndex`` keeps three sorted lists of lower-cased keys: every word
+start of each thesis title ("flood risk in iloilo", "risk in iloilo",
+...), each author's full name and surname (authors are the comma-separated
+``Thesis.authors``), and every word start of each tag name. Each key
+points back at its title, author or tag. A prefix lookup is a
+``bisect_left`` into each list followed by a short forward scan, so a
+query costs microseconds whatever the size of the catalog. Authors and
+tags are ranked by how many theses they appear on, titles by where the
+prefix matches and then newest first.
+
+The index is shared much the way thesis/tag_postings.py shares its
+snapshot: one copy in the ``indexes`` cache, one in each process, and a
+version number that processes check every CHECK_INTERVAL seconds. The
+version is a ``SharedCounter`` row bumped with an F() update rather than a
+cache entry, because the database cache's ``incr`` is a read then a write
+and two processes could both take the same number. Updates are
+incremental. The signal handlers in ``thesis/signals.py`` call
+``changed()`` when a thesis or tag is saved, deleted or retagged, which
+(once the transaction commits) takes the next version and appends
+``(version, kind, id)`` to the change log, a single cache entry holding
+the last MAX_CHANGES changes. A process that finds itself behind reloads
+just those rows and patches its copy in place. It rebuilds from scratch
+when the log doesn't reach back to its version (too far behind, log
+expired, or an entry lost to two processes appending at once) and after
+``invalidate()`` (bulk imports that skip signals). Every COMPACT_AFTER
+changes the patched copy is written back as the new shared base.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from thesis import tagging
+from thesis.models import SharedCounter, Tag, Thesis
+
+CACHE_ALIAS = 'indexes'
+VERSION_COUNTER = 'autocomplete'
+BASE_KEY = 'autocomplete:base'
+LOG_KEY = 'autocomplete:changes'
+KIND_TITLE = 'title'
+KIND_AUTHOR = 'author'
+KIND_TAG = 'tag'
+# Keys are cut to this many characters; longer prefixes are checked against the full text.
+KEY_LENGTH = 24
+# Word starts indexed per title.
+MAX_TITLE_WORDS = 12
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_local = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _config(name, default):
+    return getattr(settings, 'AUTOCOMPLETE', {}).get(name, default)
+
+
+def normalize(text) -> str:
+    return ' '.join(_WORD_RE.findall((text or '').casefold()))
+
+
+def _word_starts(text, limit=None) -> set:
+    words = normalize(text).split(' ')[:limit]
+    return {' '.join(words[index:])[:KEY_LENGTH] for index in range(len(words)) if words[index]}
+
+
+def parse_authors(authors) -> tuple:
+    """Author names from the comma-separated ``Thesis.authors``, in order and without repeats."""
+    names = (' '.join(name.split()) for name in (authors or '').split(','))
+    return tuple(dict.fromkeys(name for name in names if name))
+
+
+def _author_keys(name) -> set:
+    words = normalize(name).split(' ')
+    return {' '.join(words)[:KEY_LENGTH], words[-1][:KEY_LENGTH]} - {''}
+
+
+class _SortedKeys:
+    """Parallel sorted ``keys`` and their ``refs``."""
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.refs = [ref for _, ref in pairs]
+
+    def add(self, keys, ref):
+        for key in keys:
+            index = bisect_left(self.keys, key)
+            # Equal keys stay ordered by ref, so removal can find them again.
+            while index < len(self.keys) and self.keys[index] == key and self.refs[index] < ref:
+                index += 1
+            self.keys.insert(index, key)
+            self.refs.insert(index, ref)
+
+    def remove(self, keys, ref):
+        for key in keys:
+            index = bisect_left(self.keys, key)
+            while index < len(self.keys) and self.keys[index] == key:
+                if self.refs[index] == ref:
+                    del self.keys[index]
+                    del self.refs[index]
+                    break
+                index += 1
+
+    def scan(self, prefix, limit) -> set:
+        """Refs of keys starting with ``prefix``, reading at most ``limit`` keys."""
+        probe = prefix[:KEY_LENGTH]
+        index = bisect_left(self.keys, probe)
+        end = min(len(self.keys), index + limit)
+        refs = set()
+        while index < end and self.keys[index].startswith(probe):
+            refs.add(self.refs[index])
+            index += 1
+        return refs
+
+
+class PrefixIndex:
+    def __init__(self, version):
+        self.version = version
+        self.base_version = version
+        self.titles = {}
+        # {thesis_id: (author names, tag ids)}, to undo a thesis's contribution when it changes.
+        self.contributions = {}
+        self.authors = {}
+        self.tags = {}
+        self.tag_counts = {}
+        self.lists = {KIND_TITLE: _SortedKeys(), KIND_AUTHOR: _SortedKeys(), KIND_TAG: _SortedKeys()}
+
+    @classmethod
+    def build(cls, version):
+        index = cls(version)
+        title_pairs = []
+        for pk, title, authors, tag_ids in Thesis.objects.values_list('pk', 'title', 'authors', 'tag_ids').iterator():
+            index.titles[pk] = title
+            title_pairs += [(key, pk) for key in _word_starts(title, MAX_TITLE_WORDS)]
+            names, tag_ids = parse_authors(authors), tuple(tagging.decode(tag_ids))
+            index.contributions[pk] = (names, tag_ids)
+            for name in names:
+                entry = index.authors.setdefault(normalize(name), [name, 0])
+                entry[1] += 1
+            for tag_id in tag_ids:
+                index.tag_counts[tag_id] = index.tag_counts.get(tag_id, 0) + 1
+        index.tags = dict(Tag.objects.values_list('pk', 'name'))
+        index.lists[KIND_TITLE] = _SortedKeys(title_pairs)
+        index.lists[KIND_AUTHOR] = _SortedKeys(
+            (key, author) for author, (name, _) in index.authors.items() for key in _author_keys(name)
+        )
+        index.lists[KIND_TAG] = _SortedKeys(
+            (key, pk) for pk, name in index.tags.items() for key in _word_starts(name)
+        )
+        return index
+
+    def _remove_thesis(self, pk):
+        title = self.titles.pop(pk, None)
+        if title is None:
+            return
+        self.lists[KIND_TITLE].remove(_word_starts(title, MAX_TITLE_WORDS), pk)
+        names, tag_ids = self.contributions.pop(pk)
+        for name in names:
+            author = normalize(name)
+            entry = self.authors[author]
+            entry[1] -= 1
+            if not entry[1]:
+                del self.authors[author]
+                self.lists[KIND_AUTHOR].remove(_author_keys(entry[0]), author)
+        for tag_id in tag_ids:
+            self.tag_counts[tag_id] = self.tag_counts.get(tag_id, 1) - 1
+
+    def _add_thesis(self, pk, title, authors, tag_ids):
+        self.titles[pk] = title
+        self.lists[KIND_TITLE].add(_word_starts(title, MAX_TITLE_WORDS), pk)
+        names, tag_ids = parse_authors(authors), tuple(tagging.decode(tag_ids))
+        self.contributions[pk] = (names, tag_ids)
+        for name in names:
+            author = normalize(name)
+            if author not in self.authors:
+                self.authors[author] = [name, 0]
+                self.lists[KIND_AUTHOR].add(_author_keys(name), author)
+            self.authors[author][1] += 1
+        for tag_id in tag_ids:
+            self.tag_counts[tag_id] = self.tag_counts.get(tag_id, 0) + 1
+
+    def _set_tag(self, pk, name):
+        old = self.tags.pop(pk, None)
+        if old is not None:
+            self.lists[KIND_TAG].remove(_word_starts(old), pk)
+        if name is not None:
+            self.tags[pk] = name
+            self.lists[KIND_TAG].add(_word_starts(name), pk)
+
+    def apply(self, changes, version):
+        """Reloads the ``(kind, pk)`` rows in ``changes`` and patches the index with them."""
+        thesis_ids = {pk for kind, pk in changes if kind == 'thesis'}
+        tag_ids = {pk for kind, pk in changes if kind == 'tag'}
+        rows = {
+            pk: (title, authors, tag_ids_value)
+            for pk, title, authors, tag_ids_value in Thesis.objects.filter(pk__in=thesis_ids)
+            .values_list('pk', 'title', 'authors', 'tag_ids')
+        }
+        for pk in thesis_ids:
+            self._remove_thesis(pk)
+            if pk in rows:
+                self._add_thesis(pk, *rows[pk])
+        names = dict(Tag.objects.filter(pk__in=tag_ids).values_list('pk', 'name'))
+        for pk in tag_ids:
+            self._set_tag(pk, names.get(pk))
+        self.version = version
+
+    def suggest(self, prefix, limit) -> dict:
+        prefix = normalize(prefix)
+        if not prefix:
+            return {'titles': [], 'authors': [], 'tags': []}
+        scan_limit = _config('SCAN_LIMIT', 2000)
+
+        def matches(label):
+            # Keys are cut at KEY_LENGTH, so a longer prefix is checked against the whole text.
+            return len(prefix) <= KEY_LENGTH or f' {prefix}' in f' {normalize(label)}'
+
+        titles = [
+            (not normalize(self.titles[pk]).startswith(prefix), -pk, pk)
+            for pk in self.lists[KIND_TITLE].scan(prefix, scan_limit)
+            if matches(self.titles[pk])
+        ]
+        authors = [
+            (-self.authors[author][1], self.authors[author][0])
+            for author in self.lists[KIND_AUTHOR].scan(prefix, scan_limit)
+            if matches(self.authors[author][0])
+        ]
+        tags = [
+            (-self.tag_counts.get(pk, 0), self.tags[pk])
+            for pk in self.lists[KIND_TAG].scan(prefix, scan_limit)
+            if matches(self.tags[pk])
+        ]
+        return {
+            'titles': [{'id': pk, 'title': self.titles[pk]} for _, _, pk in sorted(titles)[:limit]],
+            'authors': [{'name': name, 'count': -count} for count, name in sorted(authors)[:limit]],
+            'tags': [{'name': name, 'count': -count} for count, name in sorted(tags)[:limit]],
+        }
+
+
+def cache():
+    return caches[CACHE_ALIAS]
+
+
+def _current_version() -> int:
+    counter = SharedCounter.objects.filter(name=VERSION_COUNTER)
+    return counter.values_list('value', flat=True).first() or 0
+
+
+def _next_version(count=1) -> int:
+    """Adds ``count`` to the version and returns the new value; no two callers see the same one."""
+    counter = SharedCounter.objects.filter(name=VERSION_COUNTER)
+    with transaction.atomic():
+        # The UPDATE holds the row's write lock until commit, so the read below is our own value.
+        if not counter.update(value=F('value') + count):
+            SharedCounter.objects.get_or_create(name=VERSION_COUNTER)
+            counter.update(value=F('value') + count)
+        return counter.values_list('value', flat=True).get()
+
+
+def _store_base(index) -> None:
+    index.base_version = index.version
+    cache().set(BASE_KEY, index, _config('TIMEOUT', 24 * 60 * 60))
+
+
+def _rebuild(version):
+    index = PrefixIndex.build(version)
+    _store_base(index)
+    return index
+
+
+def _catch_up(index, version):
+    if index is None or index.version > version:
+        index = cache().get(BASE_KEY)
+        if index is None or index.version > version:
+            return _rebuild(version)
+    behind = version - index.version
+    if not behind:
+        return index
+    changes = {
+        number: (kind, pk)
+        for number, kind, pk in cache().get(LOG_KEY) or ()
+        if index.version < number <= version
+    }
+    if len(changes) < behind:
+        # The log doesn't cover every change since our version (or an invalidate() left no entry).
+        return _rebuild(version)
+    index.apply(set(changes.values()), version)
+    if version - index.base_version >= _config('COMPACT_AFTER', 200):
+        _store_base(index)
+    return index
+
+
+def suggest(prefix, limit=None) -> dict:
+    """``{'titles': [...], 'authors': [...], 'tags': [...]}`` best matching ``prefix``."""
+    global _local, _checked_at
+    limit = limit or _config('LIMIT', 5)
+    # Queries take the lock too, since catching up patches the index in place.
+    with _lock:
+        now = time.monotonic()
+        if _local is None or now - _checked_at >= _config('CHECK_INTERVAL', 5):
+            _local = _catch_up(_local, _current_version())
+            _checked_at = now
+        return _local.suggest(prefix, limit)
+
+
+def _record(kind, pks):
+    global _checked_at
+    version = _next_version(len(pks))
+    first = version - len(pks) + 1
+    # Read-modify-write: a concurrent append can be lost. Its numbers are still unique, so readers
+    # see a gap and rebuild.
+    log = list(cache().get(LOG_KEY) or ())
+    log.extend((first + offset, kind, pk) for offset, pk in enumerate(pks))
+    log.sort()
+    cache().set(LOG_KEY, log[-_config('MAX_CHANGES', 1000):], _config('TIMEOUT', 24 * 60 * 60))
+    with _lock:
+        # This process sees its own change on the next query.
+        _checked_at = 0.0
+
+
+def changed(kind, *pks) -> None:
+    """Records, once the current transaction commits, that the theses or tags ``pks`` changed."""
+    pks = list(pks)
+    if pks:
+        transaction.on_commit(lambda: _record(kind, pks))
+
+
+def _bump():
+    global _checked_at
+    _next_version()
+    with _lock:
+        _checked_at = 0.0
+
+
+def invalidate() -> None:
+    """Makes every process rebuild its index once the current transaction commits (for bulk changes)."""
+    transaction.on_commit(_bump)
+
+
+def reset() -> None:
+    """Forgets this process's copy, e.g. after the test database rolled back underneath it."""
+    global _local
+    with _lock:
+        _local = None
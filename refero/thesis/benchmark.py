@@ -0,0 +1,198 @@
+"""
+Load-test harness for the pages in refero/urls.py.
+
+Used by ``python manage.py benchmark_views``, usually against a catalog made
+by ``python manage.py seed_catalog``. ``cases()`` walks the URL
+configuration (leaving out the Django admin and allauth) and fills each
+route's parameters with a thesis, thumbnail and tag from the database.
+Search and tag-filter queries are added for the listings. ``run_case()``
+sends GET requests through the Django test client from ``concurrency``
+threads, each signed in as the same user. Semantic Scholar is stubbed
+out for the whole run (see ``stub_semantic_scholar()``), so upstream
+latency and rate limits don't blur the numbers.
+
+Latency percentiles come from the harness's own timing of every request.
+Query counts and database time come from RequestMetricsMiddleware (see
+thesis/metrics.py), which records each request on the thread that served
+it. Routes that don't answer GET (405 on the warm-up request) are reported
+as skipped.
+"""
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.db import connections
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from thesis import metrics, renditions, tag_postings
+from thesis.models import Thesis
+from thesis.semantic_scholar import SemanticScholarClient, SemanticScholarError
+
+# URL namespaces and included URLconfs that aren't part of the catalog.
+SKIPPED_NAMESPACES = ('admin',)
+SKIPPED_URLCONFS = ('allauth.',)
+# Routes whose parameters the harness can't make up.
+SKIPPED_PARAMETERS = {'upload_id': 'needs an upload session'}
+
+STUB_PAPERS = [
+    {'paperId': f'stub{number}', 'title': f'Stubbed recommendation {number}', 'year': 2020,
+     'abstract': 'Stubbed abstract.', 'authors': [{'name': 'A. Author'}]}
+    for number in range(5)
+]
+
+
+@dataclass
+class Case:
+    label: str
+    view_name: str
+    path: str
+    params: dict = field(default_factory=dict)
+
+
+def stub_semantic_scholar(latency=0.0) -> ExitStack:
+    """
+    Patches out every Semantic Scholar call: recommendations answer with
+    STUB_PAPERS after ``latency`` seconds, anything else fails fast.
+    """
+    async def recommendations(title, ss_paper_id=None):
+        if latency:
+            await asyncio.sleep(latency)
+        return STUB_PAPERS
+
+    def unavailable(self, method, url, **kwargs):
+        raise SemanticScholarError("Semantic Scholar is stubbed out while benchmarking.")
+
+    stack = ExitStack()
+    stack.enter_context(mock.patch('api.views.aget_thesis_recommendations', new=recommendations))
+    stack.enter_context(mock.patch.object(SemanticScholarClient, '_request', new=unavailable))
+    return stack
+
+
+def _routes(patterns, namespace=''):
+    """Yields ``(view name, parameter names)`` for every named route under ``patterns``."""
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            module = getattr(entry.urlconf_module, '__name__', '')
+            if entry.namespace in SKIPPED_NAMESPACES or module.startswith(SKIPPED_URLCONFS):
+                continue
+            prefix = f'{namespace}{entry.namespace}:' if entry.namespace else namespace
+            yield from _routes(entry.url_patterns, prefix)
+        elif isinstance(entry, URLPattern) and entry.name:
+            yield f'{namespace}{entry.name}', set(entry.pattern.regex.groupindex)
+
+
+def _samples(user):
+    """Parameter values and query strings taken from the catalog."""
+    thesis = (Thesis.objects.filter(uploaded_by=user).order_by('-pk').first()
+              or Thesis.objects.order_by('-pk').first())
+    if thesis is None:
+        raise ValueError("The catalog is empty; run seed_catalog first.")
+    thumbnail = Thesis.objects.exclude(thumbnail_key='').order_by('-pk').first()
+
+    postings = tag_postings.snapshot()
+    by_use = sorted(postings.tag_ids_by_name, key=lambda name: len(postings.posting(postings.tag_ids_by_name[name])))
+    popular = by_use[-1] if by_use else None
+    rare = next((name for name in by_use if postings.posting(postings.tag_ids_by_name[name])), popular)
+
+    queries = {
+        'theses': [{}, {'q': max(thesis.title.split(), key=len)}] + ([{'tag': popular}] if popular else []),
+        # A whole-catalog export is one very long request; a rare tag keeps it comparable.
+        'theses_export': [{'tag': rare}] if rare else [{}],
+        'theses_autocomplete': [{'q': thesis.title[:3]}],
+        'api:thesis_list': [{}] + ([{'tag': popular}] if popular else []),
+    }
+    return thesis, thumbnail, queries
+
+
+def cases(user) -> tuple:
+    """``(cases, skipped)``: what to request, and ``{view name: reason}`` for routes left out."""
+    thesis, thumbnail, queries = _samples(user)
+    found, skipped = [], {}
+    for view_name, parameters in _routes(get_resolver().url_patterns):
+        reasons = [SKIPPED_PARAMETERS[name] for name in parameters if name in SKIPPED_PARAMETERS]
+        if reasons:
+            skipped[view_name] = reasons[0]
+            continue
+        kwargs = {}
+        if 'key' in parameters:
+            if thumbnail is None:
+                skipped[view_name] = 'no thesis has thumbnails yet'
+                continue
+            kwargs = {'pk': thumbnail.pk, 'key': thumbnail.thumbnail_key, 'width': renditions.widths()[0]}
+        elif 'pk' in parameters:
+            kwargs['pk'] = thesis.pk
+        if 'fmt' in parameters:
+            kwargs['fmt'] = 'csv'
+        path = reverse(view_name, kwargs=kwargs)
+        for params in queries.get(view_name, [{}]):
+            query = urlencode(params)
+            label = f'{view_name}?{query}' if query else view_name
+            found.append(Case(label, view_name, path, params))
+    return found, skipped
+
+
+def _request(client, case):
+    started = time.perf_counter()
+    response = client.get(case.path, case.params)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response.status_code, time.perf_counter() - started
+
+
+def _worker(user, case, count, in_thread):
+    # Server errors are counted, not raised.
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    try:
+        return [_request(client, case) for _ in range(count)]
+    finally:
+        if in_thread:
+            connections.close_all()
+
+
+def run_case(case, user, requests=50, concurrency=1, warmup=1) -> dict:
+    """Requests ``case`` ``requests`` times from ``concurrency`` threads and summarises the run."""
+    warm = _worker(user, case, max(1, warmup), in_thread=False)
+    if warm[0][0] == 405:
+        return {'label': case.label, 'path': case.path, 'skipped': 'does not answer GET'}
+
+    metrics.reset()
+    concurrency = max(1, min(concurrency, requests))
+    shares = [requests // concurrency + (1 if index < requests % concurrency else 0) for index in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        results = _worker(user, case, requests, in_thread=False)
+    else:
+        results = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for batch in executor.map(lambda count: _worker(user, case, count, in_thread=True), shares):
+                results.extend(batch)
+    wall = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    statuses = Counter(status for status, _ in results)
+    server = metrics.snapshot().get(case.view_name, {})
+    return {
+        'label': case.label,
+        'path': case.path,
+        'requests': len(results),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'errors': sum(count for status, count in statuses.items() if status >= 500),
+        'throughput_rps': round(len(results) / wall, 2) if wall else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': metrics.percentile_ms(latencies, 0.50),
+        'p95_ms': metrics.percentile_ms(latencies, 0.95),
+        'p99_ms': metrics.percentile_ms(latencies, 0.99),
+        # Async views run their queries on other threads, so they report none.
+        'avg_queries': server.get('avg_queries'),
+        'max_queries': server.get('max_queries'),
+        'avg_db_ms': server.get('avg_db_ms'),
+    }
@@ -0,0 +1,190 @@
+"""
+Chunked, resumable PDF uploads.
+
+A large scan sent as one multipart POST has to arrive in full before the
+form is even validated, and a dropped connection throws all of it away.
+Instead the upload page sends the file in pieces:
+
+1. ``POST /uploads/`` with ``filename``, ``size`` and optionally the whole
+   file's ``sha256`` starts an ``UploadSession`` and returns its id.
+2. ``PUT /uploads/<id>/`` sends the bytes starting at ``Upload-Offset``,
+   with their SHA-256 in ``Upload-Checksum``. Each chunk is streamed from
+   the request into a part file on disk, BLOCK_SIZE bytes at a time, and
+   the session only advances once the checksum matches. ``GET`` on the
+   same URL returns the stored offset, which is where a client resumes
+   after losing its connection.
+3. ``POST /uploads/<id>/complete/`` checks the size, the whole-file
+   checksum and the PDF header.
+
+The form then posts the session id in ``upload_token`` instead of the file,
+and ``attach()`` moves the part file into the thesis's ``pdf_file`` storage
+without copying it. Sessions left unfinished for EXPIRES_AFTER seconds are
+removed by ``purge_expired()``, which the worker runs between jobs.
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from thesis.models import UploadSession
+
+BLOCK_SIZE = 64 * 1024
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """A rejected upload request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _config(name, default):
+    return getattr(settings, 'CHUNKED_UPLOADS', {}).get(name, default)
+
+
+def max_chunk_size() -> int:
+    return _config('MAX_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def part_path(session: UploadSession) -> str:
+    return os.path.join(settings.MEDIA_ROOT, _config('DIRECTORY', 'partial_uploads'), f'{session.pk}.part')
+
+
+def _checksum(value) -> str:
+    value = (value or '').strip().lower()
+    if not _SHA256_RE.match(value):
+        raise UploadError("Checksums must be hex-encoded SHA-256 digests.")
+    return value
+
+
+def start(user, filename: str, size: int, sha256: str = '') -> UploadSession:
+    """Opens a session for a file of ``size`` bytes and creates its empty part file."""
+    filename = os.path.basename(filename or '')
+    if not filename.lower().endswith('.pdf'):
+        raise UploadError("Only PDF files can be uploaded.")
+    max_size = _config('MAX_FILE_SIZE', 200 * 1024 * 1024)
+    if not 0 < size <= max_size:
+        raise UploadError(f"Files must be between 1 byte and {max_size} bytes.")
+
+    session = UploadSession.objects.create(
+        user=user, filename=filename, size=size, sha256=_checksum(sha256) if sha256 else '',
+    )
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return session
+
+
+def write_chunk(session: UploadSession, offset: int, length: int, stream, checksum: str) -> int:
+    """
+    Stores ``length`` bytes read from ``stream`` at ``offset`` and returns the
+    new offset. A chunk that is cut short or fails its checksum leaves the
+    session where it was, so the client can send it again.
+    """
+    checksum = _checksum(checksum)
+    if session.completed:
+        raise UploadError("This upload is already complete.", status=409)
+    if offset != session.received:
+        raise UploadError(f"Expected a chunk starting at byte {session.received}.", status=409)
+    if not 0 < length <= max_chunk_size():
+        raise UploadError("Chunk is empty or larger than the allowed chunk size.", status=413)
+    if offset + length > session.size:
+        raise UploadError("Chunk runs past the declared file size.")
+
+    digest = hashlib.sha256()
+    with open(part_path(session), 'r+b') as part:
+        part.seek(offset)
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            part.write(block)
+            digest.update(block)
+            remaining -= len(block)
+        if remaining or digest.hexdigest() != checksum:
+            part.truncate(offset)
+            raise UploadError("Chunk was incomplete or did not match its checksum; send it again.")
+        part.truncate(offset + length)
+
+    # Only advance from the offset we wrote at, in case another request got there first.
+    advanced = UploadSession.objects.filter(pk=session.pk, received=offset, completed=False).update(
+        received=offset + length, date_modified=timezone.now(),
+    )
+    if not advanced:
+        raise UploadError("This upload changed while the chunk was being stored.", status=409)
+    session.received = offset + length
+    return session.received
+
+
+def _file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete(session: UploadSession) -> None:
+    """Checks the assembled file and marks the session ready to attach."""
+    if session.completed:
+        return
+    if session.received != session.size:
+        raise UploadError(f"Only {session.received} of {session.size} bytes have been received.", status=409)
+
+    path = part_path(session)
+    with open(path, 'rb') as part:
+        header = part.read(5)
+    if header != b'%PDF-':
+        discard(session)
+        raise UploadError("The uploaded file is not a PDF.")
+    if session.sha256 and _file_sha256(path) != session.sha256:
+        discard(session)
+        raise UploadError("The assembled file does not match its checksum; upload it again.")
+
+    session.completed = True
+    session.save(update_fields=['completed', 'date_modified'])
+
+
+class _AssembledFile(File):
+    """A part file that FileSystemStorage can move into place instead of copying."""
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def attach(session: UploadSession, thesis) -> None:
+    """Moves a completed upload into ``thesis.pdf_file`` (the thesis itself is not saved)."""
+    assembled = _AssembledFile(part_path(session), session.filename)
+    try:
+        thesis.pdf_file.save(session.filename, assembled, save=False)
+    finally:
+        assembled.close()
+    session.delete()
+
+
+def discard(session: UploadSession) -> None:
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def purge_expired() -> int:
+    """Removes sessions untouched for EXPIRES_AFTER seconds, with their part files."""
+    cutoff = timezone.now() - timedelta(seconds=_config('EXPIRES_AFTER', 24 * 60 * 60))
+    expired = list(UploadSession.objects.filter(date_modified__lt=cutoff))
+    for session in expired:
+        discard(session)
+    return len(expired)
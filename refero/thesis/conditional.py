@@ -0,0 +1,98 @@
+"""
+Conditional GET (ETag / Last-Modified / 304) for the catalog pages.
+
+Each page's validators are built from a few cheap values instead of from
+the rendered HTML: the newest ``date_modified`` of theses, tags, colleges
+and programs (one query; ``Thesis.date_modified`` is indexed), the cached
+row counts from thesis/stats.py (so deletions show up too), the signed-in
+user, and whatever else the page depends on (its query string, a thesis's
+view count, ...). Anything that changes what a card shows moves
+``date_modified`` forward (see thesis/fragments.py), so these values change
+whenever the page would.
+
+Pages are per user and behind a login, so responses are ``private`` with
+``Vary: Cookie`` and ``no-cache``: browsers keep them but revalidate every
+time, which costs a 304 instead of a full render. A request with flash
+messages waiting is always rendered in full, since showing the messages is
+what consumes them.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.db import connection
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+
+from thesis.models import College, Program, Tag, Thesis
+from thesis.stats import get_site_stats
+
+CATALOG_MODELS = (Thesis, Tag, College, Program)
+
+
+def _timestamp(value):
+    if isinstance(value, str):
+        # SQLite hands back raw text from a subquery with no column type.
+        value = parse_datetime(value)
+    return value.timestamp() if value is not None else 0.0
+
+
+def catalog_state() -> tuple:
+    """``(newest date_modified timestamp per catalog model, cached counts)``."""
+    columns = ', '.join(f'(SELECT MAX(date_modified) FROM {model._meta.db_table})' for model in CATALOG_MODELS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {columns}')
+        stamps = tuple(_timestamp(value) for value in cursor.fetchone())
+    stats = get_site_stats()
+    return stamps, tuple(sorted(stats.items()))
+
+
+class Validators:
+    """The ETag and Last-Modified of one response, built from ``values``."""
+
+    def __init__(self, request, *values, last_modified=None):
+        self.request = request
+        user_id = request.user.pk if request.user.is_authenticated else None
+        digest = hashlib.sha1(repr((user_id, values)).encode()).hexdigest()
+        self.etag = quote_etag(digest)
+        self.last_modified = int(last_modified) if last_modified else None
+        self.enabled = request.method in ('GET', 'HEAD') and not len(get_messages(request))
+
+    def not_modified(self):
+        """A 304 (or 412) response when the client's copy is current, else None."""
+        if not self.enabled:
+            return None
+        response = get_conditional_response(self.request, etag=self.etag, last_modified=self.last_modified)
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        if self.enabled and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified:
+                response['Last-Modified'] = http_date(self.last_modified)
+        patch_vary_headers(response, ('Cookie',))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def conditional_page(extra_values=None):
+    """
+    Decorates a catalog view so it answers 304 while the catalog, the user and
+    the query string are unchanged. ``extra_values(request)`` can add values
+    the page also depends on.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            stamps, counts = catalog_state()
+            values = [stamps, counts, request.GET.urlencode()]
+            if extra_values is not None:
+                values.append(extra_values(request))
+            validators = Validators(request, *values, last_modified=max(stamps))
+            response = validators.not_modified()
+            if response is None:
+                response = validators.apply(view(request, *args, **kwargs))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from thesis.stats import get_site_stats
+
+
+def site_stats(request):
+    """Exposes ``stats`` to every template; the counters are only read if a template uses them."""
+    return {'stats': SimpleLazyObject(get_site_stats)}
@@ -0,0 +1,160 @@
+"""
+Streaming exports of the catalog as CSV or JSON Lines.
+
+Used by the ``theses_export`` view and ``python manage.py export_theses``.
+``matching_theses()`` applies the theses page's filters (``q``, ``tag``,
+``exclude_tag``, ``match`` and the college, program and year facets) and
+walks the result with ``QuerySet.iterator()``: EXPORT["CHUNK_SIZE"] theses
+are read at a time with their college and program joined in and their tags
+prefetched by one query per chunk. Full-text matches come from
+``search.search_thesis_ids()`` without the theses page's MAX_RESULTS cap, so
+an export holds every match, and are loaded in rank order the same way, one
+chunk of ids at a time. ``encode()`` turns each chunk into text before
+the next one is read, so an export holds about one chunk in memory however
+many rows it has, and a ``StreamingHttpResponse`` sends the first bytes
+right away.
+
+The columns are the ones ``import_theses`` reads (see thesis/importer.py),
+plus ``id`` and ``date_added``, so an export can be imported elsewhere.
+CSV cells that a spreadsheet would run as a formula (starting with ``=``,
+``+``, ``-`` or ``@``) get a leading ``'``; ``read_records`` removes it again.
+"""
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from thesis import search, tag_postings
+from thesis.facets import FacetFilter
+from thesis.models import Tag, Thesis
+from thesis.tag_postings import TagFilter
+
+FIELDS = (
+    'id', 'title', 'abstract', 'authors', 'adviser', 'year_submitted', 'panel_score',
+    'college', 'program', 'tags', 'pdf', 'date_added',
+)
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+# Joins the tag names of a CSV row; import_theses splits them on the same character.
+TAG_SEPARATOR = ';'
+# Spreadsheets treat a cell starting with one of these as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Put in front of such a cell so it is shown as text.
+FORMULA_ESCAPE = "'"
+
+
+def _config(name, default):
+    return getattr(settings, 'EXPORT', {}).get(name, default)
+
+
+def chunk_size() -> int:
+    return _config('CHUNK_SIZE', 500)
+
+
+def file_name(fmt) -> str:
+    return f"theses-{timezone.localdate():%Y%m%d}.{fmt}"
+
+
+def _queryset():
+    return Thesis.objects.select_related('college', 'program').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.only('name').order_by('name'))
+    )
+
+
+def matching_theses(params, size=None):
+    """
+    Yields the theses the theses page lists for the query parameters
+    ``params``: newest first, or by rank for a full-text search.
+    """
+    size = size or chunk_size()
+    query = params.get('q', '').strip()
+    tag_filter = TagFilter.from_params(params)
+    facet_filter = FacetFilter.from_params(params)
+
+    if query and search.is_supported():
+        matched_ids = search.search_thesis_ids(query, limit=None)
+        if tag_filter or facet_filter:
+            postings = tag_postings.snapshot()
+            allowed = tag_filter.thesis_ids(postings) if tag_filter else postings.all_ids
+            if facet_filter:
+                allowed = facet_filter.narrow(postings, allowed)
+            allowed = set(allowed)
+            matched_ids = [pk for pk in matched_ids if pk in allowed]
+        for start in range(0, len(matched_ids), size):
+            ids = matched_ids[start:start + size]
+            theses = _queryset().in_bulk(ids)
+            yield from (theses[pk] for pk in ids if pk in theses)
+        return
+
+    theses = _queryset()
+    if query:
+        theses = theses.filter(search.contains_q(query)).distinct()
+    if tag_filter:
+        theses = theses.filter(tag_filter.q(tag_postings.snapshot()))
+    if facet_filter:
+        theses = theses.filter(facet_filter.q())
+    yield from theses.order_by('-date_added', '-pk').iterator(chunk_size=size)
+
+
+def _record(thesis) -> dict:
+    return {
+        'id': thesis.pk,
+        'title': thesis.title,
+        'abstract': thesis.abstract,
+        'authors': thesis.authors,
+        'adviser': thesis.adviser or '',
+        'year_submitted': thesis.year_submitted,
+        'panel_score': thesis.panel_score,
+        'college': thesis.college.college_name,
+        'program': thesis.program.prog_name,
+        'tags': [tag.name for tag in thesis.tags.all()],
+        'pdf': os.path.basename(thesis.pdf_file.name) if thesis.pdf_file else '',
+        'date_added': thesis.date_added.isoformat(),
+    }
+
+
+def escape_formula(value):
+    """Prefixes a text cell that a spreadsheet would evaluate with FORMULA_ESCAPE."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return FORMULA_ESCAPE + value
+    return value
+
+
+class _Echo:
+    """A file-like object whose ``write`` hands back the line, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def _lines(theses, fmt):
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        for thesis in theses:
+            record = _record(thesis)
+            record['tags'] = TAG_SEPARATOR.join(record['tags'])
+            yield writer.writerow([escape_formula(record[name]) for name in FIELDS])
+    else:
+        for thesis in theses:
+            yield json.dumps(_record(thesis), ensure_ascii=False) + '\n'
+
+
+def encode(theses, fmt, size=None):
+    """Yields ``theses`` as ``fmt`` text, joined into one string per ``size`` rows."""
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {', '.join(CONTENT_TYPES)}.")
+    size = size or chunk_size()
+    buffered = []
+    for line in _lines(theses, fmt):
+        buffered.append(line)
+        if len(buffered) >= size:
+            yield ''.join(buffered)
+            buffered = []
+    if buffered:
+        yield ''.join(buffered)
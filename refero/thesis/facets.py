@@ -0,0 +1,91 @@
+"""
+College, program and year facets for the thesis listings.
+
+Counts come from the tag postings snapshot (thesis/tag_postings.py), which
+keeps each thesis's ``(college_id, program_id, year_submitted)`` in memory:
+counting a result set is one pass over its ids, and counting the whole
+catalog is a precomputed lookup. No facet costs a COUNT query.
+"""
+from collections import Counter
+from dataclasses import dataclass
+
+from django.db.models import Q
+
+COLLEGE, PROGRAM, YEAR = 0, 1, 2
+
+
+def _int_param(params, name):
+    try:
+        return int(params.get(name) or '')
+    except ValueError:
+        return None
+
+
+@dataclass
+class FacetFilter:
+    """The ``college``, ``program`` and ``year`` query parameters (ids and a year)."""
+    college: int | None = None
+    program: int | None = None
+    year: int | None = None
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(_int_param(params, 'college'), _int_param(params, 'program'), _int_param(params, 'year'))
+
+    def __bool__(self):
+        return any(value is not None for value in self._values())
+
+    def _values(self):
+        return self.college, self.program, self.year
+
+    def q(self) -> Q:
+        condition = Q()
+        for field, value in zip(('college_id', 'program_id', 'year_submitted'), self._values()):
+            if value is not None:
+                condition &= Q(**{field: value})
+        return condition
+
+    def narrow(self, snap, ids) -> list:
+        """The ids among sorted ``ids`` whose thesis matches this filter, still sorted."""
+        wanted = [(index, value) for index, value in enumerate(self._values()) if value is not None]
+        rows = snap.facet_rows
+        return [pk for pk in ids if pk in rows and all(rows[pk][index] == value for index, value in wanted)]
+
+
+def counts(snap, within=None) -> tuple:
+    """``(colleges, programs, years)`` Counters over ``within`` ids (None means every thesis)."""
+    rows = snap.facet_rows.values() if within is None else (snap.facet_rows[pk] for pk in within if pk in snap.facet_rows)
+    colleges, programs, years = Counter(), Counter(), Counter()
+    for college_id, program_id, year in rows:
+        colleges[college_id] += 1
+        programs[program_id] += 1
+        years[year] += 1
+    return colleges, programs, years
+
+
+def _options(counter, labels, active, order_key):
+    options = [
+        {'value': value, 'label': labels(value), 'count': count, 'active': value == active}
+        for value, count in counter.items()
+    ]
+    return sorted(options, key=order_key)
+
+
+def facet_groups(snap, facet_filter: FacetFilter, within=None) -> dict:
+    """Options for the listing sidebar: ``{'college': [...], 'program': [...], 'year': [...]}``."""
+    colleges, programs, years = counts(snap, within)
+    by_label = lambda option: option['label'].lower()
+    return {
+        'college': _options(colleges, lambda pk: snap.college_names.get(pk, ''), facet_filter.college, by_label),
+        'program': _options(programs, lambda pk: snap.program_names.get(pk, ''), facet_filter.program, by_label),
+        'year': _options(years, str, facet_filter.year, lambda option: -option['value']),
+    }
+
+
+def programs_with_counts(snap) -> list:
+    """Every program with its thesis count, ordered by name, for the home page."""
+    _, programs, _ = counts(snap)
+    return sorted(
+        ({'id': pk, 'name': name, 'count': programs.get(pk, 0)} for pk, name in snap.program_names.items()),
+        key=lambda program: program['name'].lower(),
+    )
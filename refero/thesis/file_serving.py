@@ -0,0 +1,154 @@
+"""
+Serving uploaded thesis PDFs to signed-in users.
+
+Files are streamed with ``FileResponse`` in fixed-size blocks, so a large
+manuscript never sits in a worker's memory. Single ``Range`` requests get a
+206 with just the requested bytes, which lets browser PDF viewers fetch
+pages lazily. Every response carries an ETag and Last-Modified built from
+the file's size and mtime, so a revalidation costs a 304 and no file I/O.
+
+With ``PDF_DELIVERY["SENDFILE_BACKEND"]`` set, Django only checks access and
+answers with an ``X-Sendfile`` (Apache/lighttpd) or ``X-Accel-Redirect``
+(nginx) header; the web server then sends the file and handles ranges itself.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+X_SENDFILE = 'x-sendfile'
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _config(name, default=None):
+    return getattr(settings, 'PDF_DELIVERY', {}).get(name, default)
+
+
+class _RangeFile:
+    """Reads at most ``length`` bytes of ``file`` starting at ``start``."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header: str, size: int):
+    """
+    Returns ``(start, end)`` (inclusive) for a single satisfiable byte range,
+    ``None`` when the header should be ignored (absent, malformed or multi-range),
+    or ``False`` when the range can't be satisfied.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes.
+        length = int(last)
+        # An empty file has no last N bytes to send (RFC 9110 §14.1.1).
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified) -> bool:
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _sendfile_response(path, content_type):
+    response = HttpResponse(content_type=content_type)
+    if _config('SENDFILE_BACKEND') == X_ACCEL_REDIRECT:
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = _config('ACCEL_REDIRECT_PREFIX', '/protected-media/') + quote(relative)
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve_file(request, field_file, as_attachment=False, content_type='application/pdf', **options):
+    """Responds with ``field_file`` (a stored FileField value), honouring conditional and Range headers."""
+    return serve_path(request, field_file.path, as_attachment, content_type, **options)
+
+
+def serve_path(request, path, as_attachment=False, content_type='application/pdf', max_age=None, immutable=False):
+    """
+    Responds with the file at ``path`` under MEDIA_ROOT. ``max_age`` overrides
+    PDF_DELIVERY["MAX_AGE"]; ``immutable`` is for files whose URL changes with their content.
+    """
+    stat = os.stat(path)
+    size, last_modified = stat.st_size, int(stat.st_mtime)
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    filename = os.path.basename(path)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if _config('SENDFILE_BACKEND'):
+            response = _sendfile_response(path, content_type)
+        else:
+            response = _stream(request, path, size, etag, last_modified, filename, as_attachment, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if 'Content-Disposition' not in response and response.status_code < 300:
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+    # The file sits behind a login, so shared caches must not keep it.
+    patch_cache_control(response, private=True, max_age=_config('MAX_AGE', 60 * 60) if max_age is None else max_age)
+    if immutable:
+        patch_cache_control(response, immutable=True)
+    return response
+
+
+def _stream(request, path, size, etag, last_modified, filename, as_attachment, content_type):
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get('Range'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    block_size = _config('BLOCK_SIZE', 64 * 1024)
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), as_attachment=as_attachment, filename=filename,
+                                content_type=content_type)
+        response.block_size = block_size
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = FileResponse(_RangeFile(open(path, 'rb'), start, length), status=206, content_type=content_type)
+    response.block_size = block_size
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -1,6 +1,7 @@
 from django.forms import ModelForm # Simplified import
 from django import forms
-from .models import Thesis, Tag, College, Program 
+from .models import Thesis, Tag, College, Program, UploadSession
+from . import chunked_upload
 import datetime # Needed for dynamic year validation
 
 # Changed base class from forms.ModelForm to ModelForm
@@ -20,6 +21,10 @@ class ThesisUploadForm(ModelForm):
         required=False,
         help_text="Upload the final thesis manuscript in PDF format."
     )
+
+    # Set by the upload page's script once the PDF was sent in chunks (see thesis/chunked_upload.py);
+    # the file input is then left empty.
+    upload_token = forms.UUIDField(widget=forms.HiddenInput, required=False)
     
     # This field MUST be defined explicitly to enforce max_value validation 
     # using Python's datetime library (preventing future years).
@@ -57,8 +62,34 @@ class ThesisUploadForm(ModelForm):
             'panel_score': forms.NumberInput(attrs={'placeholder': 'e.g., 92.5 (Optional)'}),
         }
 
-    def clean_pdf_file(self):
-        file = self.cleaned_data.get('pdf_file')
-        if not file and not getattr(self.instance, 'pk', None):
-            raise forms.ValidationError('Please upload a PDF file for this thesis.')
-        return file
\ No newline at end of file
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.upload_session = None
+
+    def clean_upload_token(self):
+        token = self.cleaned_data.get('upload_token')
+        if token:
+            self.upload_session = UploadSession.objects.filter(pk=token, user=self.user, completed=True).first()
+            if self.upload_session is None:
+                raise forms.ValidationError('The uploaded PDF has expired; please choose the file again.')
+        return token
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('pdf_file') and self.upload_session is None and not getattr(self.instance, 'pk', None):
+            self.add_error('pdf_file', 'Please upload a PDF file for this thesis.')
+        return cleaned_data
+
+    @property
+    def replaces_pdf(self):
+        return 'pdf_file' in self.changed_data or self.upload_session is not None
+
+    def save(self, commit=True):
+        thesis = super().save(commit=False)
+        if self.upload_session is not None:
+            chunked_upload.attach(self.upload_session, thesis)
+        if commit:
+            thesis.save()
+            self._save_m2m()
+        return thesis
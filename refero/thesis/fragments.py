@@ -0,0 +1,87 @@
+"""
+Cached HTML for thesis cards and the static part of the detail page.
+
+Fragments are stored in the ``fragments`` cache under the thesis id and its
+``date_modified``, so an edit never has to delete anything: the next render
+simply asks for a key that doesn't exist yet. Anything a card shows that
+lives outside the thesis row (its tags, college and program names) bumps
+``date_modified`` through ``touch()``, which the signal handlers in
+``thesis/signals.py`` call when tags are added, removed, renamed or deleted
+and when a college or program is renamed.
+
+Listings first load lightweight rows (``stubs()``: just the id and the two
+dates), then ``hydrate()`` looks every card up with one ``get_many`` and only
+loads full rows, with their relations and tags, for the cards that missed.
+The ``{% thesis_fragment %}`` tag in thesis_extras.py renders and stores the
+misses.
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from thesis.models import Thesis
+
+CACHE_ALIAS = 'fragments'
+# Query parameters that move between pages without changing what a card links to.
+PAGING_PARAMS = ('cursor', 'page')
+
+
+def cache():
+    return caches[CACHE_ALIAS]
+
+
+def key(name, thesis, variant='') -> str:
+    return f'fragment:{name}:{thesis.pk}:{thesis.date_modified.timestamp()}:{variant}'
+
+
+def query_variant(request) -> str:
+    """
+    A short digest of the query string minus paging, for fragments whose links
+    depend on the current filters (the listing's tag chips toggle tags in them).
+    """
+    query = request.GET.copy()
+    for param in PAGING_PARAMS:
+        query.pop(param, None)
+    encoded = query.urlencode()
+    return hashlib.sha1(encoded.encode()).hexdigest()[:12] if encoded else ''
+
+
+def stubs(queryset):
+    """``queryset`` loading only what cache keys and keyset pagination need."""
+    return queryset.only('pk', 'date_added', 'date_modified')
+
+
+def hydrate(theses, name, variant, full_queryset) -> list:
+    """
+    Gives every thesis in ``theses`` (stubs) its cached ``name`` fragment, or
+    swaps it for the full row from ``full_queryset`` when none is cached yet.
+    Order is kept.
+    """
+    theses = list(theses)
+    keys = {thesis.pk: key(name, thesis, variant) for thesis in theses}
+    cached = cache().get_many(keys.values())
+    missing = [pk for pk, fragment_key in keys.items() if fragment_key not in cached]
+    full = full_queryset.in_bulk(missing) if missing else {}
+
+    hydrated = []
+    for thesis in theses:
+        if keys[thesis.pk] in cached:
+            thesis.cached_fragments = {name: cached[keys[thesis.pk]]}
+            hydrated.append(thesis)
+        elif thesis.pk in full:
+            # Looked up and missing: the template tag renders it without asking the cache again.
+            full[thesis.pk].cached_fragments = {}
+            hydrated.append(full[thesis.pk])
+    return hydrated
+
+
+def touch(thesis_ids=None, **filters) -> None:
+    """Moves ``date_modified`` forward so cached fragments of these theses stop matching."""
+    theses = Thesis.objects.filter(**filters)
+    if thesis_ids is not None:
+        thesis_ids = list(thesis_ids)
+        if not thesis_ids:
+            return
+        theses = theses.filter(pk__in=thesis_ids)
+    theses.update(date_modified=timezone.now())
@@ -0,0 +1,220 @@
+"""
+Bulk import of thesis catalogs from CSV or JSON Lines files.
+
+Used by ``python manage.py import_theses``. Records are read one at a time
+and written BATCH_SIZE at a time, so memory is bounded by one batch plus the
+lookup maps: colleges, programs and tags are resolved through dicts loaded
+once and extended as new names appear, never through a query per record.
+Each batch is one transaction: new tags in one ``bulk_create``, the theses in
+another (with ``Thesis.tag_ids`` already filled in), and their
+``Thesis.tags`` rows in a third. PDFs named by a record are copied from the
+PDF directory into storage as the record is read, so a PDF that can't be
+read or stored skips only its record; their text extraction and thumbnails
+are queued for the worker.
+
+``bulk_create`` skips the signal handlers, so the importer does their work
+itself: it indexes each batch for search, drops the tag postings snapshot
+and recounts the site statistics at the end. "Similar theses" are left to
+``python manage.py rebuild_similar_theses``.
+"""
+import csv
+import json
+import os
+from dataclasses import dataclass
+
+from django.core.files import File
+from django.db import transaction
+
+from thesis import autocomplete, jobs, search, stats, tag_postings, tagging
+from thesis.export import FORMULA_ESCAPE, FORMULA_PREFIXES
+from thesis.models import College, Program, Tag, Thesis
+
+REQUIRED_FIELDS = ('title', 'authors', 'year_submitted', 'college', 'program')
+TAG_NAME_LENGTH = Tag._meta.get_field('name').max_length
+
+
+class RecordError(ValueError):
+    """A record that can't be imported; the import skips it and carries on."""
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    pdfs: int = 0
+
+
+def _unescape_formula(value):
+    """Undoes ``export.escape_formula`` for a CSV cell."""
+    if isinstance(value, str) and value.startswith(FORMULA_ESCAPE) and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def read_records(path, tag_separator=';'):
+    """Yields ``(line_number, record)`` from a ``.csv`` or ``.jsonl`` file, one at a time."""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            reader = csv.DictReader(handle)
+            for record in reader:
+                record = {name: _unescape_formula(value) for name, value in record.items()}
+                record['tags'] = [name for name in (record.get('tags') or '').split(tag_separator)]
+                yield reader.line_num, record
+    elif path.endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as handle:
+            for number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield number, RecordError(f"invalid JSON: {e}")
+                    continue
+                if not isinstance(record, dict):
+                    yield number, RecordError(f"expected a JSON object, not {type(record).__name__}")
+                    continue
+                if isinstance(record.get('tags'), str):
+                    record['tags'] = record['tags'].split(tag_separator)
+                yield number, record
+    else:
+        raise ValueError("Catalog files must end in .csv or .jsonl.")
+
+
+def _text(record, name) -> str:
+    value = record.get(name)
+    return str(value).strip() if value is not None else ''
+
+
+class Importer:
+    def __init__(self, uploaded_by, pdf_dir=None, batch_size=1000, queue_jobs=True, on_error=None):
+        self.uploaded_by = uploaded_by
+        self.on_error = on_error
+        self.pdf_dir = pdf_dir
+        self.batch_size = batch_size
+        self.queue_jobs = queue_jobs
+        self.colleges = dict(College.objects.values_list('college_name', 'pk'))
+        self.programs = {
+            (college_id, name): pk for pk, college_id, name in Program.objects.values_list('pk', 'college_id', 'prog_name')
+        }
+        self.tags = dict(Tag.objects.values_list('name', 'pk'))
+        self.result = ImportResult()
+
+    def _college_id(self, name):
+        if name not in self.colleges:
+            self.colleges[name] = College.objects.create(college_name=name).pk
+        return self.colleges[name]
+
+    def _program_id(self, college_id, name):
+        key = (college_id, name)
+        if key not in self.programs:
+            self.programs[key] = Program.objects.create(prog_name=name, college_id=college_id).pk
+        return self.programs[key]
+
+    def _pdf_path(self, record):
+        name = _text(record, 'pdf')
+        if not name:
+            return None
+        if self.pdf_dir is None:
+            raise RecordError("names a PDF but no PDF directory was given")
+        path = os.path.join(self.pdf_dir, os.path.basename(name))
+        if not os.path.isfile(path):
+            raise RecordError(f"PDF {name!r} not found")
+        return path
+
+    def _copy_pdf(self, thesis, path):
+        try:
+            with open(path, 'rb') as pdf:
+                thesis.pdf_file.save(os.path.basename(path), File(pdf), save=False)
+        except OSError as e:
+            raise RecordError(f"could not copy PDF {os.path.basename(path)!r}: {e}")
+
+    def _parse(self, record):
+        """Checks a record, copies its PDF and returns ``(Thesis without tags, tag names)``."""
+        missing = [name for name in REQUIRED_FIELDS if not _text(record, name)]
+        if missing:
+            raise RecordError(f"missing {', '.join(missing)}")
+        try:
+            year = int(_text(record, 'year_submitted'))
+            score = _text(record, 'panel_score')
+            panel_score = float(score) if score else None
+        except ValueError:
+            raise RecordError("year_submitted and panel_score must be numbers")
+        tags = record.get('tags') or []
+        if not isinstance(tags, list):
+            raise RecordError("tags must be a list of names")
+        tag_names = sorted({str(name).strip() for name in tags if name is not None and str(name).strip()})
+        too_long = [name for name in tag_names if len(name) > TAG_NAME_LENGTH]
+        if too_long:
+            raise RecordError(f"tag names longer than {TAG_NAME_LENGTH} characters: {too_long}")
+
+        thesis = Thesis(
+            title=_text(record, 'title')[:255],
+            abstract=_text(record, 'abstract'),
+            authors=_text(record, 'authors')[:255],
+            adviser=_text(record, 'adviser')[:255] or None,
+            year_submitted=year,
+            panel_score=panel_score,
+            uploaded_by=self.uploaded_by,
+        )
+        pdf_path = self._pdf_path(record)
+        thesis.college_id = self._college_id(_text(record, 'college'))
+        thesis.program_id = self._program_id(thesis.college_id, _text(record, 'program'))
+        if pdf_path:
+            self._copy_pdf(thesis, pdf_path)
+        return thesis, tag_names
+
+    def run(self, records, progress=None) -> ImportResult:
+        """Imports ``(line_number, record)`` pairs; ``progress(result)`` is called after every batch."""
+        batch = []
+        for number, record in records:
+            try:
+                if isinstance(record, RecordError):
+                    raise record
+                batch.append(self._parse(record))
+            except RecordError as e:
+                self.result.skipped += 1
+                if self.on_error:
+                    self.on_error(number, e)
+                continue
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+                if progress:
+                    progress(self.result)
+        if batch:
+            self._write(batch)
+            if progress:
+                progress(self.result)
+
+        stats.reconcile()
+        return self.result
+
+    def _write(self, batch):
+        with transaction.atomic():
+            new_tags = sorted({name for _, names in batch for name in names} - self.tags.keys())
+            if new_tags:
+                Tag.objects.bulk_create([Tag(name=name) for name in new_tags], ignore_conflicts=True)
+                self.tags.update(Tag.objects.filter(name__in=new_tags).values_list('name', 'pk'))
+
+            for thesis, names in batch:
+                thesis.tag_ids = tagging.encode(self.tags[name] for name in names)
+            created = Thesis.objects.bulk_create([thesis for thesis, _ in batch])
+
+            through = Thesis.tags.through
+            through.objects.bulk_create([
+                through(thesis_id=thesis.pk, tag_id=self.tags[name])
+                for thesis, (_, names) in zip(created, batch)
+                for name in names
+            ])
+
+            thesis_ids = [thesis.pk for thesis in created]
+            search.reindex_theses(thesis_ids)
+            with_pdf = [thesis.pk for thesis in created if thesis.pdf_file]
+            if self.queue_jobs and with_pdf:
+                for name in ('extract_pdf_text', 'render_thumbnails'):
+                    jobs.enqueue_many(name, [{'thesis_id': pk} for pk in with_pdf])
+            tag_postings.invalidate()
+            autocomplete.invalidate()
+
+        self.result.imported += len(created)
+        self.result.pdfs += len(with_pdf)
@@ -0,0 +1,158 @@
+"""
+A small database-backed job queue.
+
+Views call ``enqueue()`` to store a ``Job`` row and return right away; the
+``run_worker`` management command claims due jobs and runs the registered
+handler for each. Failed jobs are retried with exponential backoff and
+marked ``dead`` once they run out of attempts, so they can be inspected
+(and retried) from the admin.
+
+Handlers are plain functions registered with ``@job('name')`` and receive
+the job payload as keyword arguments. They live in ``thesis/tasks.py``.
+"""
+import logging
+import random
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from thesis.models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def _config(name, default):
+    return getattr(settings, 'JOB_QUEUE', {}).get(name, default)
+
+
+def job(name):
+    """Registers the decorated function as the handler for jobs called ``name``."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, **payload) -> Job:
+    if name not in _handlers:
+        raise ValueError(f"No job handler registered for '{name}'.")
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=_config('MAX_ATTEMPTS', 5),
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(name, payloads) -> None:
+    """Queues one ``name`` job per payload in a single INSERT, for bulk operations."""
+    if name not in _handlers:
+        raise ValueError(f"No job handler registered for '{name}'.")
+    now = timezone.now()
+    Job.objects.bulk_create([
+        Job(name=name, payload=payload, max_attempts=_config('MAX_ATTEMPTS', 5), run_at=now)
+        for payload in payloads
+    ])
+
+
+def backoff_seconds(attempts: int, base: float | None = None, maximum: float | None = None) -> float:
+    """Exponential backoff with jitter: base, 2*base, 4*base, ... capped at BACKOFF_MAX."""
+    base = base if base is not None else _config('BACKOFF_BASE', 30)
+    maximum = maximum if maximum is not None else _config('BACKOFF_MAX', 60 * 60)
+    delay = min(base * 2 ** (attempts - 1), maximum)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def requeue_stale() -> int:
+    """Puts back jobs whose worker died mid-run (still 'running' after STALE_AFTER seconds)."""
+    cutoff = timezone.now() - timedelta(seconds=_config('STALE_AFTER', 10 * 60))
+    return Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=cutoff).update(
+        status=Job.STATUS_PENDING, locked_at=None,
+    )
+
+
+def claim(limit: int) -> list:
+    """
+    Marks up to ``limit`` due jobs as running and returns them. The conditional
+    UPDATE means two workers can never claim the same job.
+    """
+    now = timezone.now()
+    candidate_ids = list(
+        Job.objects.filter(status=Job.STATUS_PENDING, run_at__lte=now)
+        .order_by('run_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+
+    claimed = []
+    for pk in candidate_ids:
+        updated = Job.objects.filter(pk=pk, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def run_job(job_obj: Job) -> bool:
+    """Runs one claimed job and records the outcome. Returns True on success."""
+    handler = _handlers.get(job_obj.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No job handler registered for '{job_obj.name}'.")
+        handler(**job_obj.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job_obj.attempts >= job_obj.max_attempts:
+            logger.error("Job %s is dead after %s attempts:\n%s", job_obj, job_obj.attempts, error)
+            Job.objects.filter(pk=job_obj.pk).update(
+                status=Job.STATUS_DEAD, locked_at=None, last_error=error,
+            )
+        else:
+            retry_at = timezone.now() + timedelta(seconds=backoff_seconds(job_obj.attempts))
+            logger.warning("Job %s failed, retrying at %s:\n%s", job_obj, retry_at, error)
+            Job.objects.filter(pk=job_obj.pk).update(
+                status=Job.STATUS_PENDING, locked_at=None, run_at=retry_at, last_error=error,
+            )
+        return False
+
+    Job.objects.filter(pk=job_obj.pk).update(status=Job.STATUS_DONE, locked_at=None)
+    return True
+
+
+def _run_in_thread(job_obj: Job) -> bool:
+    try:
+        return run_job(job_obj)
+    finally:
+        connections.close_all()
+
+
+def run_pending(concurrency: int = 1, limit: int | None = None) -> tuple:
+    """
+    Claims and runs due jobs until none are left (or ``limit`` jobs ran).
+    With ``concurrency`` > 1 each batch runs on a thread pool. Returns ``(succeeded, failed)``.
+    """
+    succeeded = failed = 0
+    executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    try:
+        while limit is None or succeeded + failed < limit:
+            batch_size = concurrency if limit is None else min(concurrency, limit - succeeded - failed)
+            batch = claim(batch_size)
+            if not batch:
+                break
+            results = executor.map(_run_in_thread, batch) if executor else map(run_job, batch)
+            for ok in results:
+                if ok:
+                    succeeded += 1
+                else:
+                    failed += 1
+    finally:
+        if executor:
+            executor.shutdown()
+    return succeeded, failed
@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from thesis import renditions
+from thesis.models import Thesis
+
+
+def _generate(thesis_id, force):
+    try:
+        return thesis_id, renditions.generate(thesis_id, force=force), None
+    except Exception as e:
+        return thesis_id, '', e
+
+
+def _generate_in_thread(thesis_id, force):
+    try:
+        return _generate(thesis_id, force)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Renders first-page thumbnails for theses that have a PDF but no thumbnails yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Theses rendered in parallel (threads).')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render every thesis with a PDF, not just those without thumbnails.')
+
+    def handle(self, *args, **options):
+        theses = Thesis.objects.exclude(pdf_file='')
+        if not options['force']:
+            theses = theses.filter(thumbnail_key='')
+        thesis_ids = list(theses.order_by('pk').values_list('pk', flat=True))
+
+        workers = max(1, options['workers'])
+        force = options['force']
+        started = time.monotonic()
+        rendered = failed = 0
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            if executor:
+                results = executor.map(lambda pk: _generate_in_thread(pk, force), thesis_ids)
+            else:
+                results = (_generate(pk, force) for pk in thesis_ids)
+            for thesis_id, key, error in results:
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"Thesis #{thesis_id}: {error}")
+                elif key:
+                    rendered += 1
+        finally:
+            if executor:
+                executor.shutdown()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered thumbnails for {rendered} of {len(thesis_ids)} theses in {elapsed:.1f}s"
+            f" ({failed} failed)."
+        ))
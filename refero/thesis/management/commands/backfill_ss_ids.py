@@ -1,30 +1,160 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db.models import Q
+
 from thesis.models import Thesis
-from thesis.views import get_paper_id
-import time
+from thesis.semantic_scholar import BATCH_LIMIT, SemanticScholarError, get_papers, search_paper_id
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, with bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
 class Command(BaseCommand):
     help = 'Backfills Semantic Scholar Paper IDs for existing theses'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Theses looked up and written per batch.')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of lookups in flight at once.')
+        parser.add_argument('--rps', type=float, default=1.0,
+                            help='Maximum Semantic Scholar requests per second.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Look up IDs but do not save them or the checkpoint.')
+        parser.add_argument('--checkpoint', default=str(settings.BASE_DIR / '.backfill_ss_ids.checkpoint'),
+                            help='File recording the last processed thesis id, used to resume.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint and start from the first thesis.')
+        parser.add_argument('--verify', action='store_true',
+                            help='First re-check stored IDs through the batch endpoint and clear unknown ones.')
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f).get('last_id', 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_checkpoint(self, path, last_id):
+        with open(path, 'w') as f:
+            json.dump({'last_id': last_id}, f)
+
+    def _verify_existing(self, dry_run):
+        """Resolves stored IDs BATCH_LIMIT at a time and clears the ones Semantic Scholar doesn't know."""
+        stored = Thesis.objects.exclude(ss_paper_id__isnull=True).exclude(ss_paper_id='')
+        last_pk = cleared = 0
+        while True:
+            rows = list(stored.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'ss_paper_id')[:BATCH_LIMIT])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            try:
+                papers = get_papers([ss_id for _, ss_id in rows], fields='paperId')
+            except SemanticScholarError as e:
+                self.stdout.write(self.style.ERROR(f"Verification stopped: {e}"))
+                return
+            unknown = [pk for pk, ss_id in rows if papers.get(ss_id) is None]
+            if unknown and not dry_run:
+                Thesis.objects.filter(pk__in=unknown).update(ss_paper_id=None)
+            cleared += len(unknown)
+        self.stdout.write(f"Verified stored IDs; {cleared} no longer resolve and {'would be' if dry_run else 'were'} cleared.")
+
     def handle(self, *args, **options):
-        theses_without_id = Thesis.objects.filter(ss_paper_id__isnull=True) | Thesis.objects.filter(ss_paper_id='')
-        total = theses_without_id.count()
-        
+        batch_size = max(1, options['batch_size'])
+        concurrency = max(1, options['concurrency'])
+        dry_run = options['dry_run']
+        checkpoint = options['checkpoint']
+
+        if options['verify']:
+            self._verify_existing(dry_run)
+
+        last_id = 0 if options['restart'] else self._read_checkpoint(checkpoint)
+        missing = Thesis.objects.filter(Q(ss_paper_id__isnull=True) | Q(ss_paper_id=''))
+        total = missing.filter(pk__gt=last_id).count()
+
+        if last_id:
+            self.stdout.write(f"Resuming after thesis #{last_id}.")
         self.stdout.write(f"Found {total} theses without Semantic Scholar IDs.")
 
-        for i, thesis in enumerate(theses_without_id, 1):
-            self.stdout.write(f"Processing ({i}/{total}): {thesis.title}")
-            
-            ss_id = get_paper_id(thesis.title)
-            
-            if ss_id:
-                thesis.ss_paper_id = ss_id
-                thesis.save()
-                self.stdout.write(self.style.SUCCESS(f"  -> Found ID: {ss_id}"))
-            else:
-                self.stdout.write(self.style.WARNING(f"  -> No ID found for '{thesis.title}'"))
-            
-            # Sleep briefly to avoid hitting API rate limits too hard
-            time.sleep(1)
-
-        self.stdout.write(self.style.SUCCESS('Backfill process completed.'))
+        bucket = TokenBucket(options['rps'])
+
+        def lookup(thesis):
+            bucket.acquire()
+            try:
+                return thesis, search_paper_id(thesis.title), None
+            except SemanticScholarError as e:
+                return thesis, None, e
+
+        processed = found = failed = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                batch = list(missing.filter(pk__gt=last_id).order_by('pk').only('pk', 'title')[:batch_size])
+                if not batch:
+                    break
+
+                # Lookups run in parallel; results come back in batch order.
+                results = list(executor.map(lookup, batch))
+
+                # ss_paper_id is unique: skip IDs already used by another thesis or earlier in this batch.
+                candidate_ids = {ss_id for _, ss_id, _ in results if ss_id}
+                taken = set(Thesis.objects.filter(ss_paper_id__in=candidate_ids).values_list('ss_paper_id', flat=True))
+                to_update = []
+                for thesis, ss_id, error in results:
+                    if error:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f"  -> Lookup failed for '{thesis.title}': {error}"))
+                    elif ss_id and ss_id not in taken:
+                        taken.add(ss_id)
+                        thesis.ss_paper_id = ss_id
+                        to_update.append(thesis)
+                    elif not ss_id:
+                        self.stdout.write(self.style.WARNING(f"  -> No ID found for '{thesis.title}'"))
+
+                last_id = batch[-1].pk
+                if not dry_run:
+                    Thesis.objects.bulk_update(to_update, ['ss_paper_id'])
+                    self._write_checkpoint(checkpoint, last_id)
+
+                processed += len(batch)
+                found += len(to_update)
+                self.stdout.write(f"Processed {processed}/{total} ({found} IDs found).")
+
+        # A finished run starts from the beginning next time, retrying theses that had no match.
+        if not dry_run and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        verb = 'Would save' if dry_run else 'Saved'
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill process completed: {processed} theses in {elapsed:.1f}s "
+            f"({rate:.2f} theses/s). {verb} {found} IDs, {failed} lookups failed."
+        ))
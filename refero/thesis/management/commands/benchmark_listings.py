@@ -0,0 +1,127 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from thesis import tag_postings, tagging
+from thesis.models import Program, Tag, Thesis
+from thesis.tag_postings import TagFilter
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compares query plans and timings of the thesis listing queries before and after '
+            'the composite indexes and denormalized tag ids')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Times each query is run when timing it.')
+        parser.add_argument('--no-plans', action='store_true',
+                            help='Only print timings, not the EXPLAIN output.')
+
+    def _samples(self):
+        program = Program.objects.annotate(n=Count('theses')).order_by('-n').first()
+        uploader_id = (Thesis.objects.values('uploaded_by').annotate(n=Count('pk'))
+                       .order_by('-n').values_list('uploaded_by', flat=True).first())
+        year = (Thesis.objects.values('year_submitted').annotate(n=Count('pk'))
+                .order_by('-n').values_list('year_submitted', flat=True).first())
+        tag_counts = Counter(pk for value in Thesis.objects.values_list('tag_ids', flat=True)
+                             for pk in tagging.decode(value))
+        by_use = tag_counts.most_common()
+        tag_ids = [pk for pk, _ in by_use[:2]]
+        if program is None or len(tag_ids) < 2:
+            raise CommandError('Needs at least one program and two tags in use; seed some theses first.')
+        # Popular tags fill a page from the first rows of an index scan; a rare one shows the cost of a full scan.
+        rare_tag_id = by_use[-1][0]
+        return program, uploader_id, year, tag_ids, rare_tag_id
+
+    def _cases(self):
+        """``(label, before, after)`` querysets for each listing access pattern."""
+        program, uploader_id, year, tag_ids, rare_tag_id = self._samples()
+        tag_names = list(Tag.objects.filter(pk__in=tag_ids).values_list('name', flat=True))
+        rare_name = Tag.objects.get(pk=rare_tag_id).name
+        newest = ('-date_added', '-id')
+        theses = Thesis.objects.all()
+        # "After" is what the theses page runs: exact ids for selective filters, tag_ids LIKE for broad ones.
+        snap = tag_postings.snapshot()
+        return [
+            ('home: program, newest 6',
+             theses.filter(program__prog_name=program.prog_name).order_by('-date_added')[:6],
+             theses.filter(program__in=Program.objects.filter(prog_name=program.prog_name).values('pk'))
+             .order_by('-date_added')[:6]),
+            ('profile: uploads, newest first',
+             theses.filter(uploaded_by_id=uploader_id).order_by('-date_added'),
+             theses.filter(uploaded_by_id=uploader_id).order_by('-date_added')),
+            ('year and program',
+             theses.filter(year_submitted=year, program=program),
+             theses.filter(year_submitted=year, program=program)),
+            ('tags: any of two, first page',
+             theses.filter(tags__name__in=tag_names).distinct().order_by(*newest)[:10],
+             theses.filter(TagFilter(tag_names, match='any').q(snap)).order_by(*newest)[:10]),
+            ('tags: all of two, first page',
+             theses.filter(tags__id=tag_ids[0]).filter(tags__id=tag_ids[1]).distinct().order_by(*newest)[:10],
+             theses.filter(TagFilter(tag_names).q(snap)).order_by(*newest)[:10]),
+            ('tags: rare tag, first page',
+             theses.filter(tags__id=rare_tag_id).distinct().order_by(*newest)[:10],
+             theses.filter(TagFilter([rare_name]).q(snap)).order_by(*newest)[:10]),
+            ('tags: rare tag, tag_ids LIKE (unused for selective filters)',
+             theses.filter(tags__id=rare_tag_id).distinct().order_by(*newest)[:10],
+             theses.filter(tagging.match_any([rare_tag_id])).order_by(*newest)[:10]),
+        ]
+
+    def _measure(self, queryset, repeat):
+        # Time only the database work, not model instantiation.
+        ids = queryset.values_list('pk', flat=True)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rows = list(ids.all())
+        elapsed = (time.perf_counter() - started) / repeat
+        return queryset.explain(), elapsed * 1000, len(rows)
+
+    def _measure_without_indexes(self, querysets, repeat):
+        """Measures ``querysets`` with the composite indexes dropped inside a rolled-back transaction."""
+        results = []
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for index in Thesis._meta.indexes:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                results = [self._measure(queryset, repeat) for queryset in querysets]
+                raise _Rollback
+        except _Rollback:
+            pass
+        return results
+
+    def _report(self, title, plan, ms, rows, show_plans):
+        self.stdout.write(f"  {title}: {ms:.2f} ms, {rows} rows")
+        if show_plans:
+            for line in plan.splitlines():
+                self.stdout.write(f"      {line}")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        show_plans = not options['no_plans']
+        cases = self._cases()
+
+        if connection.features.can_rollback_ddl:
+            before = self._measure_without_indexes([old for _, old, _ in cases], repeat)
+            before_title = 'before (old query, no composite indexes)'
+        else:
+            # Dropping indexes can't be undone here, so "before" keeps them and only the query shape differs.
+            self.stdout.write(self.style.WARNING(
+                f"{connection.vendor} can't roll back DDL; 'before' runs with the composite indexes in place."
+            ))
+            before = [self._measure(old, repeat) for _, old, _ in cases]
+            before_title = 'before (old query)'
+
+        for (label, _, new), old_result in zip(cases, before):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self._report(before_title, *old_result, show_plans)
+            self._report('after', *self._measure(new, repeat), show_plans)
+
+        self.stdout.write(self.style.SUCCESS(f"Benchmarked {len(cases)} listing queries, {repeat} runs each."))
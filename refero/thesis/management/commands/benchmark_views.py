@@ -0,0 +1,109 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+from django.utils import timezone
+
+from thesis import benchmark
+from thesis.models import Thesis
+
+
+class Command(BaseCommand):
+    help = ('Requests every page in refero/urls.py through the test client and writes p50/p95/p99 '
+            'latency and queries per request to a JSON file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json', help='JSON report to write.')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per page.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Threads sending requests at once.')
+        parser.add_argument('--warmup', type=int, default=1,
+                            help='Untimed requests per page first (fills caches and snapshots).')
+        parser.add_argument('--user',
+                            help='Username to sign in as (defaults to the user with the most theses).')
+        parser.add_argument('--stub-latency', type=float, default=0.0,
+                            help='Seconds the stubbed Semantic Scholar recommendations take to answer.')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Only pages whose label contains this text (repeatable).')
+        parser.add_argument('--label', default='', help='Free text stored in the report, e.g. a commit id.')
+        parser.add_argument('--compare', help='An earlier report to print p95 and query differences against.')
+
+    def _user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username!r}.")
+        user = User.objects.annotate(n=Count('uploaded_theses')).order_by('-n', 'pk').first()
+        if user is None:
+            raise CommandError("No users yet; run seed_catalog first.")
+        return user
+
+    def _compare(self, report, path):
+        try:
+            with open(path, encoding='utf-8') as handle:
+                baseline = {case['label']: case for case in json.load(handle)['cases']}
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not read {path}: {e}")
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Compared with {path}"))
+        for case in report['cases']:
+            old = baseline.get(case['label'])
+            if old is None or 'skipped' in case or 'skipped' in old:
+                continue
+            self.stdout.write(
+                f"  {case['label']}: p95 {old['p95_ms']} -> {case['p95_ms']} ms,"
+                f" queries {old['avg_queries']} -> {case['avg_queries']}"
+            )
+
+    def handle(self, *args, **options):
+        user = self._user(options['user'])
+        requests = max(1, options['requests'])
+        try:
+            cases, skipped = benchmark.cases(user)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['only']:
+            cases = [case for case in cases if any(text in case.label for text in options['only'])]
+
+        results = []
+        started = time.monotonic()
+        # The test client talks to "testserver"; no mail leaves the process.
+        test_settings = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        )
+        with test_settings, benchmark.stub_semantic_scholar(options['stub_latency']):
+            for case in cases:
+                result = benchmark.run_case(case, user, requests, options['concurrency'], options['warmup'])
+                results.append(result)
+                if 'skipped' in result:
+                    self.stdout.write(f"{case.label}: skipped ({result['skipped']})")
+                else:
+                    self.stdout.write(
+                        f"{case.label}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms,"
+                        f" p99 {result['p99_ms']} ms, {result['avg_queries']} queries"
+                    )
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'label': options['label'],
+            'database': connection.vendor,
+            'theses': Thesis.objects.count(),
+            'user': user.username,
+            'requests': requests,
+            'concurrency': options['concurrency'],
+            'cases': results,
+            'skipped': skipped,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+        if options['compare']:
+            self._compare(report, options['compare'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmarked {len(results)} pages in {time.monotonic() - started:.1f}s; report written to {options['output']}."
+        ))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from thesis import export
+
+
+class Command(BaseCommand):
+    help = 'Writes the theses matching the theses page filters to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write, or "-" for standard output.')
+        parser.add_argument('--format', choices=sorted(export.CONTENT_TYPES),
+                            help='Output format (defaults to the output file extension, else csv).')
+        parser.add_argument('--filters', default='',
+                            help='Query string as on the theses page, e.g. "q=flood&tag=GIS&year=2023".')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Theses read per query (defaults to EXPORT["CHUNK_SIZE"]).')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('jsonl' if output.endswith(('.jsonl', '.ndjson')) else 'csv')
+        size = max(1, options['chunk_size'] or export.chunk_size())
+        params = QueryDict(options['filters'])
+
+        exported = 0
+
+        def counted(theses):
+            nonlocal exported
+            for thesis in theses:
+                exported += 1
+                yield thesis
+
+        started = time.monotonic()
+        rows = export.encode(counted(export.matching_theses(params, size)), fmt, size)
+        if output == '-':
+            for text in rows:
+                self.stdout.write(text, ending='')
+            return
+        try:
+            with open(output, 'w', newline='', encoding='utf-8') as handle:
+                for text in rows:
+                    handle.write(text)
+        except OSError as e:
+            raise CommandError(f"Could not write {output}: {e}")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {exported} theses to {output} in {elapsed:.1f}s"
+            f" ({exported / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
@@ -0,0 +1,70 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from thesis.importer import Importer, read_records
+
+
+class Command(BaseCommand):
+    help = 'Imports theses from a CSV or JSON Lines catalog, optionally with a directory of their PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', help='A .csv or .jsonl file with one thesis per row or line.')
+        parser.add_argument('--uploader', required=True,
+                            help='Username recorded as the uploader of every imported thesis.')
+        parser.add_argument('--pdf-dir',
+                            help='Directory holding the PDFs named in the "pdf" column.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Theses inserted per batch (and per transaction).')
+        parser.add_argument('--tag-separator', default=';',
+                            help='Separator between tag names in the "tags" column.')
+        parser.add_argument('--no-jobs', action='store_true',
+                            help="Don't queue text extraction and thumbnails for imported PDFs.")
+
+    def handle(self, *args, **options):
+        catalog = options['catalog']
+        if not os.path.isfile(catalog):
+            raise CommandError(f"No such file: {catalog}")
+        if not catalog.endswith(('.csv', '.jsonl', '.ndjson')):
+            raise CommandError("Catalog files must end in .csv or .jsonl.")
+        pdf_dir = options['pdf_dir']
+        if pdf_dir and not os.path.isdir(pdf_dir):
+            raise CommandError(f"No such directory: {pdf_dir}")
+        try:
+            uploader = User.objects.get(username=options['uploader'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['uploader']!r}.")
+
+        started = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{result.imported} imported, {result.skipped} skipped"
+                f" ({result.imported / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+
+        def skipped(line, error):
+            self.stderr.write(f"Line {line}: {error}")
+
+        importer = Importer(
+            uploader,
+            pdf_dir=pdf_dir,
+            batch_size=max(1, options['batch_size']),
+            queue_jobs=not options['no_jobs'],
+            on_error=skipped,
+        )
+        result = importer.run(read_records(catalog, options['tag_separator']), progress=progress)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.imported} theses ({result.pdfs} with PDFs) in {elapsed:.1f}s"
+            f" ({result.imported / elapsed if elapsed else 0:.0f} rows/s); {result.skipped} skipped."
+        ))
+        if result.imported:
+            self.stdout.write(
+                "Run rebuild_similar_theses to link them to similar theses,"
+                " and backfill_ss_ids to look up their Semantic Scholar IDs."
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from thesis import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index for every thesis'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING(
+                'The configured database does not support full-text search; nothing to rebuild.'
+            ))
+            return
+
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} theses.'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from thesis import similarity
+
+
+class Command(BaseCommand):
+    help = 'Recomputes TF-IDF vectors and the "similar theses" table for every thesis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Theses vectorized and written per batch.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = similarity.rebuild(max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt similar theses for {count} theses in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from thesis import stats
+
+
+class Command(BaseCommand):
+    help = 'Recounts the cached site statistics from the database and fixes any drift'
+
+    def handle(self, *args, **options):
+        for name, (cached, actual) in stats.reconcile().items():
+            if cached is None:
+                self.stdout.write(f"{name}: {actual} (was not cached)")
+            elif cached != actual:
+                self.stdout.write(self.style.WARNING(f"{name}: {cached} -> {actual}"))
+            else:
+                self.stdout.write(f"{name}: {actual}")
+        self.stdout.write(self.style.SUCCESS('Site statistics reconciled.'))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from thesis import chunked_upload, jobs, outbox
+
+# Jobs run per worker thread before queued emails are checked again.
+JOBS_PER_PASS = 10
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (Semantic Scholar lookups, etc.) and sends queued emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Number of jobs to run in parallel (threads).')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait before checking an empty queue again.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever.')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        self.stdout.write(f"Worker started with concurrency {concurrency}.")
+
+        try:
+            while True:
+                requeued = jobs.requeue_stale()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale jobs."))
+                purged = chunked_upload.purge_expired()
+                if purged:
+                    self.stdout.write(f"Removed {purged} abandoned uploads.")
+
+                requeued = outbox.requeue_stale()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale emails."))
+                outbox.purge_sent()
+
+                # Someone is waiting at a browser for a password reset code.
+                sent, unsent = outbox.deliver_pending()
+                if sent or unsent:
+                    self.stdout.write(f"Sent {sent} emails ({unsent} failed).")
+
+                # Jobs run in short slices so queued emails never wait behind a long backlog.
+                succeeded, failed = jobs.run_pending(concurrency=concurrency, limit=JOBS_PER_PASS * concurrency)
+                if succeeded or failed:
+                    self.stdout.write(f"Ran {succeeded + failed} jobs ({succeeded} ok, {failed} failed).")
+                if not (succeeded or failed or sent or unsent):
+                    if options['burst']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Worker stopped.")
+            return
+
+        self.stdout.write(self.style.SUCCESS('Queue is empty.'))
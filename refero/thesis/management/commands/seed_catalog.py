@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from thesis import seeding
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with a synthetic catalog (colleges, programs, tags, users, theses) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--theses', type=int, default=100000, help='Theses to add.')
+        parser.add_argument('--colleges', type=int, default=8)
+        parser.add_argument('--programs', type=int, default=4, help='Programs per college.')
+        parser.add_argument('--tags', type=int, default=300)
+        parser.add_argument('--users', type=int, default=200, help='Uploaders the theses are spread over.')
+        parser.add_argument('--abstract-words', type=int, default=180, help='Average abstract length in words.')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Theses inserted per batch.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same catalog.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{result.imported} theses ({result.imported / elapsed if elapsed else 0:.0f} rows/s)")
+
+        result = seeding.seed(
+            max(0, options['theses']),
+            colleges=max(1, options['colleges']),
+            programs_per_college=max(1, options['programs']),
+            tags=max(1, options['tags']),
+            users=max(1, options['users']),
+            abstract_words=max(10, options['abstract_words']),
+            batch_size=max(1, options['batch_size']),
+            seed=options['seed'],
+            progress=progress,
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {result.imported} theses in {elapsed:.1f}s"
+            f" ({result.imported / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+        self.stdout.write("Run rebuild_similar_theses to fill in similar theses before benchmarking detail pages.")
@@ -0,0 +1,125 @@
+"""
+Per-request performance metrics.
+
+``RequestMetricsMiddleware`` opens a ``RequestMetrics`` record for every
+request; database queries are timed through a connection execute wrapper and
+outbound HTTP calls (Semantic Scholar) report themselves with
+``record_external()``. Finished requests are aggregated per view in this
+process and exposed by the staff-only ``api:metrics`` endpoint.
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+# Latency samples kept per view for percentiles.
+SAMPLE_SIZE = 500
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+@dataclass
+class RequestMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_time: float = 0.0
+    external_calls: int = 0
+    external_time: float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+def start() -> tuple:
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token) -> None:
+    _current.reset(token)
+
+
+def current() -> RequestMetrics | None:
+    return _current.get()
+
+
+def record_external(seconds: float) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.external_calls += 1
+        metrics.external_time += seconds
+
+
+def query_timer(execute, sql, params, many, context):
+    """Connection execute wrapper that adds each query to the current request's metrics."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def percentile_ms(latencies, p):
+    """The ``p`` quantile of sorted ``latencies`` (seconds) in milliseconds, or None when empty."""
+    if not latencies:
+        return None
+    return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+
+class _ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.external_time = 0.0
+        self.total_time = 0.0
+        self.max_queries = 0
+        self.latencies = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, metrics: RequestMetrics, elapsed: float):
+        self.requests += 1
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.db_time += metrics.db_time
+        self.external_time += metrics.external_time
+        self.total_time += elapsed
+        self.latencies.append(elapsed)
+
+    def as_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_time / self.requests * 1000, 2),
+            'avg_external_ms': round(self.external_time / self.requests * 1000, 2),
+            'avg_total_ms': round(self.total_time / self.requests * 1000, 2),
+            'p50_ms': percentile_ms(latencies, 0.50),
+            'p95_ms': percentile_ms(latencies, 0.95),
+            'p99_ms': percentile_ms(latencies, 0.99),
+        }
+
+
+_views = defaultdict(_ViewStats)
+_lock = threading.Lock()
+
+
+def record(view_name: str, metrics: RequestMetrics, elapsed: float) -> None:
+    with _lock:
+        _views[view_name].add(metrics, elapsed)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {name: stats.as_dict() for name, stats in sorted(_views.items())}
+
+
+def reset() -> None:
+    with _lock:
+        _views.clear()
@@ -0,0 +1,64 @@
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from thesis import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, database time, external HTTP time and total latency
+    for every request, aggregated per view (see thesis/metrics.py). With
+    DEBUG on, the numbers are also sent back as response headers.
+
+    Async requests (the recommendations endpoint) run their ORM calls on other
+    threads, so only their external HTTP time and latency are recorded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request_metrics, token = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.query_timer))
+                response = self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self._finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self._finish(request, response, request_metrics)
+
+    def _finish(self, request, response, request_metrics):
+        elapsed = request_metrics.elapsed
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        metrics.record(view_name, request_metrics, elapsed)
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(request_metrics.queries)
+            response['X-DB-Time-Ms'] = f'{request_metrics.db_time * 1000:.2f}'
+            response['X-External-Time-Ms'] = f'{request_metrics.external_time * 1000:.2f}'
+            response['Server-Timing'] = (
+                f'db;dur={request_metrics.db_time * 1000:.2f}, '
+                f'external;dur={request_metrics.external_time * 1000:.2f}, '
+                f'total;dur={elapsed * 1000:.2f}'
+            )
+        return response
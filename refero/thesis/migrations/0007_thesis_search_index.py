@@ -0,0 +1,74 @@
+from django.db import migrations
+
+SQLITE_CREATE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS thesis_search USING fts5(
+        title, authors, abstract, tags,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+SQLITE_POPULATE = """
+    INSERT INTO thesis_search (rowid, title, authors, abstract, tags)
+    SELECT t.id, t.title, t.authors, t.abstract,
+           COALESCE((
+               SELECT group_concat(tag.name, ' ')
+               FROM thesis_thesis_tags tt
+               JOIN thesis_tag tag ON tag.id = tt.tag_id
+               WHERE tt.thesis_id = t.id
+           ), '')
+    FROM thesis_thesis t
+"""
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE IF NOT EXISTS thesis_search (
+        thesis_id bigint PRIMARY KEY REFERENCES thesis_thesis (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS thesis_search_document_gin ON thesis_search USING GIN (document)",
+]
+
+POSTGRES_POPULATE = """
+    INSERT INTO thesis_search (thesis_id, document)
+    SELECT t.id,
+           setweight(to_tsvector('simple', t.title), 'A')
+           || setweight(to_tsvector('simple', COALESCE(tags.names, '')), 'B')
+           || setweight(to_tsvector('simple', t.authors), 'C')
+           || setweight(to_tsvector('simple', t.abstract), 'D')
+    FROM thesis_thesis t
+    LEFT JOIN (
+        SELECT tt.thesis_id, string_agg(tag.name, ' ') AS names
+        FROM thesis_thesis_tags tt
+        JOIN thesis_tag tag ON tag.id = tt.tag_id
+        GROUP BY tt.thesis_id
+    ) tags ON tags.thesis_id = t.id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_POPULATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+        schema_editor.execute(POSTGRES_POPULATE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS thesis_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thesis', '0006_seed_default_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:25
+
+from django.conf import settings
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def populate_tag_ids(apps, schema_editor):
+    Thesis = apps.get_model('thesis', 'Thesis')
+    tags_by_thesis = defaultdict(set)
+    for thesis_id, tag_id in Thesis.tags.through.objects.values_list('thesis_id', 'tag_id'):
+        tags_by_thesis[thesis_id].add(tag_id)
+
+    theses = []
+    for thesis_id, tag_ids in tags_by_thesis.items():
+        theses.append(Thesis(pk=thesis_id, tag_ids=f",{','.join(map(str, sorted(tag_ids)))},"))
+    Thesis.objects.bulk_update(theses, ['tag_ids'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thesis', '0008_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thesis',
+            name='tag_ids',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(populate_tag_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='thesis',
+            index=models.Index(fields=['uploaded_by', '-date_added'], name='thesis_uploader_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thesis',
+            index=models.Index(fields=['program', '-date_added'], name='thesis_program_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thesis',
+            index=models.Index(fields=['year_submitted', 'program'], name='thesis_year_program_idx'),
+        ),
+    ]
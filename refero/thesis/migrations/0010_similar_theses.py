@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thesis', '0009_thesis_listing_indexes_tag_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThesisVector',
+            fields=[
+                ('date_added', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('thesis', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='thesis.thesis')),
+                ('terms', models.JSONField(default=dict)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarThesis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_added', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='thesis.thesis')),
+                ('thesis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='thesis.thesis')),
+            ],
+            options={
+                'verbose_name_plural': 'Similar theses',
+                'indexes': [models.Index(fields=['thesis', 'rank'], name='thesis_similar_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('thesis', 'similar'), name='thesis_similar_pair_unique')],
+            },
+        ),
+    ]
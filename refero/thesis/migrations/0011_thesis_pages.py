@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# External-content FTS5 index over thesis_thesispage.text; rows are added and
+# removed by thesis/search.py so the page text is stored only once.
+SQLITE_CREATE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS thesis_page_search USING fts5(
+        text,
+        content = 'thesis_thesispage',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE IF NOT EXISTS thesis_page_search (
+        page_id bigint PRIMARY KEY REFERENCES thesis_thesispage (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS thesis_page_search_document_gin ON thesis_page_search USING GIN (document)",
+]
+
+
+def create_page_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_page_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS thesis_page_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thesis', '0010_similar_theses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThesisPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_added', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('page_number', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True)),
+                ('thesis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='thesis.thesis')),
+            ],
+            options={
+                'ordering': ['thesis', 'page_number'],
+                'constraints': [models.UniqueConstraint(fields=('thesis', 'page_number'), name='thesis_page_number_unique')],
+            },
+        ),
+        migrations.RunPython(create_page_search_index, drop_page_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thesis', '0012_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thesis',
+            name='thumbnail_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thesis', '0013_thesis_thumbnail_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='thesis',
+            index=models.Index(fields=['date_modified'], name='thesis_modified_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class BaseModel(models.Model):
@@ -41,6 +44,10 @@ class Thesis(BaseModel):
     pdf_file = models.FileField(upload_to='theses_pdf/', verbose_name="Thesis PDF File", blank=True)
     view_count = models.PositiveIntegerField(default=0)
     ss_paper_id = models.CharField(max_length=100, null=True, blank=True, unique=True)
+    # Copy of the tag ids (",3,7,12,") for join-free filtering; see thesis/tagging.py.
+    tag_ids = models.TextField(blank=True, default='', editable=False)
+    # Content hash in the names of the first-page thumbnails; see thesis/renditions.py.
+    thumbnail_key = models.CharField(max_length=16, blank=True, default='', editable=False)
 
     def __str__(self):
         return self.title
@@ -48,3 +55,146 @@ class Thesis(BaseModel):
     class Meta:
         verbose_name = "Thesis"
         verbose_name_plural = "Theses"
+        indexes = [
+            models.Index(fields=['uploaded_by', '-date_added'], name='thesis_uploader_recent_idx'),
+            models.Index(fields=['program', '-date_added'], name='thesis_program_recent_idx'),
+            models.Index(fields=['year_submitted', 'program'], name='thesis_year_program_idx'),
+            # MAX(date_modified) validates cached pages; see thesis/conditional.py.
+            models.Index(fields=['date_modified'], name='thesis_modified_idx'),
+        ]
+
+
+class Job(BaseModel):
+    """A unit of background work picked up by the `run_worker` management command."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_DEAD, 'Dead'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='thesis_job_status_run_at_idx'),
+        ]
+
+
+class OutboxEmail(BaseModel):
+    """An email waiting to be handed to the provider; see thesis/outbox.py."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    recipients = models.TextField(help_text="Comma-separated To addresses, for the admin list")
+    # Everything needed to rebuild the EmailMessage (body, alternatives, cc, headers, ...).
+    message = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=6)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipients} ({self.status})"
+
+    class Meta:
+        verbose_name = "Outbox email"
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='thesis_outbox_status_run_idx'),
+        ]
+
+
+class ThesisVector(BaseModel):
+    """Term counts of a thesis's title, abstract and tags, used by thesis/similarity.py."""
+    thesis = models.OneToOneField('Thesis', on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    terms = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Vector for thesis #{self.thesis_id}"
+
+
+class SimilarThesis(BaseModel):
+    """One precomputed "similar in this repository" neighbour of a thesis."""
+    thesis = models.ForeignKey('Thesis', on_delete=models.CASCADE, related_name='similar_entries')
+    similar = models.ForeignKey('Thesis', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"#{self.thesis_id} ~ #{self.similar_id} ({self.score:.3f})"
+
+    class Meta:
+        verbose_name_plural = "Similar theses"
+        constraints = [
+            models.UniqueConstraint(fields=['thesis', 'similar'], name='thesis_similar_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['thesis', 'rank'], name='thesis_similar_rank_idx'),
+        ]
+
+
+class ThesisPage(BaseModel):
+    """Text extracted from one page of a thesis PDF, kept out of the Thesis row so listings never load it."""
+    thesis = models.ForeignKey('Thesis', on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"#{self.thesis_id} page {self.page_number}"
+
+    class Meta:
+        ordering = ['thesis', 'page_number']
+        constraints = [
+            models.UniqueConstraint(fields=['thesis', 'page_number'], name='thesis_page_number_unique'),
+        ]
+
+
+class UploadSession(BaseModel):
+    """A PDF being uploaded in chunks; see thesis/chunked_upload.py."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # SHA-256 of the whole file, if the client sent one; checked on completion.
+    sha256 = models.CharField(max_length=64, blank=True)
+    # Bytes stored so far; the next chunk must start here.
+    received = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class SharedCounter(BaseModel):
+    """A named number bumped with an F() update, so concurrent processes never read the same value."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
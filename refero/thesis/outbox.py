@@ -0,0 +1,180 @@
+"""
+Asynchronous email delivery through an outbox table.
+
+``EMAIL_BACKEND`` is ``OutboxBackend``, so ``send_mail()`` (the password
+reset code) and allauth's emails only insert ``OutboxEmail`` rows, in the
+caller's transaction, and return in milliseconds whatever the provider is
+doing. ``deliver_pending()``, run by ``python manage.py run_worker``, claims
+due messages in batches of EMAIL_OUTBOX["BATCH_SIZE"] and sends each batch
+over one connection of the real backend, EMAIL_OUTBOX["BACKEND"] (SendGrid
+through anymail in production; the console or file backend locally). A
+message that fails is retried with the job queue's exponential backoff and
+marked ``dead`` after EMAIL_OUTBOX["MAX_ATTEMPTS"] tries; dead messages can
+be retried from the admin. A sent message's content is cleared as soon
+as the provider accepts it; only the subject, recipients and status are
+kept, for EMAIL_OUTBOX["KEEP_SENT"] seconds.
+
+Messages carry secrets such as password reset codes, so the admin never
+shows their content and only superusers can see the outbox at all.
+
+Messages are stored as JSON, so attachments are not supported; nothing in
+the app sends any.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import F
+from django.utils import timezone
+
+from thesis.jobs import backoff_seconds
+from thesis.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'anymail.backends.sendgrid.EmailBackend'
+
+
+def _config(name, default):
+    return getattr(settings, 'EMAIL_OUTBOX', {}).get(name, default)
+
+
+def _serialize(message) -> dict:
+    if message.attachments:
+        raise ValueError("The email outbox can't store attachments.")
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+        'content_subtype': message.content_subtype,
+    }
+
+
+def _deserialize(data, connection) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        subject=data['subject'], body=data['body'], from_email=data['from_email'],
+        to=data['to'], cc=data['cc'], bcc=data['bcc'], reply_to=data['reply_to'],
+        headers=data['headers'], connection=connection,
+    )
+    for content, mimetype in data['alternatives']:
+        message.attach_alternative(content, mimetype)
+    message.content_subtype = data['content_subtype']
+    return message
+
+
+class OutboxBackend(BaseEmailBackend):
+    """An email backend that stores messages for the worker instead of sending them."""
+
+    def send_messages(self, email_messages):
+        rows = [
+            OutboxEmail(
+                subject=message.subject[:255],
+                recipients=', '.join(message.to),
+                message=_serialize(message),
+                max_attempts=_config('MAX_ATTEMPTS', 6),
+            )
+            for message in email_messages
+            if message.recipients()
+        ]
+        OutboxEmail.objects.bulk_create(rows)
+        return len(rows)
+
+
+def requeue_stale() -> int:
+    """Puts back messages whose worker died mid-send (still 'sending' after STALE_AFTER seconds)."""
+    cutoff = timezone.now() - timedelta(seconds=_config('STALE_AFTER', 10 * 60))
+    return OutboxEmail.objects.filter(status=OutboxEmail.STATUS_SENDING, locked_at__lt=cutoff).update(
+        status=OutboxEmail.STATUS_PENDING, locked_at=None,
+    )
+
+
+def claim(limit: int) -> list:
+    """Marks up to ``limit`` due messages as sending and returns them; see ``jobs.claim()``."""
+    now = timezone.now()
+    candidate_ids = list(
+        OutboxEmail.objects.filter(status=OutboxEmail.STATUS_PENDING, run_at__lte=now)
+        .order_by('run_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    claimed = [
+        pk for pk in candidate_ids
+        if OutboxEmail.objects.filter(pk=pk, status=OutboxEmail.STATUS_PENDING).update(
+            status=OutboxEmail.STATUS_SENDING, locked_at=now, attempts=F('attempts') + 1,
+        )
+    ]
+    return list(OutboxEmail.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def _failed(email, error) -> None:
+    if email.attempts >= email.max_attempts:
+        logger.error("Email %s is dead after %s attempts: %s", email.pk, email.attempts, error)
+        OutboxEmail.objects.filter(pk=email.pk).update(
+            status=OutboxEmail.STATUS_DEAD, locked_at=None, last_error=error,
+        )
+        return
+    delay = backoff_seconds(email.attempts, _config('BACKOFF_BASE', 30), _config('BACKOFF_MAX', 60 * 60))
+    logger.warning("Email %s failed, retrying in %.0fs: %s", email.pk, delay, error)
+    OutboxEmail.objects.filter(pk=email.pk).update(
+        status=OutboxEmail.STATUS_PENDING, locked_at=None,
+        run_at=timezone.now() + timedelta(seconds=delay), last_error=error,
+    )
+
+
+def _send_batch(batch) -> tuple:
+    sent = []
+    failed = 0
+    connection = get_connection(_config('BACKEND', DEFAULT_BACKEND), fail_silently=False)
+    try:
+        # One connection (SMTP session or HTTP keep-alive) for the whole batch.
+        connection.open()
+        for email in batch:
+            try:
+                _deserialize(email.message, connection).send()
+            except Exception as e:
+                failed += 1
+                _failed(email, f"{type(e).__name__}: {e}")
+            else:
+                sent.append(email.pk)
+    except Exception as e:
+        # The connection itself failed: every message not sent yet is retried.
+        for email in batch[len(sent) + failed:]:
+            failed += 1
+            _failed(email, f"{type(e).__name__}: {e}")
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.warning("Closing the email connection failed.", exc_info=True)
+    # Sent bodies (reset codes among them) aren't needed any more.
+    OutboxEmail.objects.filter(pk__in=sent).update(
+        status=OutboxEmail.STATUS_SENT, locked_at=None, sent_at=timezone.now(), last_error='', message={},
+    )
+    return len(sent), failed
+
+
+def purge_sent() -> int:
+    cutoff = timezone.now() - timedelta(seconds=_config('KEEP_SENT', 7 * 24 * 60 * 60))
+    deleted, _ = OutboxEmail.objects.filter(status=OutboxEmail.STATUS_SENT, sent_at__lt=cutoff).delete()
+    return deleted
+
+
+def deliver_pending(limit: int | None = None) -> tuple:
+    """Sends due messages batch by batch until none are left (or ``limit`` were tried). Returns ``(sent, failed)``."""
+    sent = failed = 0
+    batch_size = _config('BATCH_SIZE', 50)
+    while limit is None or sent + failed < limit:
+        batch = claim(batch_size if limit is None else min(batch_size, limit - sent - failed))
+        if not batch:
+            break
+        batch_sent, batch_failed = _send_batch(batch)
+        sent += batch_sent
+        failed += batch_failed
+    return sent, failed
@@ -0,0 +1,113 @@
+"""
+Keyset (cursor) pagination for thesis listings, newest first.
+
+Pages are addressed by an opaque cursor holding the ``(date_added, id)`` of
+the row at the page boundary, so every page costs an indexed range scan on
+``date_added`` instead of an OFFSET scan plus a COUNT over the whole filtered
+join. Totals are approximate: they come from a short-lived cached COUNT.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+ORDERING = ('-date_added', '-id')
+COUNT_CACHE_TTL = 5 * 60
+
+# Ids are stored in a signed 64-bit column; anything outside it can't be a row.
+MAX_ID = 2 ** 63 - 1
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def encode_cursor(thesis, direction=FORWARD) -> str:
+    raw = json.dumps([thesis.date_added.isoformat(), thesis.pk, direction])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Returns ``(date_added, id, direction)``, or None for a missing or malformed cursor."""
+    if not value:
+        return None
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        date_added, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+        date_added = parse_datetime(date_added)
+        pk = int(pk)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if date_added is None or direction not in (FORWARD, BACKWARD) or not -MAX_ID - 1 <= pk <= MAX_ID:
+        return None
+    return date_added, pk, direction
+
+
+class CursorPage:
+    """One page of a keyset-paginated listing. Iterates like a Paginator page."""
+    is_cursor_page = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_keyset(queryset, cursor: str | None, per_page: int) -> CursorPage:
+    position = decode_cursor(cursor)
+
+    if position is None:
+        rows = list(queryset.order_by(*ORDERING)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        return CursorPage(rows, next_cursor=encode_cursor(rows[-1]) if has_more else None)
+
+    date_added, pk, direction = position
+    if direction == FORWARD:
+        after = Q(date_added__lt=date_added) | Q(date_added=date_added, id__lt=pk)
+        rows = list(queryset.filter(after).order_by(*ORDERING)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1]) if has_more else None,
+            previous_cursor=encode_cursor(rows[0], BACKWARD) if rows else None,
+        )
+
+    # Walking backwards: read the rows just before the cursor in ascending order, then flip them.
+    before = Q(date_added__gt=date_added) | Q(date_added=date_added, id__gt=pk)
+    rows = list(queryset.filter(before).order_by('date_added', 'id')[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page][::-1]
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if rows else None,
+        previous_cursor=encode_cursor(rows[0], BACKWARD) if has_more else None,
+    )
+
+
+def approximate_count(queryset, ttl: int = COUNT_CACHE_TTL) -> int:
+    """COUNT(*) for ``queryset``, cached for ``ttl`` seconds per distinct SQL query."""
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.sha1(f'{sql}|{params}'.encode()).hexdigest()
+    key = f'count:{digest}'
+
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, ttl)
+    return count
@@ -0,0 +1,72 @@
+"""
+Text extraction from uploaded thesis PDFs.
+
+``extract()`` runs in the background worker (the ``extract_pdf_text`` job in
+thesis/tasks.py) after an upload or a PDF replacement. pypdf parses pages
+on demand, and extracted text is written PAGE_BATCH pages at a time, so a
+200-page manuscript never has more than one batch of text in memory. The
+text lands in ``ThesisPage`` (one row per page) and in the page search
+index, which lets search hits link to ``#page=N`` of the PDF.
+"""
+import logging
+import re
+
+from django.db import transaction
+from pypdf import PdfReader
+from pypdf.errors import PdfReadError
+
+from thesis import fragments, search
+from thesis.models import Thesis, ThesisPage
+
+logger = logging.getLogger(__name__)
+
+PAGE_BATCH = 20
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def clean(text: str) -> str:
+    # NUL bytes show up in some PDFs' text and PostgreSQL rejects them.
+    return _WHITESPACE_RE.sub(' ', (text or '').replace('\x00', ' ')).strip()
+
+
+def remove(thesis_id: int) -> None:
+    """Drops a thesis's stored pages and their index rows."""
+    with transaction.atomic():
+        search.unindex_pages([thesis_id])
+        ThesisPage.objects.filter(thesis_id=thesis_id).delete()
+
+
+def _write(pages: list) -> None:
+    if not pages:
+        return
+    with transaction.atomic():
+        created = ThesisPage.objects.bulk_create(pages)
+        search.index_pages([page.pk for page in created])
+
+
+def extract(thesis_id: int) -> int:
+    """Replaces the stored text of a thesis with its PDF's text. Returns the number of pages stored."""
+    thesis = Thesis.objects.filter(pk=thesis_id).only('pdf_file').first()
+    remove(thesis_id)
+    if thesis is None or not thesis.pdf_file:
+        return 0
+
+    stored = 0
+    with thesis.pdf_file.open('rb') as pdf:
+        try:
+            reader = PdfReader(pdf, strict=False)
+            batch = []
+            for number, page in enumerate(reader.pages, start=1):
+                batch.append(ThesisPage(thesis_id=thesis_id, page_number=number, text=clean(page.extract_text())))
+                if len(batch) >= PAGE_BATCH:
+                    _write(batch)
+                    stored += len(batch)
+                    batch = []
+            _write(batch)
+            stored += len(batch)
+        except PdfReadError as e:
+            # A broken file won't parse on retry either; keep what was read and move on.
+            logger.warning("Could not extract text from thesis #%s: %s", thesis_id, e)
+    # Search result cards quote the page text, so cached ones must be redrawn.
+    fragments.touch([thesis_id])
+    return stored
@@ -0,0 +1,179 @@
+"""
+First-page thumbnails of thesis PDFs.
+
+``generate()`` runs in the background worker (the ``render_thumbnails`` job
+in thesis/tasks.py) after an upload or a PDF replacement, and from
+``python manage.py backfill_renditions`` for older theses. It renders the
+first page once, at the largest of RENDITIONS["WIDTHS"], and scales that
+image down for the other widths:
+
+1. with pypdfium2 (in requirements.txt), which renders the page itself.
+   PDFium isn't thread-safe, so renders are serialized by a lock; the
+   worker and ``backfill_renditions`` both run jobs on threads;
+2. if that isn't installed or fails, with pypdf, by taking an image drawn
+   over the whole first page, which for a scanned manuscript is the scan of
+   the page. Smaller images (logos, banners, figures) are never passed off
+   as the page;
+3. otherwise as a Pillow-drawn placeholder card carrying the title.
+
+The JPEGs are stored under ``renditions/<thesis id>/<key>-<width>.jpg``,
+where ``key`` is a hash of the rendered image, and the key is copied to
+``Thesis.thumbnail_key`` so cards can build their ``<img srcset>`` without
+a query. A new PDF gives a new key and so new URLs, which is what allows
+``thesis_thumbnail`` to send them with a year-long, immutable Cache-Control.
+"""
+import hashlib
+import io
+import logging
+import textwrap
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+from pypdf import PdfReader
+
+from thesis.models import Thesis
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = 'renditions'
+# Page shape (height / width) of placeholders: A4.
+PAGE_RATIO = 1.414
+# Share of the page's width and height an image must be drawn over to count as a scan of it.
+SCAN_COVERAGE = 0.9
+# Held around every pypdfium2 call: PDFium crashes when used from two threads at once.
+_pdfium_lock = threading.Lock()
+
+
+def _config(name, default):
+    return getattr(settings, 'RENDITIONS', {}).get(name, default)
+
+
+def widths() -> tuple:
+    return tuple(sorted(_config('WIDTHS', (160, 320, 640))))
+
+
+def max_age() -> int:
+    return _config('MAX_AGE', 365 * 24 * 60 * 60)
+
+
+def file_name(thesis_id, key, width) -> str:
+    return f'{DIRECTORY}/{thesis_id}/{key}-{width}.jpg'
+
+
+def _render_with_pdfium(pdf, width):
+    with _pdfium_lock:
+        document = pypdfium2.PdfDocument(pdf)
+        try:
+            page = document[0]
+            return page.render(scale=width / page.get_width()).to_pil()
+        finally:
+            document.close()
+
+
+def _page_scan(pdf):
+    """The image drawn over (nearly) all of the first page, or None."""
+    page = PdfReader(pdf, strict=False).pages[0]
+    page_width, page_height = float(page.mediabox.width), float(page.mediabox.height)
+    covering = set()
+
+    def visit(operator, operands, cm, tm):
+        # An image is drawn into the unit square mapped through the current matrix ``cm``.
+        if operator == b'Do' and operands:
+            a, b, c, d = cm[:4]
+            if (abs(a) + abs(c) >= SCAN_COVERAGE * page_width
+                    and abs(b) + abs(d) >= SCAN_COVERAGE * page_height):
+                covering.add(str(operands[0]).lstrip('/'))
+
+    page.extract_text(visitor_operand_before=visit)
+    if not covering:
+        return None
+    images = [image.image for image in page.images if image.name.rsplit('.', 1)[0] in covering]
+    images = [image for image in images if image is not None]
+    return max(images, key=lambda image: image.width * image.height, default=None)
+
+
+def _placeholder(title, width):
+    height = round(width * PAGE_RATIO)
+    image = Image.new('RGB', (width, height), '#f8fafc')
+    draw = ImageDraw.Draw(image)
+    margin = width // 10
+    draw.rectangle([margin // 2, margin // 2, width - margin // 2, height - margin // 2], outline='#cbd5e1', width=2)
+    font = ImageFont.load_default(size=max(width // 14, 10))
+    lines = textwrap.wrap(title or 'Thesis', width=18)[:8]
+    draw.multiline_text((margin, margin * 2), '\n'.join(lines), fill='#0f172a', font=font, spacing=width // 40)
+    return image
+
+
+def render_first_page(pdf, title, width):
+    """The first page of the open PDF file ``pdf`` as a PIL image about ``width`` pixels wide."""
+    if pypdfium2 is not None:
+        try:
+            return _render_with_pdfium(pdf, width)
+        except Exception as e:
+            logger.warning("pypdfium2 could not render %r: %s", title, e)
+    try:
+        pdf.seek(0)
+        image = _page_scan(pdf)
+        if image is not None:
+            return image
+    except Exception as e:
+        # Broken files and image filters pypdf can't decode both end up as placeholders.
+        logger.warning("Could not read the first page scan of %r: %s", title, e)
+    return _placeholder(title, width)
+
+
+def _encode(image, width) -> bytes:
+    scaled = image.convert('RGB')
+    scaled.thumbnail((width, round(width * PAGE_RATIO * 2)), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    scaled.save(buffer, 'JPEG', quality=_config('QUALITY', 80), optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def remove(thesis_id, keep='') -> None:
+    """Deletes stored renditions of a thesis, except those named with key ``keep``."""
+    directory = f'{DIRECTORY}/{thesis_id}'
+    if not default_storage.exists(directory):
+        return
+    for name in default_storage.listdir(directory)[1]:
+        if not keep or not name.startswith(f'{keep}-'):
+            default_storage.delete(f'{directory}/{name}')
+
+
+def generate(thesis_id, force=False) -> str:
+    """
+    Renders and stores every width for a thesis and returns its new key
+    ('' when it has no PDF). Unchanged images keep their key, and so their URLs.
+    """
+    thesis = Thesis.objects.filter(pk=thesis_id).only('title', 'pdf_file', 'thumbnail_key').first()
+    if thesis is None:
+        remove(thesis_id)
+        return ''
+    if not thesis.pdf_file:
+        key = ''
+    else:
+        sizes = widths()
+        with thesis.pdf_file.open('rb') as pdf:
+            source = render_first_page(pdf, thesis.title, sizes[-1])
+        encoded = {width: _encode(source, width) for width in sizes}
+        key = hashlib.sha256(encoded[sizes[-1]]).hexdigest()[:16]
+        for width, data in encoded.items():
+            name = file_name(thesis_id, key, width)
+            if force and default_storage.exists(name):
+                default_storage.delete(name)
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(data))
+
+    if key != thesis.thumbnail_key:
+        Thesis.objects.filter(pk=thesis_id).update(thumbnail_key=key, date_modified=timezone.now())
+    remove(thesis_id, keep=key)
+    return key
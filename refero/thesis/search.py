@@ -0,0 +1,297 @@
+"""
+Full-text search over the thesis catalog.
+
+SQLite uses an FTS5 virtual table ranked with bm25(), PostgreSQL uses a
+tsvector column with a GIN index ranked with ts_rank_cd(). The index lives in
+its own table (``thesis_search``) keyed by thesis id and is kept in sync by the
+signal handlers in ``thesis/signals.py``. Other backends fall back to the plain
+icontains scan of ``contains_q()``.
+
+Text extracted from thesis PDFs (``ThesisPage``, see thesis/pdf_text.py) has
+a second index, ``thesis_page_search``, one row per page. Theses that only
+match in their body are ranked after the metadata matches, and
+``page_hits()`` finds the best page of each hit so results can deep-link
+into the PDF. On SQLite it is an external-content FTS5 table reading the
+page text from ``thesis_thesispage``, so its rows must be removed (with
+``unindex_pages()``) before the page rows are deleted.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from thesis.models import Tag, Thesis, ThesisPage
+
+SEARCH_TABLE = 'thesis_search'
+PAGE_SEARCH_TABLE = 'thesis_page_search'
+
+# Hard cap on ranked hits so a one-letter prefix can't pull the whole catalog.
+MAX_RESULTS = 1000
+# Matching PDF pages read when looking for theses that only match in their body.
+MAX_PAGE_ROWS = 5000
+
+# Relative column weights for bm25(): title, authors, abstract, tags.
+SQLITE_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_MAX_TOKENS = 10
+
+
+def is_supported() -> bool:
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def contains_q(query: str) -> Q:
+    """The unranked icontains match used where full-text search isn't available (needs ``.distinct()``)."""
+    return (
+        Q(title__icontains=query)
+        | Q(authors__icontains=query)
+        | Q(abstract__icontains=query)
+        | Q(tags__name__icontains=query)
+    )
+
+
+def _tokens(query: str) -> list:
+    return _TOKEN_RE.findall(query.lower())[:_MAX_TOKENS]
+
+
+def _match_expression(query: str) -> str:
+    """Turns free text into a prefix query: every word must match as a prefix."""
+    tokens = _tokens(query)
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f'{token}:*' for token in tokens)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _populate_sql(where: str = '') -> str:
+    thesis_table = Thesis._meta.db_table
+    tag_table = Tag._meta.db_table
+    through_table = Thesis.tags.through._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        return f"""
+            INSERT INTO {SEARCH_TABLE} (thesis_id, document)
+            SELECT t.id,
+                   setweight(to_tsvector('simple', t.title), 'A')
+                   || setweight(to_tsvector('simple', COALESCE(tags.names, '')), 'B')
+                   || setweight(to_tsvector('simple', t.authors), 'C')
+                   || setweight(to_tsvector('simple', t.abstract), 'D')
+            FROM {thesis_table} t
+            LEFT JOIN (
+                SELECT tt.thesis_id, string_agg(tag.name, ' ') AS names
+                FROM {through_table} tt
+                JOIN {tag_table} tag ON tag.id = tt.tag_id
+                GROUP BY tt.thesis_id
+            ) tags ON tags.thesis_id = t.id
+            {where}
+            ON CONFLICT (thesis_id) DO UPDATE SET document = EXCLUDED.document
+        """
+
+    return f"""
+        INSERT INTO {SEARCH_TABLE} (rowid, title, authors, abstract, tags)
+        SELECT t.id, t.title, t.authors, t.abstract,
+               COALESCE((
+                   SELECT group_concat(tag.name, ' ')
+                   FROM {through_table} tt
+                   JOIN {tag_table} tag ON tag.id = tt.tag_id
+                   WHERE tt.thesis_id = t.id
+               ), '')
+        FROM {thesis_table} t
+        {where}
+    """
+
+
+def _delete_sql(placeholders: str) -> str:
+    if connection.vendor == 'postgresql':
+        return f'DELETE FROM {SEARCH_TABLE} WHERE thesis_id IN ({placeholders})'
+    return f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})'
+
+
+def reindex_theses(thesis_ids) -> None:
+    """Rebuilds the index rows for the given theses in two statements."""
+    thesis_ids = [int(pk) for pk in thesis_ids]
+    if not thesis_ids or not is_supported():
+        return
+
+    placeholders = ', '.join(['%s'] * len(thesis_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(_delete_sql(placeholders), thesis_ids)
+        cursor.execute(_populate_sql(f'WHERE t.id IN ({placeholders})'), thesis_ids)
+
+
+def index_thesis(thesis: Thesis) -> None:
+    reindex_theses([thesis.pk])
+
+
+def remove_theses(thesis_ids) -> None:
+    thesis_ids = [int(pk) for pk in thesis_ids]
+    if not thesis_ids or not is_supported():
+        return
+
+    placeholders = ', '.join(['%s'] * len(thesis_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(_delete_sql(placeholders), thesis_ids)
+
+
+def rebuild() -> int:
+    """Drops every index row and re-populates the table from the catalog."""
+    if not is_supported():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(_populate_sql())
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'DELETE FROM {PAGE_SEARCH_TABLE}')
+            cursor.execute(_page_insert_sql())
+        else:
+            cursor.execute(f"INSERT INTO {PAGE_SEARCH_TABLE} ({PAGE_SEARCH_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def _page_insert_sql(where: str = '') -> str:
+    page_table = ThesisPage._meta.db_table
+    if connection.vendor == 'postgresql':
+        return f"""
+            INSERT INTO {PAGE_SEARCH_TABLE} (page_id, document)
+            SELECT p.id, to_tsvector('simple', p.text) FROM {page_table} p {where}
+        """
+    return f"""
+        INSERT INTO {PAGE_SEARCH_TABLE} (rowid, text)
+        SELECT p.id, p.text FROM {page_table} p {where}
+    """
+
+
+def index_pages(page_ids) -> None:
+    """Adds the ``ThesisPage`` rows ``page_ids`` to the page index."""
+    page_ids = [int(pk) for pk in page_ids]
+    if not page_ids or not is_supported():
+        return
+
+    placeholders = ', '.join(['%s'] * len(page_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(_page_insert_sql(f'WHERE p.id IN ({placeholders})'), page_ids)
+
+
+def unindex_pages(thesis_ids) -> None:
+    """Removes the pages of ``thesis_ids`` from the page index. Call it while the page rows still exist."""
+    thesis_ids = [int(pk) for pk in thesis_ids]
+    if not thesis_ids or not is_supported():
+        return
+
+    page_table = ThesisPage._meta.db_table
+    placeholders = ', '.join(['%s'] * len(thesis_ids))
+    if connection.vendor == 'postgresql':
+        sql = f"""
+            DELETE FROM {PAGE_SEARCH_TABLE}
+            WHERE page_id IN (SELECT id FROM {page_table} WHERE thesis_id IN ({placeholders}))
+        """
+    else:
+        # External-content FTS5 deletes need the original text, read back from the page table.
+        sql = f"""
+            INSERT INTO {PAGE_SEARCH_TABLE} ({PAGE_SEARCH_TABLE}, rowid, text)
+            SELECT 'delete', p.id, p.text FROM {page_table} p WHERE p.thesis_id IN ({placeholders})
+        """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, thesis_ids)
+
+
+def _ranked_pages_sql(where: str = '', snippets: bool = False) -> str:
+    """SELECT of ``(thesis_id, page_number, score[, snippet])`` for matching pages; lower score is better."""
+    page_table = ThesisPage._meta.db_table
+    if connection.vendor == 'postgresql':
+        snippet = (
+            """, ts_headline('simple', p.text, to_tsquery('simple', %s),
+                             'StartSel="", StopSel="", MaxWords=20, MinWords=8')"""
+            if snippets else ''
+        )
+        return f"""
+            SELECT p.thesis_id, p.page_number,
+                   -ts_rank_cd(s.document, to_tsquery('simple', %s)) AS score{snippet}
+            FROM {PAGE_SEARCH_TABLE} s
+            JOIN {page_table} p ON p.id = s.page_id
+            WHERE s.document @@ to_tsquery('simple', %s) {where}
+        """
+    snippet = f", snippet({PAGE_SEARCH_TABLE}, 0, '', '', '…', 16)" if snippets else ''
+    return f"""
+        SELECT p.thesis_id, p.page_number, bm25({PAGE_SEARCH_TABLE}) AS score{snippet}
+        FROM {PAGE_SEARCH_TABLE}
+        JOIN {page_table} p ON p.id = {PAGE_SEARCH_TABLE}.rowid
+        WHERE {PAGE_SEARCH_TABLE} MATCH %s {where}
+    """
+
+
+def _ranked_pages_params(expression: str, snippets: bool = False) -> list:
+    if connection.vendor == 'postgresql':
+        return [expression] * (3 if snippets else 2)
+    return [expression]
+
+
+def search_thesis_ids(query: str, limit: int | None = MAX_RESULTS) -> list:
+    """
+    Returns thesis ids matching ``query``, best match first: theses whose
+    metadata matches, then theses that only match in their PDF text.
+    ``limit=None`` returns every match (exports use it; pages keep the cap).
+    """
+    expression = _match_expression(query)
+    if not expression:
+        return []
+
+    limit_sql = '' if limit is None else 'LIMIT %s'
+    limit_params = [] if limit is None else [limit]
+    if connection.vendor == 'postgresql':
+        sql = f"""
+            SELECT thesis_id FROM {SEARCH_TABLE}
+            WHERE document @@ to_tsquery('simple', %s)
+            ORDER BY ts_rank_cd(document, to_tsquery('simple', %s)) DESC, thesis_id DESC
+            {limit_sql}
+        """
+        params = [expression, expression] + limit_params
+    else:
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        sql = f"""
+            SELECT rowid FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH %s
+            ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid DESC
+            {limit_sql}
+        """
+        params = [expression] + limit_params
+
+    # Best pages first; one thesis can match on many pages, so dedupe while reading.
+    body_sql = _ranked_pages_sql() + ' ORDER BY score'
+    body_params = _ranked_pages_params(expression)
+    if limit is not None:
+        body_sql += ' LIMIT %s'
+        body_params.append(MAX_PAGE_ROWS)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+        if limit is None or len(ids) < limit:
+            cursor.execute(body_sql, body_params)
+            seen = set(ids)
+            for thesis_id, *_ in cursor:
+                if thesis_id not in seen:
+                    seen.add(thesis_id)
+                    ids.append(thesis_id)
+                    if limit is not None and len(ids) >= limit:
+                        break
+        return ids
+
+
+def page_hits(query: str, thesis_ids) -> dict:
+    """``{thesis_id: (page_number, snippet)}``: the best matching PDF page of each of ``thesis_ids``."""
+    expression = _match_expression(query)
+    thesis_ids = [int(pk) for pk in thesis_ids]
+    if not expression or not thesis_ids or not is_supported():
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(thesis_ids))
+    sql = _ranked_pages_sql(f'AND p.thesis_id IN ({placeholders})', snippets=True) + ' ORDER BY score'
+    hits = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, _ranked_pages_params(expression, snippets=True) + thesis_ids)
+        for thesis_id, page_number, _, snippet in cursor.fetchall():
+            hits.setdefault(thesis_id, (page_number, snippet))
+    return hits
@@ -0,0 +1,182 @@
+"""
+Synthetic catalogs for load testing.
+
+``python manage.py seed_catalog`` fills the database with made-up colleges,
+programs, tags, users and theses, so that behaviour at production scale
+(listings over hundreds of thousands of rows, filters over unevenly used
+tags, search over full-length abstracts) can be reproduced locally and
+measured with ``python manage.py benchmark_views``. Everything is drawn
+from one seeded ``random.Random``, so the same arguments give the same
+catalog.
+
+The shapes follow the real catalog: abstract lengths are roughly normal
+around ``abstract_words`` words, tag use follows a Zipf curve (a few tags
+are on a large share of theses, most are rare), each thesis has one to six
+tags, and theses are spread unevenly over colleges, uploaders and years.
+Records are generated one at a time and written by the importer
+(thesis/importer.py), so seeding is batched, uses ``bulk_create`` and runs
+in bounded memory the same way ``import_theses`` does.
+"""
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from thesis.importer import Importer
+
+FIELDS = (
+    'Computer Science', 'Information Technology', 'Civil Engineering', 'Biology', 'Chemistry',
+    'Mathematics', 'Physics', 'Nursing', 'Accountancy', 'Education', 'Psychology', 'Economics',
+    'Agriculture', 'Fisheries', 'Architecture', 'Statistics',
+)
+TOPICS = (
+    'Machine Learning', 'Flood Risk', 'Mangrove', 'Dengue', 'Rice Yield', 'Solar Energy',
+    'Microfinance', 'Literacy', 'Water Quality', 'Coral Reef', 'Traffic', 'E-Government',
+    'Blockchain', 'Telemedicine', 'Soil Erosion', 'Aquaculture', 'Tourism', 'Waste Management',
+    'Disaster Response', 'Mobile Learning', 'Food Security', 'Air Quality', 'Cybersecurity',
+    'Public Health', 'Urban Planning', 'Remote Sensing', 'Small Business', 'Mental Health',
+)
+ASPECTS = (
+    'Analysis', 'Modeling', 'Mapping', 'Assessment', 'Forecasting', 'Monitoring', 'Policy',
+    'Design', 'Survey', 'Optimization',
+)
+TITLE_TEMPLATES = (
+    '{aspect} of {topic} in {place}',
+    'A {field} approach to {topic} {aspect}',
+    '{topic} and {other}: a case study in {place}',
+    'Towards better {topic} {aspect} for {place}',
+    'Effects of {topic} on {other} among students in {place}',
+)
+PLACES = (
+    'Iloilo', 'Cebu', 'Davao', 'Bacolod', 'Tacloban', 'Baguio', 'Zamboanga', 'Cagayan de Oro',
+    'Puerto Princesa', 'Legazpi', 'Dumaguete', 'General Santos',
+)
+WORDS = (
+    'the', 'of', 'and', 'to', 'in', 'a', 'study', 'data', 'results', 'system', 'model', 'using',
+    'was', 'were', 'with', 'for', 'on', 'this', 'research', 'analysis', 'respondents', 'method',
+    'significant', 'level', 'proposed', 'based', 'survey', 'findings', 'local', 'community',
+    'performance', 'design', 'evaluation', 'conducted', 'sample', 'factors', 'impact', 'rate',
+    'accuracy', 'framework', 'implementation', 'development', 'provincial', 'municipal',
+    'households', 'students', 'teachers', 'farmers', 'patients', 'users', 'network', 'sensor',
+    'application', 'regression', 'correlation', 'questionnaire', 'interview', 'field', 'baseline',
+    'increase', 'decrease', 'difference', 'relationship', 'recommendations', 'limitations',
+)
+FIRST_NAMES = ('Maria', 'Jose', 'Ana', 'Juan', 'Mark', 'Angela', 'John', 'Kristine', 'Paolo', 'Grace',
+               'Miguel', 'Andrea', 'Carlo', 'Bea', 'Rafael', 'Joy', 'Daniel', 'Camille', 'Ramon', 'Liza')
+LAST_NAMES = ('Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Villanueva',
+              'Ramos', 'Aquino', 'Castillo', 'Navarro', 'Dela Cruz', 'Gonzales', 'Lopez', 'Salazar', 'Perez')
+# Exponent of the Zipf curves: higher makes the most used tags and words more dominant.
+ZIPF_EXPONENT = 1.1
+TAGS_PER_THESIS = (1, 2, 2, 3, 3, 3, 4, 4, 5, 6)
+
+
+def _zipf_weights(count, exponent=ZIPF_EXPONENT):
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def tag_names(count) -> list:
+    """``count`` distinct tag names, the most natural-sounding first."""
+    names = list(TOPICS) + [f'{topic} {aspect}' for topic in TOPICS for aspect in ASPECTS]
+    for number in itertools.count(2):
+        if len(names) >= count:
+            break
+        names += [f'{topic} {aspect} {number}' for topic in TOPICS for aspect in ASPECTS]
+    return names[:count]
+
+
+def seed_users(count, prefix='seed') -> list:
+    """Creates ``count`` users named ``<prefix><n>`` (unless they exist) and returns them in order."""
+    usernames = [f'{prefix}{number}' for number in range(1, count + 1)]
+    password = make_password(None)
+    User.objects.bulk_create(
+        [User(username=name, email=f'{name}@example.com', password=password) for name in usernames],
+        ignore_conflicts=True,
+    )
+    users = User.objects.in_bulk(usernames, field_name='username')
+    return [users[name] for name in usernames]
+
+
+class CatalogGenerator:
+    def __init__(self, colleges=8, programs_per_college=4, tags=300, abstract_words=180, seed=0):
+        self.random = random.Random(seed)
+        fields = [FIELDS[number % len(FIELDS)] + (f' {number // len(FIELDS) + 1}' if number >= len(FIELDS) else '')
+                  for number in range(colleges)]
+        self.colleges = [f'College of {field}' for field in fields]
+        self.programs = {
+            college: [f'BS {field} Track {track}' if track else f'BS {field}' for track in range(programs_per_college)]
+            for college, field in zip(self.colleges, fields)
+        }
+        self.fields = dict(zip(self.colleges, fields))
+        self.tags = tag_names(tags)
+        self.tag_weights = _zipf_weights(len(self.tags))
+        self.word_weights = _zipf_weights(len(WORDS))
+        self.abstract_words = abstract_words
+        # Some colleges are far busier than others.
+        self.college_weights = _zipf_weights(len(self.colleges))
+        self._user_cum_weights = {}
+
+    def _user_weights(self, count):
+        # Uploaders are skewed more gently: a busy archivist, not one account with half the catalog.
+        if count not in self._user_cum_weights:
+            self._user_cum_weights[count] = _zipf_weights(count, exponent=0.5)
+        return self._user_cum_weights[count]
+
+    def _abstract(self):
+        length = max(40, int(self.random.gauss(self.abstract_words, self.abstract_words / 3)))
+        words = self.random.choices(WORDS, cum_weights=self.word_weights, k=length)
+        sentences = [' '.join(words[start:start + 18]).capitalize() + '.' for start in range(0, length, 18)]
+        return ' '.join(sentences)
+
+    def _authors(self):
+        return ', '.join(
+            f'{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}'
+            for _ in range(self.random.randint(1, 4))
+        )
+
+    def record(self, user_ids) -> dict:
+        rng = self.random
+        college = rng.choices(self.colleges, cum_weights=self.college_weights)[0]
+        tags = set(rng.choices(self.tags, cum_weights=self.tag_weights, k=rng.choice(TAGS_PER_THESIS)))
+        topic, other = rng.sample(TOPICS, 2)
+        title = rng.choice(TITLE_TEMPLATES).format(
+            topic=topic, other=other.lower(), aspect=rng.choice(ASPECTS), place=rng.choice(PLACES),
+            field=self.fields[college],
+        )
+        return {
+            'title': title,
+            'abstract': self._abstract(),
+            'authors': self._authors(),
+            'adviser': f'Prof. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            # Recent years have more theses.
+            'year_submitted': 2025 - min(int(rng.expovariate(0.25)), 25),
+            'panel_score': round(rng.uniform(75, 99), 1) if rng.random() < 0.8 else None,
+            'college': college,
+            'program': rng.choice(self.programs[college]),
+            'tags': sorted(tags),
+            'uploaded_by_id': rng.choices(user_ids, cum_weights=self._user_weights(len(user_ids)))[0],
+        }
+
+    def records(self, count, user_ids):
+        """Yields ``(number, record)`` pairs as ``Importer.run()`` takes them."""
+        for number in range(1, count + 1):
+            yield number, self.record(user_ids)
+
+
+class _SeedImporter(Importer):
+    """An importer that takes each thesis's uploader from its record."""
+
+    def _parse(self, record):
+        thesis, tag_names = super()._parse(record)
+        thesis.uploaded_by_id = record['uploaded_by_id']
+        return thesis, tag_names
+
+
+def seed(theses, colleges=8, programs_per_college=4, tags=300, users=200, abstract_words=180,
+         batch_size=2000, seed=0, user_prefix='seed', progress=None):
+    """Adds ``theses`` synthetic theses (and whatever colleges, programs, tags and users they need)."""
+    generator = CatalogGenerator(colleges, programs_per_college, tags, abstract_words, seed)
+    seeded_users = seed_users(max(1, users), user_prefix)
+    importer = _SeedImporter(seeded_users[0], batch_size=batch_size, queue_jobs=False)
+    user_ids = [user.pk for user in seeded_users]
+    return importer.run(generator.records(theses, user_ids), progress=progress)
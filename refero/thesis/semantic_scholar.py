@@ -0,0 +1,320 @@
+"""
+Semantic Scholar client used by the thesis pages, the job queue and the
+backfill command.
+
+All sync calls go through one ``SemanticScholarClient`` holding a pooled
+``requests.Session`` (keep-alive, urllib3 ``Retry`` on 429/5xx). Failures
+are logged and raised as ``SemanticScholarError``.
+
+Results are kept in the default Django cache (a database table, so entries
+survive restarts and are shared by every worker). Fresh entries are served
+as-is; stale entries are served immediately while a background thread
+refreshes them; "no paper found" answers are cached for a shorter time.
+
+The ``a``-prefixed functions are the async equivalents used by the ASGI
+recommendations endpoint; they talk to the API through httpx so a slow
+upstream call doesn't hold a worker thread.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from thesis import metrics
+
+logger = logging.getLogger(__name__)
+
+SS_API_BASE_URL = "https://api.semanticscholar.org/graph/v1"
+SS_RECOMMENDATIONS_URL = "https://api.semanticscholar.org/recommendations/v1/papers/forpaper/"
+
+RECOMMENDATION_FIELDS = 'title,authors.name,year,abstract'
+# The /paper/batch endpoint accepts at most this many IDs per request.
+BATCH_LIMIT = 500
+
+CACHE_KEY_PREFIX = 'ss'
+# Seconds a refresh lock is held so concurrent requests don't all revalidate.
+REVALIDATE_LOCK_TTL = 60
+
+
+class SemanticScholarError(Exception):
+    """Raised when the API can't be reached or returns an error or malformed body."""
+
+
+def _config(name, default=None):
+    return settings.SEMANTIC_SCHOLAR_CONFIG.get(name, default)
+
+
+def _headers():
+    headers = {'Content-Type': 'application/json'}
+    # Unauthenticated requests are allowed, just with a lower rate limit.
+    if _config("API_KEY"):
+        headers['x-api-key'] = _config("API_KEY")
+    return headers
+
+
+def normalize_title(title: str) -> str:
+    return ' '.join(title.lower().split())
+
+
+class SemanticScholarClient:
+    def __init__(self, timeout=None, retries=None, pool_size=None):
+        self.timeout = timeout or _config("TIMEOUT", 10)
+        retry = Retry(
+            total=_config("RETRIES", 3) if retries is None else retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET', 'POST'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        pool_size = pool_size or _config("POOL_SIZE", 10)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(_headers())
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _request(self, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.warning("Semantic Scholar %s %s failed: %s", method, url, e)
+            raise SemanticScholarError(str(e)) from e
+        except ValueError as e:
+            logger.warning("Semantic Scholar %s %s returned invalid JSON: %s", method, url, e)
+            raise SemanticScholarError(str(e)) from e
+        finally:
+            metrics.record_external(time.perf_counter() - started)
+
+    def search_paper_id(self, title: str) -> str | None:
+        """Uses the /paper/search endpoint to find a paper's unique ID."""
+        data = self._request('GET', f"{SS_API_BASE_URL}/paper/search", params={
+            'query': title,
+            'fields': 'paperId',
+            'limit': 1,
+        })
+        if data.get('data'):
+            return data['data'][0].get('paperId')
+        return None
+
+    def recommendations(self, paper_id: str, limit: int = 5) -> list:
+        data = self._request('GET', f"{SS_RECOMMENDATIONS_URL}{paper_id}", params={
+            'fields': RECOMMENDATION_FIELDS,
+            'limit': limit,
+        })
+        return data.get('recommendedPapers', [])
+
+    def get_papers(self, paper_ids, fields: str = 'paperId,title,year') -> dict:
+        """
+        Resolves many paper IDs through /paper/batch, BATCH_LIMIT per request.
+        Returns ``{paper_id: paper}``; IDs Semantic Scholar doesn't know map to None.
+        """
+        paper_ids = list(dict.fromkeys(paper_ids))
+        papers = {}
+        for start in range(0, len(paper_ids), BATCH_LIMIT):
+            chunk = paper_ids[start:start + BATCH_LIMIT]
+            results = self._request('POST', f"{SS_API_BASE_URL}/paper/batch",
+                                    params={'fields': fields}, json={'ids': chunk})
+            # Results come back in request order, with null for unknown IDs.
+            papers.update(zip(chunk, results))
+        return papers
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SemanticScholarClient:
+    """Returns the process-wide client so every caller shares one connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SemanticScholarClient()
+    return _client
+
+
+def search_paper_id(title: str) -> str | None:
+    """Uncached ID lookup. Raises SemanticScholarError so callers can retry."""
+    return get_client().search_paper_id(title)
+
+
+def get_papers(paper_ids, fields: str = 'paperId,title,year') -> dict:
+    return get_client().get_papers(paper_ids, fields)
+
+
+def _cache_key(kind: str, value: str) -> str:
+    digest = hashlib.sha1(value.encode('utf-8')).hexdigest()
+    return f'{CACHE_KEY_PREFIX}:{kind}:{digest}'
+
+
+def _store(key, value):
+    ttl = _config("CACHE_TTL", 60 * 60 * 24)
+    stale_ttl = _config("CACHE_STALE_TTL", 60 * 60 * 24 * 7)
+    cache.set(key, {'value': value, 'fetched_at': time.time()}, ttl + stale_ttl)
+
+
+def _refresh(key, fetch):
+    try:
+        _store(key, fetch())
+    except SemanticScholarError:
+        logger.info("Keeping stale Semantic Scholar entry %s after a failed refresh", key)
+    finally:
+        cache.delete(f'{key}:lock')
+
+
+def _refresh_in_thread(key, fetch):
+    try:
+        _refresh(key, fetch)
+    finally:
+        # This thread opened its own database connections for the cache table.
+        connections.close_all()
+
+
+def _revalidate(key, fetch):
+    # cache.add is a no-op if another request (or worker) already holds the lock.
+    if not cache.add(f'{key}:lock', 1, REVALIDATE_LOCK_TTL):
+        return
+    if _config("REVALIDATE_IN_BACKGROUND", True):
+        threading.Thread(target=_refresh_in_thread, args=(key, fetch), daemon=True).start()
+    else:
+        _refresh(key, fetch)
+
+
+def _is_stale(entry) -> bool:
+    max_age = _config("CACHE_TTL", 60 * 60 * 24) if entry['value'] else _config("NEGATIVE_CACHE_TTL", 60 * 60 * 6)
+    return time.time() - entry['fetched_at'] >= max_age
+
+
+def _cached(key, fetch, empty):
+    """
+    Returns the cached value for ``key``, calling ``fetch`` on a miss.
+    ``empty`` is what we return when the API fails and nothing is cached.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        if _is_stale(entry):
+            _revalidate(key, fetch)
+        return entry['value']
+
+    try:
+        value = fetch()
+    except SemanticScholarError:
+        # Errors are not "no result" answers, so they are never cached.
+        return empty
+    _store(key, value)
+    return value
+
+
+def get_cached_paper_id(title: str) -> str | None:
+    normalized = normalize_title(title)
+    if not normalized:
+        return None
+    return _cached(_cache_key('lookup', normalized), lambda: search_paper_id(normalized), None)
+
+
+def get_cached_recommendations(paper_id: str) -> list:
+    return _cached(_cache_key('recommendations', paper_id), lambda: get_client().recommendations(paper_id), [])
+
+
+def get_thesis_recommendations(thesis_title: str, ss_paper_id: str = None) -> list:
+    """
+    Fetches related paper recommendations using a two-step process: lookup and recommendation.
+    Uses stored ss_paper_id if available, otherwise looks it up by title.
+    """
+    paper_id = ss_paper_id or get_cached_paper_id(thesis_title)
+
+    if not paper_id:
+        return []
+
+    return get_cached_recommendations(paper_id)
+
+
+async def _arequest(client: httpx.AsyncClient, url: str, params: dict):
+    started = time.perf_counter()
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        logger.warning("Semantic Scholar GET %s failed: %s", url, e)
+        raise SemanticScholarError(str(e)) from e
+    except ValueError as e:
+        logger.warning("Semantic Scholar GET %s returned invalid JSON: %s", url, e)
+        raise SemanticScholarError(str(e)) from e
+    finally:
+        metrics.record_external(time.perf_counter() - started)
+
+
+async def _asearch_paper_id(client: httpx.AsyncClient, title: str) -> str | None:
+    data = await _arequest(client, f"{SS_API_BASE_URL}/paper/search", {
+        'query': title,
+        'fields': 'paperId',
+        'limit': 1,
+    })
+    if data.get('data'):
+        return data['data'][0].get('paperId')
+    return None
+
+
+async def _afetch_recommendations(client: httpx.AsyncClient, paper_id: str) -> list:
+    data = await _arequest(client, f"{SS_RECOMMENDATIONS_URL}{paper_id}", {
+        'fields': RECOMMENDATION_FIELDS,
+        'limit': 5,
+    })
+    return data.get('recommendedPapers', [])
+
+
+async def _acached(key, afetch, fetch, empty):
+    """Async version of ``_cached``; stale entries are still refreshed with the sync ``fetch``."""
+    entry = await cache.aget(key)
+    if entry is not None:
+        if _is_stale(entry):
+            await sync_to_async(_revalidate)(key, fetch)
+        return entry['value']
+
+    try:
+        value = await afetch()
+    except SemanticScholarError:
+        return empty
+    await sync_to_async(_store)(key, value)
+    return value
+
+
+async def aget_thesis_recommendations(thesis_title: str, ss_paper_id: str = None) -> list:
+    transport = httpx.AsyncHTTPTransport(retries=_config("RETRIES", 3))
+    async with httpx.AsyncClient(headers=_headers(), timeout=_config("TIMEOUT", 10), transport=transport) as client:
+        paper_id = ss_paper_id
+        if not paper_id:
+            normalized = normalize_title(thesis_title)
+            if not normalized:
+                return []
+            paper_id = await _acached(
+                _cache_key('lookup', normalized),
+                lambda: _asearch_paper_id(client, normalized),
+                lambda: search_paper_id(normalized),
+                None,
+            )
+
+        if not paper_id:
+            return []
+
+        return await _acached(
+            _cache_key('recommendations', paper_id),
+            lambda: _afetch_recommendations(client, paper_id),
+            lambda: get_client().recommendations(paper_id),
+            [],
+        )
@@ -0,0 +1,151 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from thesis import autocomplete, fragments, renditions, search, stats, tag_postings, tagging
+from thesis.models import College, Program, Tag, Thesis
+
+
+@receiver(post_save, sender=Thesis)
+def index_saved_thesis(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_thesis(instance)
+
+
+@receiver(post_delete, sender=Thesis)
+def unindex_deleted_thesis(sender, instance, **kwargs):
+    search.remove_theses([instance.pk])
+
+
+@receiver(post_delete, sender=Thesis)
+def remove_deleted_thesis_renditions(sender, instance, **kwargs):
+    thesis_id = instance.pk
+    transaction.on_commit(lambda: renditions.remove(thesis_id))
+
+
+@receiver(pre_delete, sender=Thesis)
+def unindex_deleted_thesis_pages(sender, instance, **kwargs):
+    # The page index reads the text back from the page rows, so it goes before the cascade.
+    search.unindex_pages([instance.pk])
+
+
+@receiver(m2m_changed, sender=Thesis.tags.through)
+def reindex_on_tag_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_thesis(instance)
+            tagging.refresh([instance.pk])
+            fragments.touch([instance.pk])
+        return
+
+    # Reverse side: ``instance`` is a Tag and ``pk_set`` holds thesis ids.
+    if action == 'pre_clear':
+        instance._cleared_thesis_ids = list(instance.theses.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        thesis_ids = getattr(instance, '_cleared_thesis_ids', [])
+    elif action in ('post_add', 'post_remove'):
+        thesis_ids = list(pk_set or [])
+    else:
+        return
+    search.reindex_theses(thesis_ids)
+    tagging.refresh(thesis_ids)
+    fragments.touch(thesis_ids)
+
+
+@receiver(post_save, sender=Tag)
+def reindex_on_tag_rename(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    thesis_ids = list(instance.theses.values_list('pk', flat=True))
+    search.reindex_theses(thesis_ids)
+    fragments.touch(thesis_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_theses(sender, instance, **kwargs):
+    instance._tagged_thesis_ids = list(instance.theses.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def reindex_on_tag_delete(sender, instance, **kwargs):
+    thesis_ids = getattr(instance, '_tagged_thesis_ids', [])
+    search.reindex_theses(thesis_ids)
+    tagging.refresh(thesis_ids)
+    fragments.touch(thesis_ids)
+
+
+@receiver(m2m_changed, sender=Thesis.tags.through)
+def invalidate_postings_on_tag_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        tag_postings.invalidate()
+
+
+@receiver(post_save, sender=Thesis)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=College)
+@receiver(post_save, sender=Program)
+def invalidate_postings_on_save(sender, instance, raw=False, **kwargs):
+    # Covers new theses, moved facet values (college/program/year) and renames.
+    if not raw:
+        tag_postings.invalidate()
+
+
+@receiver(post_delete, sender=Thesis)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=College)
+@receiver(post_delete, sender=Program)
+def invalidate_postings_on_delete(sender, instance, **kwargs):
+    tag_postings.invalidate()
+
+
+@receiver(post_save, sender=Thesis)
+@receiver(post_save, sender=Tag)
+def update_autocomplete_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.changed('thesis' if sender is Thesis else 'tag', instance.pk)
+
+
+@receiver(post_delete, sender=Thesis)
+@receiver(post_delete, sender=Tag)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    autocomplete.changed('thesis' if sender is Thesis else 'tag', instance.pk)
+
+
+@receiver(m2m_changed, sender=Thesis.tags.through)
+def update_autocomplete_on_tag_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Tag counts come from the theses' tags; the reverse side's ids were saved by reindex_on_tag_change.
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        autocomplete.changed('thesis', instance.pk)
+        return
+    thesis_ids = getattr(instance, '_cleared_thesis_ids', []) if action == 'post_clear' else pk_set or []
+    autocomplete.changed('thesis', *thesis_ids)
+
+
+@receiver(post_save, sender=Thesis)
+@receiver(post_save, sender=College)
+@receiver(post_save, sender=Program)
+@receiver(post_save, sender=Tag)
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust(sender, 1)
+
+
+@receiver(post_delete, sender=Thesis)
+@receiver(post_delete, sender=College)
+@receiver(post_delete, sender=Program)
+@receiver(post_delete, sender=Tag)
+def count_deleted(sender, instance, **kwargs):
+    stats.adjust(sender, -1)
+
+
+@receiver(post_save, sender=College)
+@receiver(post_save, sender=Program)
+def touch_theses_on_rename(sender, instance, created, raw=False, **kwargs):
+    # Cards show the college and program names.
+    if created or raw:
+        return
+    fragments.touch(**{'college' if sender is College else 'program': instance})
@@ -0,0 +1,209 @@
+"""
+"Similar in this repository": content-based neighbours from TF-IDF vectors.
+
+Each thesis's title, abstract and tags are tokenized into term counts and
+stored in ``ThesisVector`` (counts rather than weights, so IDF is always
+computed against the current corpus). Weights are ``(1 + log tf) * idf``,
+L2-normalized, and only the MAX_TERMS heaviest terms of a thesis are kept.
+Cosine similarity is then a sparse dot product, accumulated through an
+inverted index so each thesis is only compared with theses sharing a term.
+
+The top NEIGHBOURS for every thesis are stored in ``SimilarThesis``, which
+``thesis_detail`` reads in one query. Uploads, edits and deletes enqueue
+``update_similar_theses`` (thesis/tasks.py), which recomputes the changed
+theses and any thesis whose list they enter or leave;
+``python manage.py rebuild_similar_theses`` recomputes everything.
+
+This is plain Python: dicts stand in for sparse vectors, which is fine for
+a catalog of thousands of theses.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from thesis.models import SimilarThesis, Thesis, ThesisVector
+
+_TOKEN_RE = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+
+STOPWORDS = frozenset("""
+    about above after again against also among and any are because been before being below between both but
+    can could did does doing down during each few for from further had has have having her here hers him his
+    how into its itself just more most nor not now off once only other our ours out over own same she should
+    some such than that the their theirs them then there these they this those through too under until very
+    was were what when where which while who whom why will with would you your yours thesis study paper
+    research using used use based results result proposed system systems
+""".split())
+
+# Title and tag terms count this many times more than abstract terms.
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+
+
+def _config(name, default):
+    return getattr(settings, 'SIMILAR_THESES', {}).get(name, default)
+
+
+def _tokens(text: str) -> list:
+    return [token for token in _TOKEN_RE.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def term_counts(title: str, abstract: str, tag_names) -> dict:
+    counts = Counter(_tokens(abstract))
+    for token in _tokens(title):
+        counts[token] += TITLE_WEIGHT
+    for name in tag_names:
+        for token in _tokens(name):
+            counts[token] += TAG_WEIGHT
+    return dict(counts)
+
+
+def index_theses(thesis_ids) -> set:
+    """Stores term counts for ``thesis_ids``. Returns the ids that still exist."""
+    theses = list(Thesis.objects.filter(pk__in=list(thesis_ids)).prefetch_related('tags'))
+    ThesisVector.objects.bulk_create(
+        [
+            ThesisVector(thesis=thesis, terms=term_counts(thesis.title, thesis.abstract, [tag.name for tag in thesis.tags.all()]))
+            for thesis in theses
+        ],
+        update_conflicts=True,
+        unique_fields=['thesis'],
+        update_fields=['terms', 'date_modified'],
+    )
+    return {thesis.pk for thesis in theses}
+
+
+class Index:
+    """Weighted, normalized vectors for the whole corpus plus their inverted index."""
+
+    def __init__(self, corpus: dict):
+        max_terms = _config('MAX_TERMS', 40)
+        document_count = len(corpus)
+        frequencies = Counter(term for counts in corpus.values() for term in counts)
+        # Terms in more than MAX_DF of a large enough corpus say nothing about similarity.
+        max_df = _config('MAX_DF', 0.5) * document_count if document_count >= 20 else document_count
+        idf = {
+            term: math.log((1 + document_count) / (1 + df)) + 1
+            for term, df in frequencies.items() if df <= max_df
+        }
+
+        self.vectors = {}
+        self.postings = defaultdict(list)
+        for thesis_id, counts in corpus.items():
+            weights = {term: (1 + math.log(tf)) * idf[term] for term, tf in counts.items() if term in idf}
+            top = heapq.nlargest(max_terms, weights.items(), key=lambda item: item[1])
+            norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+            vector = {term: weight / norm for term, weight in top}
+            self.vectors[thesis_id] = vector
+            for term, weight in vector.items():
+                self.postings[term].append((thesis_id, weight))
+
+    def scores(self, thesis_id) -> dict:
+        """Cosine similarity of ``thesis_id`` with every thesis it shares a term with."""
+        scores = defaultdict(float)
+        for term, weight in self.vectors.get(thesis_id, {}).items():
+            for other_id, other_weight in self.postings[term]:
+                scores[other_id] += weight * other_weight
+        scores.pop(thesis_id, None)
+        return scores
+
+    def neighbours(self, thesis_id, scores=None) -> list:
+        """``[(score, similar_id)]``, best first."""
+        scores = self.scores(thesis_id) if scores is None else scores
+        min_score = _config('MIN_SCORE', 0.05)
+        return heapq.nlargest(
+            _config('NEIGHBOURS', 5),
+            ((score, other_id) for other_id, score in scores.items() if score >= min_score),
+        )
+
+
+def load_index() -> Index:
+    return Index(dict(ThesisVector.objects.values_list('thesis_id', 'terms')))
+
+
+def _rows(thesis_id, neighbours) -> list:
+    return [
+        SimilarThesis(thesis_id=thesis_id, similar_id=similar_id, score=score, rank=rank)
+        for rank, (score, similar_id) in enumerate(neighbours, start=1)
+    ]
+
+
+def _replace(lists: dict) -> None:
+    """Replaces the stored neighbours of every thesis in ``lists`` ({thesis_id: neighbours})."""
+    with transaction.atomic():
+        SimilarThesis.objects.filter(thesis_id__in=list(lists)).delete()
+        SimilarThesis.objects.bulk_create(
+            [row for thesis_id, neighbours in lists.items() for row in _rows(thesis_id, neighbours)],
+            batch_size=1000,
+        )
+
+
+def update(thesis_ids) -> int:
+    """
+    Re-vectorizes ``thesis_ids`` and refreshes their neighbours, plus the lists
+    of other theses that a changed thesis now belongs in or drops out of.
+    Returns the number of neighbour lists rewritten.
+    """
+    thesis_ids = set(thesis_ids)
+    existing = index_theses(thesis_ids)
+    index = load_index()
+
+    lists = {}
+    stored = defaultdict(list)
+    scores_by_changed = {thesis_id: index.scores(thesis_id) for thesis_id in existing}
+    candidates = {other_id for scores in scores_by_changed.values() for other_id in scores}
+    candidates |= set(
+        SimilarThesis.objects.filter(similar_id__in=thesis_ids).values_list('thesis_id', flat=True)
+    )
+    for thesis_id, similar_id, score in SimilarThesis.objects.filter(
+        thesis_id__in=candidates - thesis_ids,
+    ).values_list('thesis_id', 'similar_id', 'score'):
+        stored[thesis_id].append((score, similar_id))
+
+    for thesis_id, scores in scores_by_changed.items():
+        lists[thesis_id] = index.neighbours(thesis_id, scores)
+
+    limit = _config('NEIGHBOURS', 5)
+    min_score = _config('MIN_SCORE', 0.05)
+    for other_id in candidates - thesis_ids:
+        if other_id not in index.vectors:
+            continue
+        current = stored.get(other_id, [])
+        weakest = min((score for score, _ in current), default=0.0)
+        listed = {similar_id for _, similar_id in current}
+        joins = any(
+            scores.get(other_id, 0.0) >= min_score and (len(current) < limit or scores[other_id] > weakest)
+            for scores in scores_by_changed.values()
+        )
+        if joins or listed & thesis_ids:
+            lists[other_id] = index.neighbours(other_id)
+
+    _replace(lists)
+    return len(lists)
+
+
+def rebuild(batch_size: int = 500) -> int:
+    """Recomputes every thesis's vector and neighbours. Returns the number of theses."""
+    ids = list(Thesis.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        index_theses(ids[start:start + batch_size])
+    ThesisVector.objects.exclude(thesis_id__in=Thesis.objects.values('pk')).delete()
+
+    index = load_index()
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        _replace({thesis_id: index.neighbours(thesis_id) for thesis_id in batch})
+    return len(ids)
+
+
+def similar_theses(thesis) -> list:
+    """The stored neighbours of ``thesis`` as Thesis objects, best first (one query)."""
+    entries = (
+        SimilarThesis.objects.filter(thesis=thesis)
+        .select_related('similar__program')
+        .order_by('rank')
+    )
+    return [entry.similar for entry in entries]
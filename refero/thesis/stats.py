@@ -0,0 +1,65 @@
+"""
+Site-wide counters shown in the header stats (theses, colleges, programs, tags).
+
+Counts live in the default cache and are adjusted by the signal handlers in
+``thesis/signals.py`` when rows are created or deleted, so pages don't run
+four COUNT(*) queries each. A missing counter is recomputed on the next read,
+and ``python manage.py reconcile_stats`` corrects any drift (e.g. from bulk
+operations that skip signals).
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from thesis.models import College, Program, Tag, Thesis
+
+STAT_MODELS = {
+    'thesis_count': Thesis,
+    'college_count': College,
+    'program_count': Program,
+    'tag_count': Tag,
+}
+
+CACHE_KEY_PREFIX = 'stats'
+
+
+def _key(name: str) -> str:
+    return f'{CACHE_KEY_PREFIX}:{name}'
+
+
+def get_site_stats() -> dict:
+    cached = cache.get_many([_key(name) for name in STAT_MODELS])
+    stats = {}
+    for name, model in STAT_MODELS.items():
+        value = cached.get(_key(name))
+        if value is None:
+            value = model.objects.count()
+            cache.set(_key(name), value, None)
+        stats[name] = value
+    return stats
+
+
+def _incr(name: str, delta: int) -> None:
+    try:
+        cache.incr(_key(name), delta)
+    except ValueError:
+        # Not cached yet; the next read computes it from the database.
+        pass
+
+
+def adjust(model, delta: int) -> None:
+    """Schedules a counter change for ``model`` once the current transaction commits."""
+    for name, stat_model in STAT_MODELS.items():
+        if stat_model is model:
+            transaction.on_commit(lambda: _incr(name, delta))
+            return
+
+
+def reconcile() -> dict:
+    """Recounts every counter from the database. Returns ``{name: (cached, actual)}``."""
+    cached = cache.get_many([_key(name) for name in STAT_MODELS])
+    report = {}
+    for name, model in STAT_MODELS.items():
+        actual = model.objects.count()
+        cache.set(_key(name), actual, None)
+        report[name] = (cached.get(_key(name)), actual)
+    return report
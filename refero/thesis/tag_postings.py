@@ -0,0 +1,271 @@
+"""
+Per-tag postings lists for multi-tag filtering and facet counts.
+
+A ``Snapshot`` holds, for every tag, the sorted ids of the theses carrying it
+(its postings list), plus the sorted ids of all theses and a name -> id map.
+AND, OR and NOT over tags become sorted-set intersection, union and
+difference on those lists, and the number of results carrying each tag (the
+sidebar facet counts) is one intersection per tag, all without a query. The
+snapshot also carries each thesis's college, program and year, and the
+college and program names, which thesis/facets.py counts over.
+
+The snapshot is built in a handful of queries, stored in the ``indexes``
+cache under a version number and kept in process memory. The signal
+handlers in ``thesis/signals.py`` call ``invalidate()`` when theses, tags,
+colleges or programs change, which bumps the version once the transaction
+commits; other processes notice the new version within CHECK_INTERVAL
+seconds.
+
+Listings still page through the database. When a filter matches at most
+MAX_ID_FILTER theses, ``TagFilter.q()`` hands the snapshot's exact ids to
+the query (``pk__in``), so the page is a handful of primary-key lookups.
+Broader filters are expressed over the denormalized ``Thesis.tag_ids``
+(see thesis/tagging.py): that LIKE can't use an index, but with many
+matches the newest-first index scan fills a page after a few rows.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+from thesis import tagging
+from thesis.models import College, Program, Tag, Thesis
+
+CACHE_ALIAS = 'indexes'
+VERSION_KEY = 'tag_postings:version'
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+
+_EMPTY = array('q')
+_local = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _config(name, default):
+    return getattr(settings, 'TAG_POSTINGS', {}).get(name, default)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    all_ids: array
+    postings: dict
+    tag_ids_by_name: dict
+    # {thesis_id: (college_id, program_id, year_submitted)}
+    facet_rows: dict
+    college_names: dict
+    program_names: dict
+
+    def posting(self, tag_id) -> array:
+        return self.postings.get(tag_id, _EMPTY)
+
+
+def intersect(a, b) -> array:
+    """Sorted intersection of two sorted sequences, bisecting through the longer one."""
+    if len(a) > len(b):
+        a, b = b, a
+    result = array('q')
+    lo, end = 0, len(b)
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == end:
+            break
+        if b[lo] == value:
+            result.append(value)
+            lo += 1
+    return result
+
+
+def intersection_size(a, b) -> int:
+    if len(a) > len(b):
+        a, b = b, a
+    count = lo = 0
+    end = len(b)
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == end:
+            break
+        if b[lo] == value:
+            count += 1
+            lo += 1
+    return count
+
+
+def union(lists) -> array:
+    return array('q', sorted(set().union(*lists)))
+
+
+def difference(a, b) -> array:
+    """Values of sorted ``a`` that are not in sorted ``b``."""
+    result = array('q')
+    lo, end = 0, len(b)
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == end or b[lo] != value:
+            result.append(value)
+    return result
+
+
+def _build(version) -> Snapshot:
+    postings = {}
+    through = Thesis.tags.through
+    for tag_id, thesis_id in through.objects.order_by('tag_id', 'thesis_id').values_list('tag_id', 'thesis_id'):
+        postings.setdefault(tag_id, array('q')).append(thesis_id)
+    facet_rows = {
+        pk: (college_id, program_id, year)
+        for pk, college_id, program_id, year in Thesis.objects.order_by('pk').values_list(
+            'pk', 'college_id', 'program_id', 'year_submitted',
+        )
+    }
+    return Snapshot(
+        version=version,
+        all_ids=array('q', facet_rows),
+        postings=postings,
+        tag_ids_by_name=dict(Tag.objects.values_list('name', 'pk')),
+        facet_rows=facet_rows,
+        college_names=dict(College.objects.values_list('pk', 'college_name')),
+        program_names=dict(Program.objects.values_list('pk', 'prog_name')),
+    )
+
+
+def cache():
+    return caches[CACHE_ALIAS]
+
+
+def _current_version() -> int:
+    version = cache().get(VERSION_KEY)
+    if version is None:
+        # A fresh, time-based version can't collide with data left under an older one.
+        cache().add(VERSION_KEY, time.time_ns(), None)
+        version = cache().get(VERSION_KEY)
+    return version
+
+
+def snapshot() -> Snapshot:
+    """Returns the current snapshot, loading or rebuilding it when the version moved on."""
+    global _local, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _local is not None and now - _checked_at < _config('CHECK_INTERVAL', 5):
+            return _local
+
+        version = _current_version()
+        if _local is None or _local.version != version:
+            data_key = f'tag_postings:{version}'
+            _local = cache().get(data_key)
+            if _local is None:
+                _local = _build(version)
+                cache().set(data_key, _local, _config('TIMEOUT', 24 * 60 * 60))
+        _checked_at = now
+        return _local
+
+
+def _bump():
+    global _local
+    try:
+        cache().incr(VERSION_KEY)
+    except ValueError:
+        # No version stored; creating one is an invalidation too.
+        _current_version()
+    with _lock:
+        _local = None
+
+
+def invalidate() -> None:
+    """Drops every snapshot once the current transaction commits."""
+    transaction.on_commit(_bump)
+
+
+def reset() -> None:
+    """Forgets this process's copy, e.g. after the test database rolled back underneath it."""
+    global _local
+    with _lock:
+        _local = None
+
+
+@dataclass
+class TagFilter:
+    """
+    Tag names to require (all of them, or any of them with ``match='any'``)
+    and tag names to exclude. Built from the ``tag``, ``match`` and
+    ``exclude_tag`` query parameters.
+    """
+    required: list = field(default_factory=list)
+    excluded: list = field(default_factory=list)
+    match: str = MATCH_ALL
+
+    @classmethod
+    def from_params(cls, params):
+        match = MATCH_ANY if params.get('match') == MATCH_ANY else MATCH_ALL
+        return cls(params.getlist('tag'), params.getlist('exclude_tag'), match)
+
+    def __bool__(self):
+        return bool(self.required or self.excluded)
+
+    def _resolve(self, names, snap):
+        ids = [snap.tag_ids_by_name[name] for name in names if name in snap.tag_ids_by_name]
+        return ids, len(ids) < len(set(names))
+
+    def thesis_ids(self, snap: Snapshot) -> array:
+        """Sorted ids of the theses matching this filter."""
+        required, missing = self._resolve(self.required, snap)
+        if self.required and self.match == MATCH_ALL:
+            if missing:
+                return array('q')
+            # Start from the rarest tag so every step shrinks the candidate list.
+            lists = sorted((snap.posting(tag_id) for tag_id in required), key=len)
+            result = lists[0]
+            for posting in lists[1:]:
+                result = intersect(result, posting)
+        elif self.required:
+            result = union(snap.posting(tag_id) for tag_id in required)
+        else:
+            result = snap.all_ids
+
+        excluded, _ = self._resolve(self.excluded, snap)
+        if excluded:
+            result = difference(result, union(snap.posting(tag_id) for tag_id in excluded))
+        return result
+
+    def q(self, snap: Snapshot) -> Q:
+        """The same filter as a Q, for paginating in the database: exact ids when few match."""
+        by_id = id_filter(self.thesis_ids(snap))
+        return by_id if by_id is not None else self.tag_ids_q(snap)
+
+    def tag_ids_q(self, snap: Snapshot) -> Q:
+        """The filter over the denormalized ``Thesis.tag_ids``, whatever the number of matches."""
+        condition = Q()
+        required, missing = self._resolve(self.required, snap)
+        if self.required and self.match == MATCH_ALL:
+            condition &= Q(pk__in=[]) if missing else tagging.match_all(required)
+        elif self.required:
+            condition &= tagging.match_any(required)
+
+        excluded, _ = self._resolve(self.excluded, snap)
+        if excluded:
+            condition &= ~tagging.match_any(excluded)
+        return condition
+
+
+def id_filter(ids):
+    """``Q(pk__in=ids)`` when ``ids`` is short enough to page by primary key, else None."""
+    if len(ids) <= _config('MAX_ID_FILTER', 2000):
+        return Q(pk__in=list(ids))
+    return None
+
+
+def facet_counts(snap: Snapshot, tag_ids, within=None) -> dict:
+    """
+    ``{tag_id: n}``: how many theses in ``within`` (sorted ids; None means the
+    whole catalog) carry each of ``tag_ids``.
+    """
+    if within is None:
+        return {tag_id: len(snap.posting(tag_id)) for tag_id in tag_ids}
+    return {tag_id: intersection_size(within, snap.posting(tag_id)) for tag_id in tag_ids}
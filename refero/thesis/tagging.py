@@ -0,0 +1,76 @@
+"""
+Denormalized tag ids for join-free tag filtering.
+
+Each thesis keeps a copy of its tag ids in ``Thesis.tag_ids`` as a sorted,
+comma-delimited string with a leading and trailing comma (``",3,7,12,"``),
+so "tagged with 7" is ``tag_ids LIKE '%,7,%'`` on the thesis row itself.
+Matching any of several tags is an OR of those terms and matching all of
+them is an AND; neither needs the M2M join or the DISTINCT that comes with
+it. The LIKE can't use an index, though, so every such filter reads the
+thesis rows in index order until the page is full: cheap for a common tag,
+a full table scan for a rare one. ``TagFilter.q()`` in thesis/tag_postings.py
+therefore only uses these terms for broad filters and looks up the exact
+ids of selective ones. The M2M table stays the source of truth: the signal
+handlers in ``thesis/signals.py`` call ``refresh()`` whenever it changes.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import and_, or_
+
+from django.db.models import Q
+
+from thesis.models import Thesis
+
+
+def encode(tag_ids) -> str:
+    ids = sorted({int(pk) for pk in tag_ids})
+    return f",{','.join(map(str, ids))}," if ids else ''
+
+
+def decode(value: str) -> list:
+    return [int(pk) for pk in value.strip(',').split(',') if pk]
+
+
+def _term(tag_id) -> Q:
+    return Q(tag_ids__contains=f',{int(tag_id)},')
+
+
+def match_any(tag_ids) -> Q:
+    """Q matching theses tagged with at least one of ``tag_ids`` (nothing when empty)."""
+    terms = [_term(pk) for pk in tag_ids]
+    return reduce(or_, terms) if terms else Q(pk__in=[])
+
+
+def match_all(tag_ids) -> Q:
+    """Q matching theses tagged with every one of ``tag_ids``."""
+    return reduce(and_, (_term(pk) for pk in tag_ids), Q())
+
+
+def refresh(thesis_ids) -> None:
+    """Rewrites ``tag_ids`` for ``thesis_ids`` from the M2M table."""
+    thesis_ids = list(thesis_ids)
+    if not thesis_ids:
+        return
+    through = Thesis.tags.through
+    tags_by_thesis = defaultdict(list)
+    for thesis_id, tag_id in through.objects.filter(thesis_id__in=thesis_ids).values_list('thesis_id', 'tag_id'):
+        tags_by_thesis[thesis_id].append(tag_id)
+
+    # One UPDATE per distinct tag set; update() skips save() and its signals.
+    by_value = defaultdict(list)
+    for thesis_id in thesis_ids:
+        by_value[encode(tags_by_thesis[thesis_id])].append(thesis_id)
+    for value, ids in by_value.items():
+        Thesis.objects.filter(pk__in=ids).update(tag_ids=value)
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Refreshes every thesis in primary-key batches. Returns the number of theses visited."""
+    last_pk = total = 0
+    while True:
+        ids = list(Thesis.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        refresh(ids)
+        last_pk = ids[-1]
+        total += len(ids)
@@ -0,0 +1,43 @@
+"""Background job handlers. Imported from ThesisConfig.ready() so they are registered."""
+from thesis import pdf_text, renditions, similarity
+from thesis.jobs import job
+from thesis.models import Thesis
+from thesis.semantic_scholar import search_paper_id
+
+
+@job('lookup_paper_id')
+def lookup_paper_id(thesis_id):
+    """
+    Stores the Semantic Scholar ID for a newly uploaded or retitled thesis.
+    HTTP errors propagate so the queue retries the job with backoff.
+    """
+    thesis = Thesis.objects.filter(pk=thesis_id).only('title').first()
+    if thesis is None:
+        return
+
+    ss_id = search_paper_id(thesis.title)
+    if not ss_id:
+        return
+
+    # ss_paper_id is unique; two local theses can match the same external paper.
+    if Thesis.objects.filter(ss_paper_id=ss_id).exclude(pk=thesis_id).exists():
+        return
+    Thesis.objects.filter(pk=thesis_id).update(ss_paper_id=ss_id)
+
+
+@job('update_similar_theses')
+def update_similar_theses(thesis_ids):
+    """Refreshes TF-IDF neighbours after theses were uploaded, edited or deleted."""
+    similarity.update(thesis_ids)
+
+
+@job('extract_pdf_text')
+def extract_pdf_text(thesis_id):
+    """Stores and indexes the page text of a newly uploaded or replaced PDF."""
+    pdf_text.extract(thesis_id)
+
+
+@job('render_thumbnails')
+def render_thumbnails(thesis_id):
+    """Renders the first-page thumbnails of a newly uploaded or replaced PDF."""
+    renditions.generate(thesis_id)
@@ -1,4 +1,8 @@
 from django import template
+from django.urls import reverse
+from django.utils.html import format_html
+
+from thesis import fragments, renditions
 
 register = template.Library()
 
@@ -14,18 +18,98 @@ def url_replace(context, **kwargs):
     return query.urlencode()
 
 @register.simple_tag(takes_context=True)
-def toggle_tag(context, tag_name):
+def toggle_tag(context, tag_name, param='tag'):
     """
-    Toggles a tag in the 'tag' query parameter list.
+    Toggles a tag in the 'tag' query parameter list (or in ``param``, e.g. 'exclude_tag').
     If the tag is present, it removes it. If not, it adds it.
     """
     query = context['request'].GET.copy()
-    tags = query.getlist('tag')
+    # A different filter set means a different listing, so start from its first page.
+    query.pop('cursor', None)
+    query.pop('page', None)
+    tags = query.getlist(param)
     
     if tag_name in tags:
         tags.remove(tag_name)
     else:
         tags.append(tag_name)
     
-    query.setlist('tag', tags)
+    query.setlist(param, tags)
     return query.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def facet_url(context, name, value):
+    """
+    Sets (or with an empty value, clears) one facet parameter and returns to the first page.
+    Usage: {% facet_url 'program' option.value %}
+    """
+    query = context['request'].GET.copy()
+    query.pop('cursor', None)
+    query.pop('page', None)
+    if value == '':
+        query.pop(name, None)
+    else:
+        query[name] = value
+    return query.urlencode()
+
+
+@register.simple_tag
+def thesis_thumbnail(thesis, sizes='96px', css_class=''):
+    """
+    An ``<img>`` of the thesis's first page with every rendered width in its
+    srcset, or nothing until the worker has rendered it. Needs no query.
+    Usage: {% thesis_thumbnail thesis sizes='96px' css_class='w-24' %}
+    """
+    if not thesis.thumbnail_key:
+        return ''
+    urls = [
+        (reverse('thesis_thumbnail', args=[thesis.pk, thesis.thumbnail_key, width]), width)
+        for width in renditions.widths()
+    ]
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" alt="First page of {}" loading="lazy" decoding="async" class="{}">',
+        urls[0][0], ', '.join(f'{url} {width}w' for url, width in urls), sizes, thesis.title, css_class,
+    )
+
+
+class ThesisFragmentNode(template.Node):
+    def __init__(self, nodelist, name, thesis, vary_on_query):
+        self.nodelist = nodelist
+        self.name = name
+        self.thesis = thesis
+        self.vary_on_query = vary_on_query
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        thesis = self.thesis.resolve(context)
+        # Listings look fragments up in bulk beforehand (fragments.hydrate()).
+        looked_up = getattr(thesis, 'cached_fragments', None)
+        if looked_up is not None and name in looked_up:
+            return looked_up[name]
+
+        variant = fragments.query_variant(context['request']) if self.vary_on_query else ''
+        fragment_key = fragments.key(name, thesis, variant)
+        html = None if looked_up is not None else fragments.cache().get(fragment_key)
+        if html is None:
+            html = self.nodelist.render(context)
+            fragments.cache().set(fragment_key, html)
+        return html
+
+
+@register.tag
+def thesis_fragment(parser, token):
+    """
+    Caches the enclosed HTML per thesis until the thesis changes (see thesis/fragments.py).
+    Add ``vary_on_query`` when the fragment's links depend on the current filters.
+    Usage: {% thesis_fragment 'card' thesis vary_on_query %}...{% endthesis_fragment %}
+    """
+    bits = token.split_contents()
+    vary_on_query = bits[-1] == 'vary_on_query'
+    if vary_on_query:
+        bits = bits[:-1]
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name, a thesis and optionally vary_on_query.")
+    nodelist = parser.parse(('endthesis_fragment',))
+    parser.delete_first_token()
+    return ThesisFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), vary_on_query)
@@ -1,3 +1,1591 @@
-from django.test import TestCase
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import send_mail
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from thesis import autocomplete, chunked_upload, file_serving, fragments, importer, jobs, metrics, outbox, pagination, pdf_text, renditions, search, semantic_scholar, similarity, stats, tag_postings, tagging, view_counter
+from thesis.management.commands.backfill_ss_ids import TokenBucket
+from thesis.tag_postings import TagFilter
+from thesis.models import College, Job, OutboxEmail, Program, SimilarThesis, Tag, Thesis, ThesisPage, UploadSession
+from thesis.stats import get_site_stats
+
+THESIS_COUNT = 2000
+
+
+def make_pdf(page_texts) -> bytes:
+    """A PDF with one line of Helvetica text per page."""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    })
+    for text in page_texts:
+        page = writer.add_blank_page(612, 792)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font}),
+        })
+        stream = DecodedStreamObject()
+        stream.set_data(f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode())
+        page.replace_contents(stream)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+OWN_THESIS_COUNT = 60
+TAGS_PER_THESIS = 3
+
+
+class CatalogTestCase(TestCase):
+    """Seeds a catalog large enough that an N+1 query shows up as hundreds of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        other = User.objects.create_user('author', 'author@example.com', 'password')
+
+        colleges = College.objects.bulk_create([
+            College(college_name=f'College {i}') for i in range(4)
+        ])
+        programs = Program.objects.bulk_create([
+            Program(prog_name=f'Program {i}', college=colleges[i % len(colleges)]) for i in range(8)
+        ])
+        tags = list(Tag.objects.order_by('pk'))
+
+        theses = Thesis.objects.bulk_create([
+            Thesis(
+                title=f'Thesis {i} on {tags[i % len(tags)].name}',
+                abstract=f'Abstract number {i} about {tags[(i * 7) % len(tags)].name} and systems.',
+                authors=f'Author {i % 97}, Coauthor {i % 89}',
+                year_submitted=2000 + i % 25,
+                uploaded_by=cls.user if i < OWN_THESIS_COUNT else other,
+                college=programs[i % len(programs)].college,
+                program=programs[i % len(programs)],
+            )
+            for i in range(THESIS_COUNT)
+        ], batch_size=500)
+
+        through = Thesis.tags.through
+        through.objects.bulk_create([
+            through(thesis_id=thesis.pk, tag_id=tags[(index + offset) % len(tags)].pk)
+            for index, thesis in enumerate(theses)
+            for offset in range(TAGS_PER_THESIS)
+        ], batch_size=1000)
+
+        # bulk_create skips the signal handlers that normally maintain these.
+        search.rebuild()
+        tagging.rebuild()
+        cls.thesis = Thesis.objects.filter(uploaded_by=cls.user).order_by('pk').first()
+        cls.tag = tags[0]
+
+    def setUp(self):
+        # Snapshots and cards built by earlier tests describe rows that were rolled back.
+        tag_postings.reset()
+        autocomplete.reset()
+        view_counter.reset()
+        fragments.cache().clear()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        # Write buffered views while the test database still exists.
+        view_counter.flush()
+
+
+@mock.patch('api.views.aget_thesis_recommendations', new=mock.AsyncMock(return_value=[]))
+class QueryBudgetTests(CatalogTestCase):
+    """
+    Upper bounds on the queries each page issues once caches are warm. The bounds
+    include the session, user and cache lookups, so they sit a little above the
+    view's own queries; an N+1 over theses, tags or uploads blows well past them.
+    """
+
+    def assertMaxQueries(self, limit, url, **params):
+        # The first request fills the stats and count caches; measure the steady state.
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertLess(response.status_code, 400, url)
+        self.assertLessEqual(
+            len(captured), limit,
+            f'{url} issued {len(captured)} queries (limit {limit}):\n'
+            + '\n'.join(query['sql'] for query in captured.captured_queries),
+        )
+        return response
+
+    def test_home(self):
+        self.assertMaxQueries(8, reverse('home'))
+
+    def test_home_filtered_by_program(self):
+        self.assertMaxQueries(8, reverse('home'), program='Program 1')
+
+    def test_theses(self):
+        self.assertMaxQueries(11, reverse('theses'))
+
+    def test_theses_next_page(self):
+        response = self.client.get(reverse('theses'))
+        cursor = response.context['page_obj'].next_cursor
+        self.assertMaxQueries(11, reverse('theses'), cursor=cursor)
+
+    def test_theses_search(self):
+        self.assertMaxQueries(10, reverse('theses'), q='systems')
+
+    def test_theses_tag_filter(self):
+        self.assertMaxQueries(10, reverse('theses'), tag=self.tag.name)
+
+    def test_theses_multi_tag_filter(self):
+        first, second, third = Tag.objects.order_by('pk')[:3]
+        self.assertMaxQueries(10, reverse('theses'), tag=[first.name, second.name], exclude_tag=third.name)
+
+    def test_theses_facet_filter(self):
+        program = Program.objects.get(prog_name='Program 1')
+        self.assertMaxQueries(10, reverse('theses'), program=program.pk, tag=self.tag.name)
+
+    def test_upload_form(self):
+        self.assertMaxQueries(8, reverse('thesis_upload'))
+
+    def test_profile(self):
+        self.assertMaxQueries(8, reverse('profile'))
+
+    def test_thesis_detail(self):
+        self.assertMaxQueries(15, reverse('thesis_detail', args=[self.thesis.pk]))
+
+    def test_thesis_edit_form(self):
+        self.assertMaxQueries(11, reverse('thesis_edit', args=[self.thesis.pk]))
+
+    def test_thesis_delete_confirmation(self):
+        self.assertMaxQueries(7, reverse('thesis_delete', args=[self.thesis.pk]))
+
+    def test_password_reset_pages(self):
+        self.client.logout()
+        self.assertMaxQueries(2, reverse('password_reset'))
+        self.assertMaxQueries(2, reverse('password_reset_verify'))
+        self.assertMaxQueries(2, reverse('password_reset_complete'))
+
+    def test_api_thesis_list(self):
+        self.assertMaxQueries(7, reverse('api:thesis_list'))
+
+    def test_api_thesis_list_tag_filter(self):
+        self.assertMaxQueries(7, reverse('api:thesis_list'), tag=self.tag.name)
+
+    def test_api_recommendations(self):
+        self.assertMaxQueries(5, reverse('api:thesis_recommendations', args=[self.thesis.pk]))
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    def test_malformed_cursors_start_over(self):
+        date_added = self.thesis.date_added.isoformat()
+        cursors = [
+            'not base64!', raw_cursor('plain string'), raw_cursor(123), raw_cursor([date_added, 'x', 'n']),
+            raw_cursor([date_added, None, 'n']), raw_cursor(['yesterday', 1, 'n']), raw_cursor([date_added, 1, 'sideways']),
+            raw_cursor([date_added, 2 ** 63, 'n']), raw_cursor([date_added, -2 ** 63 - 1, 'p']),
+            raw_cursor([date_added, float('inf'), 'n']), raw_cursor([date_added, float('nan'), 'n']),
+            base64.urlsafe_b64encode(f'["{date_added}", 1e400, "n"]'.encode()).decode(),
+        ]
+        first_page = [thesis.pk for thesis in self.client.get(reverse('theses')).context['page_obj']]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(pagination.decode_cursor(cursor))
+                response = self.client.get(reverse('theses'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([thesis.pk for thesis in response.context['page_obj']], first_page)
+                self.assertLess(self.client.get(reverse('api:thesis_list'), {'cursor': cursor}).status_code, 500)
+
+    def test_paging_back_returns_the_same_rows(self):
+        pages = [self.client.get(reverse('theses')).context['page_obj']]
+        for _ in range(2):
+            pages.append(self.client.get(reverse('theses'), {'cursor': pages[-1].next_cursor}).context['page_obj'])
+        expected = list(Thesis.objects.order_by('-date_added', '-pk').values_list('pk', flat=True)[:len(pages[0]) * 3])
+        self.assertEqual([thesis.pk for page in pages for thesis in page], expected)
+
+        back = self.client.get(reverse('theses'), {'cursor': pages[2].previous_cursor}).context['page_obj']
+        self.assertEqual([thesis.pk for thesis in back], [thesis.pk for thesis in pages[1]])
+        first = self.client.get(reverse('theses'), {'cursor': back.previous_cursor}).context['page_obj']
+        self.assertEqual([thesis.pk for thesis in first], [thesis.pk for thesis in pages[0]])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+
+class RequestMetricsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.client.get(reverse('theses'))
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertIn('X-DB-Time-Ms', response)
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_no_headers_without_debug(self):
+        response = self.client.get(reverse('theses'))
+        self.assertNotIn('X-Query-Count', response)
+
+    def test_metrics_endpoint_aggregates_per_view(self):
+        self.client.get(reverse('theses'))
+        self.client.get(reverse('theses'))
+
+        self.assertEqual(self.client.get(reverse('api:metrics')).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        data = self.client.get(reverse('api:metrics')).json()
+        self.assertEqual(data['theses']['requests'], 2)
+        self.assertGreater(data['theses']['max_queries'], 0)
+
+
+class TaggingTests(CatalogTestCase):
+    def test_denormalized_filters_match_the_join(self):
+        first, second = Tag.objects.order_by('pk')[:2]
+        any_ids = set(Thesis.objects.filter(tags__in=[first, second]).values_list('pk', flat=True))
+        all_ids = set(Thesis.objects.filter(tags=first).filter(tags=second).values_list('pk', flat=True))
+
+        self.assertEqual(set(Thesis.objects.filter(tagging.match_any([first.pk, second.pk])).values_list('pk', flat=True)), any_ids)
+        self.assertEqual(set(Thesis.objects.filter(tagging.match_all([first.pk, second.pk])).values_list('pk', flat=True)), all_ids)
+
+    def test_tag_changes_refresh_tag_ids(self):
+        tag = Tag.objects.create(name='Quantum Computing')
+        self.thesis.tags.add(tag)
+        self.thesis.refresh_from_db()
+        self.assertIn(tag.pk, tagging.decode(self.thesis.tag_ids))
+
+        tag.delete()
+        self.thesis.refresh_from_db()
+        self.assertNotIn(tag.pk, tagging.decode(self.thesis.tag_ids))
+        self.assertEqual(tagging.decode(self.thesis.tag_ids), sorted(self.thesis.tags.values_list('pk', flat=True)))
+
+
+class TagPostingsTests(CatalogTestCase):
+    def ids(self, queryset):
+        return sorted(queryset.values_list('pk', flat=True))
+
+    def test_filters_match_the_orm(self):
+        first, second, third = Tag.objects.order_by('pk')[:3]
+        snap = tag_postings.snapshot()
+        cases = [
+            (TagFilter([first.name, second.name]), Thesis.objects.filter(tags=first).filter(tags=second)),
+            (TagFilter([first.name, second.name], match='any'), Thesis.objects.filter(tags__in=[first, second]).distinct()),
+            (TagFilter([first.name], [second.name]), Thesis.objects.filter(tags=first).exclude(tags=second)),
+            (TagFilter([], [third.name]), Thesis.objects.exclude(tags=third)),
+            (TagFilter(['No such tag']), Thesis.objects.none()),
+        ]
+        for tag_filter, expected in cases:
+            with self.subTest(tag_filter=tag_filter):
+                self.assertEqual(list(tag_filter.thesis_ids(snap)), self.ids(expected))
+                # Exact ids for selective filters, tag_ids LIKE terms for broad ones: same rows either way.
+                for limit in (0, THESIS_COUNT):
+                    with override_settings(TAG_POSTINGS={'MAX_ID_FILTER': limit}):
+                        self.assertEqual(self.ids(Thesis.objects.filter(tag_filter.q(snap))), self.ids(expected))
+
+    def test_selective_filters_skip_the_tag_ids_scan(self):
+        rare = Tag.objects.create(name='Paleoclimatology')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.thesis.tags.add(rare)
+        snap = tag_postings.snapshot()
+        with CaptureQueriesContext(connection) as captured:
+            ids = self.ids(Thesis.objects.filter(TagFilter([rare.name]).q(snap)))
+        self.assertEqual(ids, [self.thesis.pk])
+        self.assertNotIn('LIKE', captured[0]['sql'])
+        with override_settings(TAG_POSTINGS={'MAX_ID_FILTER': 0}):
+            self.assertIn('LIKE', str(Thesis.objects.filter(TagFilter([rare.name]).q(snap)).query))
+
+    def test_facet_counts_within_results(self):
+        first, second = Tag.objects.order_by('pk')[:2]
+        snap = tag_postings.snapshot()
+        within = TagFilter([first.name]).thesis_ids(snap)
+        counts = tag_postings.facet_counts(snap, [first.pk, second.pk], within=within)
+        self.assertEqual(counts[first.pk], Thesis.objects.filter(tags=first).count())
+        self.assertEqual(counts[second.pk], Thesis.objects.filter(tags=first).filter(tags=second).count())
+
+    def test_tag_changes_invalidate_snapshot(self):
+        tag = Tag.objects.create(name='Quantum Computing')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.thesis.tags.add(tag)
+        self.assertEqual(list(TagFilter([tag.name]).thesis_ids(tag_postings.snapshot())), [self.thesis.pk])
+
+    def test_snapshot_survives_default_cache_churn(self):
+        tag_postings.snapshot()
+        get_site_stats()
+        # More entries than Django's default MAX_ENTRIES, which culled in key order.
+        for number in range(400):
+            cache.set(f'churn:{number}', number)
+        self.assertIsNotNone(cache.get(stats._key('thesis_count')))
+        tag_postings.reset()
+        with mock.patch.object(tag_postings, '_build', side_effect=AssertionError('rebuilt')):
+            self.assertTrue(tag_postings.snapshot().tag_ids_by_name)
+
+    def test_sidebar_shows_counts(self):
+        response = self.client.get(reverse('theses'), {'tag': self.tag.name})
+        chip = next(tag for tag in response.context['available_tags'] if tag['name'] == self.tag.name)
+        self.assertEqual(chip['facet_count'], response.context['total_count'])
+
+
+class AutocompleteTests(CatalogTestCase):
+    def suggest(self, prefix):
+        response = self.client.get(reverse('theses_autocomplete'), {'q': prefix})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_matches_word_starts(self):
+        data = self.suggest('author 1')
+        self.assertTrue(data['authors'])
+        self.assertTrue(all(author['name'].startswith('Author 1') for author in data['authors']))
+        expected = Thesis.objects.filter(authors__startswith='Author 12,').count()
+        self.assertIn({'name': 'Author 12', 'count': expected}, self.suggest('author 12')['authors'])
+
+        tag_word = self.tag.name.split()[-1]
+        self.assertIn(self.tag.name, [tag['name'] for tag in self.suggest(tag_word[:3])['tags']])
+        titles = self.suggest(f'{self.tag.name}')['titles']
+        self.assertTrue(titles)
+        self.assertTrue(all(self.tag.name in title['title'] for title in titles))
+        self.assertEqual(titles[0]['url'], reverse('thesis_detail', args=[titles[0]['id']]))
+        self.assertEqual(self.suggest('')['titles'], [])
+
+    def test_changes_are_applied_incrementally(self):
+        self.suggest('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.thesis.title = 'Zymurgy of rice wine'
+            self.thesis.authors = 'Quentin Xavier'
+            self.thesis.save()
+            tag = Tag.objects.create(name='Fermentation')
+            self.thesis.tags.add(tag)
+        with mock.patch.object(autocomplete.PrefixIndex, 'build', side_effect=AssertionError('rebuilt')):
+            self.assertEqual([title['id'] for title in self.suggest('zymur')['titles']], [self.thesis.pk])
+            self.assertEqual(self.suggest('rice w')['titles'][0]['title'], 'Zymurgy of rice wine')
+            self.assertEqual(self.suggest('xavier')['authors'], [{'name': 'Quentin Xavier', 'count': 1}])
+            self.assertEqual(self.suggest('ferm')['tags'], [{'name': 'Fermentation', 'count': 1}])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                tag.name = 'Brewing'
+                tag.save()
+                self.thesis.delete()
+            self.assertEqual(self.suggest('ferm')['tags'], [])
+            self.assertEqual(self.suggest('brew')['tags'], [{'name': 'Brewing', 'count': 0}])
+            self.assertEqual(self.suggest('zymur')['titles'], [])
+            self.assertEqual(self.suggest('xavier')['authors'], [])
+
+    def test_other_processes_catch_up_from_the_cache(self):
+        self.suggest('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            Thesis.objects.filter(pk=self.thesis.pk).update(title='Xylophone acoustics')
+            autocomplete.changed('thesis', self.thesis.pk)
+        # A fresh process loads the shared base and replays the change log.
+        autocomplete.reset()
+        with mock.patch.object(autocomplete.PrefixIndex, 'build', side_effect=AssertionError('rebuilt')):
+            self.assertEqual([title['id'] for title in self.suggest('xylo')['titles']], [self.thesis.pk])
+
+    @override_settings(AUTOCOMPLETE={'MAX_CHANGES': 3, 'CHECK_INTERVAL': 0})
+    def test_change_log_is_one_bounded_entry(self):
+        self.suggest('a')
+        theses = list(Thesis.objects.order_by('pk')[:5])
+        with self.captureOnCommitCallbacks(execute=True):
+            autocomplete.changed('thesis', *[thesis.pk for thesis in theses[:2]])
+        # Churn in the default cache can't touch the log or the shared index.
+        for number in range(400):
+            cache.set(f'churn:{number}', number)
+        log = autocomplete.cache().get(autocomplete.LOG_KEY)
+        self.assertEqual([pk for _, _, pk in log], [thesis.pk for thesis in theses[:2]])
+        autocomplete.reset()
+        with mock.patch.object(autocomplete.PrefixIndex, 'build', side_effect=AssertionError('rebuilt')):
+            self.suggest('a')
+
+        # Five more changes than the log keeps: a process that missed them has to rebuild.
+        autocomplete.reset()
+        stale = autocomplete.cache().get(autocomplete.BASE_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            autocomplete.changed('thesis', *[thesis.pk for thesis in theses])
+        self.assertEqual(len(autocomplete.cache().get(autocomplete.LOG_KEY)), 3)
+        with mock.patch.object(autocomplete.PrefixIndex, 'build', wraps=autocomplete.PrefixIndex.build) as build:
+            autocomplete._catch_up(stale, autocomplete._current_version())
+        build.assert_called_once()
+
+    def test_a_lost_change_forces_a_rebuild(self):
+        self.suggest('a')
+        autocomplete.reset()
+        stale = autocomplete.cache().get(autocomplete.BASE_KEY)
+        first, second = Thesis.objects.order_by('pk')[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            autocomplete.changed('thesis', first.pk)
+        log = autocomplete.cache().get(autocomplete.LOG_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            autocomplete.changed('thesis', second.pk)
+        numbers = [number for number, _, _ in autocomplete.cache().get(autocomplete.LOG_KEY)]
+        self.assertEqual(len(set(numbers)), 2)
+
+        # A second process appended to the log it read before the first change was written.
+        autocomplete.cache().set(autocomplete.LOG_KEY, [
+            entry for entry in autocomplete.cache().get(autocomplete.LOG_KEY) if entry not in log
+        ])
+        with mock.patch.object(autocomplete.PrefixIndex, 'build', wraps=autocomplete.PrefixIndex.build) as build:
+            autocomplete._catch_up(stale, autocomplete._current_version())
+        build.assert_called_once()
+
+    def test_warm_queries_skip_the_catalog(self):
+        self.suggest('thesis')
+        with CaptureQueriesContext(connection) as captured:
+            self.suggest('thesis 1')
+        # Session and user only; the index is in memory.
+        self.assertLessEqual(len(captured), 2)
+
+
+class FacetTests(CatalogTestCase):
+    def test_counts_match_the_orm(self):
+        response = self.client.get(reverse('theses'), {'tag': self.tag.name})
+        tagged = Thesis.objects.filter(tags=self.tag)
+        for name, field in (('college', 'college_id'), ('program', 'program_id'), ('year', 'year_submitted')):
+            expected = {row[field]: row['n'] for row in tagged.values(field).annotate(n=Count('pk'))}
+            actual = {option['value']: option['count'] for option in response.context['facets'][name]}
+            self.assertEqual(actual, expected, name)
+
+    def test_facet_filter_narrows_results(self):
+        program = Program.objects.get(prog_name='Program 1')
+        response = self.client.get(reverse('theses'), {'program': program.pk, 'year': 2001})
+        expected = Thesis.objects.filter(program=program, year_submitted=2001)
+        self.assertEqual(response.context['total_count'], expected.count())
+        self.assertTrue(all(thesis.program_id == program.pk for thesis in response.context['page_obj']))
+
+    def test_selective_filters_page_by_snapshot_ids(self):
+        program = Program.objects.get(prog_name='Program 1')
+        params = {'tag': self.tag.name, 'program': program.pk}
+        expected = list(
+            Thesis.objects.filter(tags=self.tag, program=program).order_by('-date_added', '-pk').values_list('pk', flat=True)[:9]
+        )
+        self.client.get(reverse('theses'), params)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('theses'), params)
+        self.assertEqual([thesis.pk for thesis in response.context['page_obj']], expected)
+        # The tag and facet filters were both answered by the snapshot: no LIKE, no program_id condition.
+        self.assertFalse([
+            query['sql'] for query in captured
+            if 'LIKE' in query['sql'] or re.search(r'"program_id" = \d', query['sql'])
+        ])
+
+        # Broad filters fall back to the tag_ids and facet columns, with the same results.
+        with override_settings(TAG_POSTINGS={'MAX_ID_FILTER': 0}):
+            response = self.client.get(reverse('theses'), params)
+        self.assertEqual([thesis.pk for thesis in response.context['page_obj']], expected)
+
+    def test_home_lists_programs_from_the_database(self):
+        response = self.client.get(reverse('home'))
+        programs = {program['name']: program['count'] for program in response.context['filterable_programs']}
+        self.assertEqual(set(programs), set(Program.objects.values_list('prog_name', flat=True)))
+        self.assertEqual(programs['Program 1'], Thesis.objects.filter(program__prog_name='Program 1').count())
+
+
+class FragmentCacheTests(CatalogTestCase):
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        return response, [query['sql'] for query in captured.captured_queries]
+
+    def test_warm_listing_only_queries_ids(self):
+        cold, cold_queries = self.get(reverse('theses'), tag=self.tag.name)
+        warm, warm_queries = self.get(reverse('theses'), tag=self.tag.name)
+        # Identical apart from the per-response CSRF token.
+        without_token = lambda response: re.sub(rb'name="csrfmiddlewaretoken" value="[^"]*"', b'', response.content)
+        self.assertEqual(without_token(warm), without_token(cold))
+        self.assertLess(len(warm_queries), len(cold_queries))
+        self.assertFalse([sql for sql in warm_queries if 'thesis_thesis_tags' in sql])
+
+    def test_cards_follow_edits_and_tag_changes(self):
+        first = self.client.get(reverse('theses')).context['page_obj'].object_list[0]
+        Thesis.objects.filter(pk=first.pk).update(title='Stale title')
+        # Without a new date_modified the cached card is still served...
+        self.assertNotContains(self.client.get(reverse('theses')), 'Stale title')
+
+        thesis = Thesis.objects.get(pk=first.pk)
+        thesis.title = 'Edited title'
+        thesis.save()
+        self.assertContains(self.client.get(reverse('theses')), 'Edited title')
+
+        thesis.tags.add(Tag.objects.create(name='Quantum Computing'))
+        self.assertContains(self.client.get(reverse('theses')), 'Quantum Computing')
+        self.assertContains(self.client.get(reverse('thesis_detail', args=[thesis.pk])), 'Quantum Computing')
+
+        Tag.objects.filter(name='Quantum Computing').update(name='-')
+        tag = Tag.objects.get(name='-')
+        tag.name = 'Quantum Information'
+        tag.save()
+        self.assertContains(self.client.get(reverse('theses')), 'Quantum Information')
+
+        thesis.program.prog_name = 'Renamed Program'
+        thesis.program.save()
+        self.assertContains(self.client.get(reverse('home')), 'Renamed Program')
+
+    def test_cards_vary_with_the_filters_they_link_to(self):
+        self.client.get(reverse('theses'))
+        response = self.client.get(reverse('theses'), {'tag': self.tag.name})
+        self.assertContains(response, 'tag-chip is-active')
+
+
+class ViewCounterTests(CatalogTestCase):
+    def stored(self):
+        return Thesis.objects.values_list('view_count', flat=True).get(pk=self.thesis.pk)
+
+    @override_settings(VIEW_COUNTER={'DEDUPE_WINDOW': 60, 'FLUSH_THRESHOLD': 100, 'FLUSH_INTERVAL': 3600})
+    def test_repeat_views_count_once_per_window(self):
+        other = User.objects.get(username='author')
+        self.assertTrue(view_counter.record_view(self.thesis.pk, self.user.pk))
+        self.assertFalse(view_counter.record_view(self.thesis.pk, self.user.pk))
+        self.assertTrue(view_counter.record_view(self.thesis.pk, other.pk))
+        self.assertTrue(view_counter.record_view(self.thesis.pk))
+        self.assertEqual(view_counter.pending(self.thesis.pk), 3)
+        with mock.patch('thesis.view_counter.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertTrue(view_counter.record_view(self.thesis.pk, self.user.pk))
+
+    def test_dedupe_never_touches_the_database(self):
+        with CaptureQueriesContext(connection) as captured:
+            for number in range(50):
+                view_counter.record_view(self.thesis.pk, number)
+        self.assertEqual(len(captured), 0)
+
+    @override_settings(VIEW_COUNTER={'DEDUPE_WINDOW': 0, 'FLUSH_THRESHOLD': 3, 'FLUSH_INTERVAL': 3600})
+    def test_flushes_at_the_threshold(self):
+        before = self.stored()
+        for _ in range(2):
+            view_counter.record_view(self.thesis.pk)
+        self.assertEqual(view_counter.flush_if_due(), 0)
+        view_counter.record_view(self.thesis.pk)
+        self.assertEqual(view_counter.flush_if_due(), 3)
+        self.assertEqual(self.stored(), before + 3)
+        self.assertEqual(view_counter.pending(self.thesis.pk), 0)
+
+    @override_settings(VIEW_COUNTER={'DEDUPE_WINDOW': 0, 'FLUSH_THRESHOLD': 100, 'FLUSH_INTERVAL': 30})
+    def test_flushes_after_the_interval(self):
+        before = self.stored()
+        view_counter.record_view(self.thesis.pk)
+        self.assertEqual(view_counter.flush_if_due(), 0)
+        with mock.patch('thesis.view_counter.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertEqual(view_counter.flush_if_due(), 1)
+        self.assertEqual(self.stored(), before + 1)
+
+    @override_settings(VIEW_COUNTER={'DEDUPE_WINDOW': 60, 'FLUSH_THRESHOLD': 100, 'FLUSH_INTERVAL': 3600})
+    def test_detail_page_shows_pending_views(self):
+        before = self.stored()
+        view_counter.record_view(self.thesis.pk)
+        response = self.client.get(reverse('thesis_detail', args=[self.thesis.pk]))
+        self.assertEqual(response.context['thesis'].view_count, before + 2)
+        self.assertEqual(self.stored(), before)
+        # The same user again inside the window adds nothing.
+        response = self.client.get(reverse('thesis_detail', args=[self.thesis.pk]))
+        self.assertEqual(response.context['thesis'].view_count, before + 2)
+
+
+@override_settings(EXPORT={'CHUNK_SIZE': 100})
+class ExportTests(CatalogTestCase):
+    def test_csv_export_streams_in_chunks(self):
+        expected = Thesis.objects.filter(tags=self.tag).count()
+        tag_postings.snapshot()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('theses_export', args=['csv']), {'tag': self.tag.name})
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+        self.assertIn('attachment; filename="theses-', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), expected)
+        self.assertTrue(all(self.tag.name in row['tags'].split(';') for row in rows))
+        self.assertEqual(rows[0]['id'], str(Thesis.objects.filter(tags=self.tag).latest('date_added', 'pk').pk))
+        # One query for the theses and one for their tags per chunk of 100, plus session and snapshot checks.
+        chunks = -(-expected // 100)
+        self.assertLessEqual(len(captured), 2 * chunks + 5)
+
+    def test_search_export_keeps_rank_order(self):
+        query = {'q': self.thesis.title}
+        response = self.client.get(reverse('theses_export', args=['jsonl']), query)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['id'] for record in records], search.search_thesis_ids(self.thesis.title))
+        self.assertEqual(self.client.get(reverse('theses_export', args=['xlsx'])).status_code, 404)
+
+    def test_search_export_is_not_capped(self):
+        # Every abstract mentions "systems"; the theses page stops at MAX_RESULTS.
+        self.assertEqual(len(search.search_thesis_ids('systems')), search.MAX_RESULTS)
+        response = self.client.get(reverse('theses_export', args=['jsonl']), {'q': 'systems'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), THESIS_COUNT)
+
+    def test_csv_escapes_formulas(self):
+        Thesis.objects.create(title='=HYPERLINK("http://example.com","open")', abstract='-', authors='@Author',
+                              adviser='+63 912', year_submitted=1990, uploaded_by=self.user,
+                              college=self.thesis.college, program=self.thesis.program)
+        response = self.client.get(reverse('theses_export', args=['csv']), {'year': 1990})
+        content = b''.join(response.streaming_content).decode()
+        [row] = csv.DictReader(io.StringIO(content))
+        self.assertEqual(row['title'], '\'=HYPERLINK("http://example.com","open")')
+        self.assertEqual((row['abstract'], row['authors'], row['adviser']), ("'-", "'@Author", "'+63 912"))
+        self.assertEqual(row['year_submitted'], '1990')
+
+        # import_theses reads the original values back.
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'catalog.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            handle.write(content)
+        [(_, record)] = importer.read_records(path)
+        self.assertEqual(record['title'], '=HYPERLINK("http://example.com","open")')
+        self.assertEqual((record['abstract'], record['authors'], record['adviser']), ('-', '@Author', '+63 912'))
+
+    def test_export_command(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'catalog.jsonl')
+        output = io.StringIO()
+        call_command('export_theses', path, filters='year=2003', stdout=output)
+        expected = Thesis.objects.filter(year_submitted=2003).count()
+        self.assertIn(f'Exported {expected} theses', output.getvalue())
+        with open(path, encoding='utf-8') as handle:
+            self.assertEqual(sum(1 for _ in handle), expected)
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, headers={'If-None-Match': response['ETag']})
+
+    def test_listing_revalidates_until_the_catalog_changes(self):
+        url = reverse('theses')
+        response = self.client.get(url)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(self.revalidate(url, response, tag=self.tag.name).status_code, 200)
+
+        self.thesis.title = 'Retitled'
+        self.thesis.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_validators_are_per_user(self):
+        url = reverse('home')
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.client.force_login(User.objects.get(username='author'))
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_detail_revalidates_until_the_thesis_changes(self):
+        url = reverse('thesis_detail', args=[self.thesis.pk])
+        response = self.client.get(url)
+        # Repeat views by the same user are deduplicated, so the count shown stays the same.
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.thesis.tags.add(Tag.objects.create(name='Quantum Computing'))
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_pending_messages_are_always_rendered(self):
+        url = reverse('theses')
+        response = self.client.get(url)
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.client.post(reverse('thesis_upload'), {
+            'title': 'Fresh upload', 'abstract': '-', 'authors': 'A. Author', 'year_submitted': 2024,
+            'college': self.thesis.college_id, 'program': self.thesis.program_id,
+            'pdf_file': SimpleUploadedFile('fresh.pdf', b'%PDF-1.4\n%%EOF\n'),
+        })
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertContains(response, 'Thesis uploaded successfully.')
+        # Not cacheable: a revalidation must not bring the message back.
+        self.assertNotIn('ETag', response)
+        self.assertIn('ETag', self.client.get(url))
+
+
+class StatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+
+    def test_counters_follow_creates_and_deletes(self):
+        before = get_site_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            college = College.objects.create(college_name='College of Testing')
+            program = Program.objects.create(prog_name='BS Testing', college=college)
+            tag = Tag.objects.create(name='stats-tag')
+            thesis = Thesis.objects.create(title='Counting things', abstract='-', authors='A. Author',
+                                           year_submitted=2024, uploaded_by=self.user, college=college, program=program)
+        with self.assertNumQueries(1):
+            after = get_site_stats()
+        self.assertEqual({name: after[name] - before[name] for name in after},
+                         {'thesis_count': 1, 'college_count': 1, 'program_count': 1, 'tag_count': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            thesis.delete()
+            tag.delete()
+        self.assertEqual(get_site_stats(), {**after, 'thesis_count': before['thesis_count'], 'tag_count': before['tag_count']})
+
+    def test_adjust_waits_for_commit(self):
+        before = get_site_stats()['tag_count']
+        with self.captureOnCommitCallbacks() as callbacks:
+            Tag.objects.create(name='stats-tag')
+        self.assertEqual(get_site_stats()['tag_count'], before)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_site_stats()['tag_count'], before + 1)
+
+    def test_reconcile_stats_fixes_drift(self):
+        actual = get_site_stats()
+        cache.set(stats._key('tag_count'), 999, None)
+        cache.delete(stats._key('college_count'))
+        out = io.StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn(f"tag_count: 999 -> {actual['tag_count']}", out.getvalue())
+        self.assertIn(f"college_count: {actual['college_count']} (was not cached)", out.getvalue())
+        self.assertIn(f"thesis_count: {actual['thesis_count']}\n", out.getvalue())
+        self.assertEqual(get_site_stats(), actual)
+
+
+@mock.patch.object(semantic_scholar, '_client', None)
+class JobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        program = Program.objects.create(prog_name='BS Testing', college=College.objects.create(college_name='College'))
+        cls.thesis = Thesis.objects.create(title='Flood risk mapping in Iloilo', abstract='-', authors='A. Author',
+                                           year_submitted=2024, uploaded_by=cls.user, college=program.college, program=program)
+
+    def stub_api(self, **kwargs):
+        return mock.patch.object(semantic_scholar.SemanticScholarClient, '_request', **kwargs)
+
+    def test_lookup_runs_in_the_worker(self):
+        job = jobs.enqueue('lookup_paper_id', thesis_id=self.thesis.pk)
+        with self.stub_api(return_value={'data': [{'paperId': 'ss-123'}]}) as request:
+            self.assertEqual(jobs.run_pending(), (1, 0))
+        self.assertEqual(request.call_args.kwargs['params']['query'], self.thesis.title)
+        self.thesis.refresh_from_db()
+        self.assertEqual(self.thesis.ss_paper_id, 'ss-123')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_DONE, 1))
+
+    @override_settings(JOB_QUEUE={'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 30, 'BACKOFF_MAX': 3600})
+    def test_failures_back_off_then_die(self):
+        job = jobs.enqueue('lookup_paper_id', thesis_id=self.thesis.pk)
+        failing = self.stub_api(side_effect=semantic_scholar.SemanticScholarError('429 Too Many Requests'))
+        with failing:
+            self.assertEqual(jobs.run_pending(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_PENDING, 1))
+        # 30 seconds, give or take the 20% jitter.
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=20))
+        self.assertIn('429 Too Many Requests', job.last_error)
+        with failing:
+            self.assertEqual(jobs.run_pending(), (0, 0))
+
+        Job.objects.update(run_at=timezone.now())
+        with failing:
+            self.assertEqual(jobs.run_pending(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_DEAD, 2))
+        self.assertIsNone(Thesis.objects.get(pk=self.thesis.pk).ss_paper_id)
+
+    def test_requeues_jobs_of_crashed_workers(self):
+        job = jobs.enqueue('lookup_paper_id', thesis_id=self.thesis.pk)
+        self.assertEqual([claimed.pk for claimed in jobs.claim(5)], [job.pk])
+        self.assertEqual(jobs.claim(5), [])
+        self.assertEqual(jobs.requeue_stale(), 0)
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get().status, Job.STATUS_PENDING)
+
+    def test_admin_retries_dead_jobs(self):
+        job = jobs.enqueue('lookup_paper_id', thesis_id=self.thesis.pk)
+        Job.objects.update(status=Job.STATUS_DEAD, attempts=5, run_at=timezone.now() + timedelta(days=1))
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'password'))
+        response = self.client.post(reverse('admin:thesis_job_changelist'), {
+            'action': 'retry_jobs', '_selected_action': [job.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_PENDING, 0))
+        self.assertLessEqual(job.run_at, timezone.now())
+
+
+@mock.patch.object(semantic_scholar, '_client', None)
+class SemanticScholarTests(TestCase):
+    def stub_api(self, **kwargs):
+        return mock.patch.object(semantic_scholar.SemanticScholarClient, '_request', **kwargs)
+
+    def age(self, key, seconds):
+        """Makes the cached entry under ``key`` look ``seconds`` old."""
+        entry = cache.get(key)
+        entry['fetched_at'] -= seconds
+        cache.set(key, entry)
+
+    def test_get_papers_batches_the_ids(self):
+        ids = [f'p{number}' for number in range(1200)] + ['p0', 'p1']
+
+        def answer(method, url, params, json):
+            return [None if ss_id == 'p7' else {'paperId': ss_id} for ss_id in json['ids']]
+
+        with self.stub_api(side_effect=answer) as request:
+            papers = semantic_scholar.get_papers(ids, fields='paperId')
+        self.assertEqual([len(call.kwargs['json']['ids']) for call in request.call_args_list], [500, 500, 200])
+        self.assertTrue(all(call.args[0] == 'POST' and call.args[1].endswith('/paper/batch') for call in request.call_args_list))
+        self.assertEqual(len(papers), 1200)
+        self.assertIsNone(papers['p7'])
+        self.assertEqual(papers['p1199'], {'paperId': 'p1199'})
+
+    @override_settings(SEMANTIC_SCHOLAR_CONFIG={'TIMEOUT': 4, 'RETRIES': 2, 'POOL_SIZE': 6, 'API_KEY': 'secret'})
+    def test_client_retries_rate_limits_over_one_pool(self):
+        client = semantic_scholar.get_client()
+        self.assertIs(semantic_scholar.get_client(), client)
+        self.assertEqual(client.session.headers['x-api-key'], 'secret')
+        adapter = client.session.get_adapter(semantic_scholar.SS_API_BASE_URL)
+        retry = adapter.max_retries
+        self.assertEqual(retry.total, 2)
+        self.assertIn(429, retry.status_forcelist)
+        self.assertIn('POST', retry.allowed_methods)
+        self.assertTrue(retry.respect_retry_after_header)
+        self.assertEqual(adapter._pool_maxsize, 6)
+        self.assertEqual(client.timeout, 4)
+
+    @override_settings(SEMANTIC_SCHOLAR_CONFIG={
+        'CACHE_TTL': 3600, 'CACHE_STALE_TTL': 7200, 'NEGATIVE_CACHE_TTL': 60, 'REVALIDATE_IN_BACKGROUND': False,
+    })
+    def test_stale_results_are_served_while_revalidating(self):
+        key = semantic_scholar._cache_key('recommendations', 'ss-1')
+        with self.stub_api(return_value={'recommendedPapers': [{'title': 'First'}]}) as request:
+            self.assertEqual(semantic_scholar.get_cached_recommendations('ss-1'), [{'title': 'First'}])
+            self.assertEqual(semantic_scholar.get_cached_recommendations('ss-1'), [{'title': 'First'}])
+        self.assertEqual(request.call_count, 1)
+
+        self.age(key, 3601)
+        with self.stub_api(return_value={'recommendedPapers': [{'title': 'Second'}]}):
+            # The stale answer goes out now; the refresh is stored for the next request.
+            self.assertEqual(semantic_scholar.get_cached_recommendations('ss-1'), [{'title': 'First'}])
+        self.assertEqual(semantic_scholar.get_cached_recommendations('ss-1'), [{'title': 'Second'}])
+
+        # A failed refresh keeps the stale entry.
+        self.age(key, 3601)
+        with self.stub_api(side_effect=semantic_scholar.SemanticScholarError('503')):
+            self.assertEqual(semantic_scholar.get_cached_recommendations('ss-1'), [{'title': 'Second'}])
+        self.assertEqual(cache.get(key)['value'], [{'title': 'Second'}])
+
+    @override_settings(SEMANTIC_SCHOLAR_CONFIG={
+        'CACHE_TTL': 3600, 'CACHE_STALE_TTL': 7200, 'NEGATIVE_CACHE_TTL': 60, 'REVALIDATE_IN_BACKGROUND': False,
+    })
+    def test_misses_are_cached_briefly_and_errors_not_at_all(self):
+        with self.stub_api(side_effect=semantic_scholar.SemanticScholarError('timeout')) as request:
+            self.assertIsNone(semantic_scholar.get_cached_paper_id('Unknown Thesis'))
+            self.assertIsNone(semantic_scholar.get_cached_paper_id('Unknown Thesis'))
+        self.assertEqual(request.call_count, 2)
+
+        with self.stub_api(return_value={'data': []}) as request:
+            self.assertIsNone(semantic_scholar.get_cached_paper_id('Unknown  thesis'))
+            self.assertIsNone(semantic_scholar.get_cached_paper_id('unknown thesis'))
+        self.assertEqual(request.call_count, 1)
+
+        # "Not found" goes stale after NEGATIVE_CACHE_TTL, long before CACHE_TTL.
+        self.age(semantic_scholar._cache_key('lookup', 'unknown thesis'), 61)
+        with self.stub_api(return_value={'data': [{'paperId': 'ss-9'}]}):
+            semantic_scholar.get_cached_paper_id('Unknown Thesis')
+        self.assertEqual(semantic_scholar.get_cached_paper_id('Unknown Thesis'), 'ss-9')
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep: sleeping just moves the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class BackfillTests(TestCase):
+    command = 'thesis.management.commands.backfill_ss_ids'
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        program = Program.objects.create(prog_name='BS Testing', college=College.objects.create(college_name='College'))
+        cls.theses = [
+            Thesis.objects.create(title=f'Backfill thesis {number}', abstract='-', authors='A. Author', year_submitted=2024,
+                                  uploaded_by=user, college=program.college, program=program)
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        self.checkpoint = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'checkpoint')
+
+    def backfill(self, lookup, **options):
+        output = io.StringIO()
+        options = {'checkpoint': self.checkpoint, 'rps': 1000, 'concurrency': 2, **options}
+        with mock.patch(f'{self.command}.search_paper_id', side_effect=lookup) as search:
+            call_command('backfill_ss_ids', stdout=output, **options)
+        return search, output.getvalue()
+
+    def stored(self):
+        return list(Thesis.objects.order_by('pk').values_list('ss_paper_id', flat=True))
+
+    def test_token_bucket_spaces_out_requests(self):
+        clock = FakeClock()
+        with mock.patch(f'{self.command}.time', clock):
+            bucket = TokenBucket(rate=2)
+            for _ in range(6):
+                bucket.acquire()
+        # A burst of two, then one token every half second.
+        self.assertEqual(sum(clock.sleeps), 2.0)
+        self.assertTrue(all(wait <= 0.5 for wait in clock.sleeps))
+
+    def test_resumes_from_the_checkpoint(self):
+        def lookup(title):
+            if title == 'Backfill thesis 2':
+                raise RuntimeError('interrupted')
+            return f'ss-{title[-1]}'
+
+        with self.assertRaises(RuntimeError):
+            self.backfill(lookup, batch_size=1, concurrency=1)
+        self.assertEqual(self.stored(), ['ss-0', 'ss-1', None, None])
+        with open(self.checkpoint) as handle:
+            self.assertEqual(json.load(handle), {'last_id': self.theses[1].pk})
+
+        search, output = self.backfill(lambda title: f'ss-{title[-1]}', batch_size=1)
+        self.assertIn(f'Resuming after thesis #{self.theses[1].pk}', output)
+        self.assertEqual(sorted(call.args[0] for call in search.call_args_list), ['Backfill thesis 2', 'Backfill thesis 3'])
+        self.assertEqual(self.stored(), ['ss-0', 'ss-1', 'ss-2', 'ss-3'])
+        # A finished run starts over next time.
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_dry_run_saves_nothing(self):
+        _, output = self.backfill(lambda title: f'ss-{title[-1]}', dry_run=True, batch_size=2)
+        self.assertIn('Would save 4 IDs', output)
+        self.assertEqual(self.stored(), [None] * 4)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_verify_clears_unknown_ids(self):
+        Thesis.objects.filter(pk=self.theses[0].pk).update(ss_paper_id='known')
+        Thesis.objects.filter(pk=self.theses[1].pk).update(ss_paper_id='gone')
+        papers = mock.patch(f'{self.command}.get_papers',
+                            side_effect=lambda ids, fields: {ss_id: {'paperId': ss_id} if ss_id == 'known' else None for ss_id in ids})
+        with papers:
+            _, output = self.backfill(lambda title: None, verify=True, dry_run=True)
+        self.assertIn('1 no longer resolve and would be cleared', output)
+        self.assertEqual(self.stored()[:2], ['known', 'gone'])
+        with papers:
+            _, output = self.backfill(lambda title: None, verify=True)
+        self.assertIn('1 no longer resolve and were cleared', output)
+        self.assertEqual(self.stored()[:2], ['known', None])
+
+
+@mock.patch('thesis.tasks.search_paper_id', new=mock.Mock(return_value=None))
+class SimilarityTests(TestCase):
+    TOPICS = [
+        ('Crop yield prediction with satellite imagery', 'Rice crop yield forecasting from satellite imagery and rainfall.'),
+        ('Satellite imagery for rice crop monitoring', 'Monitoring rice paddies and crop yield with satellite imagery.'),
+        ('Blockchain voting for student elections', 'A blockchain ledger for transparent student council voting.'),
+        ('Student election voting on a blockchain', 'Secure voting ledger for student elections using blockchain.'),
+        ('Dengue outbreak mapping', 'Mapping dengue cases and mosquito breeding sites across barangays.'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        program = Program.objects.create(prog_name='BS Testing', college=College.objects.create(college_name='College'))
+        cls.theses = [
+            Thesis.objects.create(title=title, abstract=abstract, authors='A. Author', year_submitted=2024,
+                                  uploaded_by=cls.user, college=program.college, program=program)
+            for title, abstract in cls.TOPICS
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def neighbours(self, thesis):
+        return [entry.similar_id for entry in SimilarThesis.objects.filter(thesis=thesis).order_by('rank')]
+
+    def test_rebuild_pairs_theses_on_the_same_topic(self):
+        crops, satellite, voting, election, dengue = self.theses
+        similarity.rebuild()
+        self.assertEqual(self.neighbours(crops)[0], satellite.pk)
+        self.assertEqual(self.neighbours(voting)[0], election.pk)
+        self.assertNotIn(dengue.pk, self.neighbours(crops))
+
+    def test_upload_updates_neighbours_through_the_queue(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        similarity.rebuild()
+        program = self.theses[0].program
+        response = self.client.post(reverse('thesis_upload'), {
+            'title': 'Dengue case mapping with mosquito surveillance',
+            'abstract': 'Dengue outbreak mapping from mosquito breeding sites and reported cases.',
+            'authors': 'B. Author', 'year_submitted': 2025,
+            'college': program.college.pk, 'program': program.pk,
+            'pdf_file': SimpleUploadedFile('dengue.pdf', b'%PDF-1.4\n%%EOF\n', content_type='application/pdf'),
+        })
+        self.assertEqual(response.status_code, 302)
+        jobs.run_pending()
+
+        new = Thesis.objects.get(title__startswith='Dengue case')
+        dengue = self.theses[4]
+        self.assertEqual(self.neighbours(new)[0], dengue.pk)
+        self.assertEqual(self.neighbours(dengue)[0], new.pk)
+
+    def test_detail_shows_similar_theses(self):
+        similarity.rebuild()
+        crops, satellite = self.theses[:2]
+        response = self.client.get(reverse('thesis_detail', args=[crops.pk]))
+        self.assertEqual(response.context['similar_theses'][0], satellite)
+        view_counter.flush()
+
+
+class PdfDeliveryTests(TestCase):
+    CONTENT = b'%PDF-1.4\n' + bytes(range(256)) * 40 + b'\n%%EOF\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        program = Program.objects.create(prog_name='BS Testing', college=College.objects.create(college_name='College'))
+        cls.thesis = Thesis.objects.create(title='Scanned manuscript', abstract='-', authors='A. Author', year_submitted=2024,
+                                           uploaded_by=cls.user, college=program.college, program=program)
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.thesis.pdf_file.save('manuscript.pdf', SimpleUploadedFile('manuscript.pdf', self.CONTENT))
+        self.url = reverse('thesis_pdf', args=[self.thesis.pk])
+        self.client.force_login(self.user)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_streams_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('inline', response['Content-Disposition'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[100:200])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[-10:])
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.CONTENT)}-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_ranges_of_an_empty_file(self):
+        self.assertIs(file_serving.parse_range('bytes=-10', 0), False)
+        self.assertIs(file_serving.parse_range('bytes=0-', 0), False)
+        self.thesis.pdf_file.save('empty.pdf', SimpleUploadedFile('empty.pdf', b''))
+        response = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+        response = self.client.get(self.url)
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, b''))
+
+    def test_conditional_requests(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        # A stale If-Range means the client's copy changed: send the whole file.
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PDF_DELIVERY={'SENDFILE_BACKEND': 'x-accel-redirect', 'ACCEL_REDIRECT_PREFIX': '/protected/'})
+    def test_accel_redirect_handoff(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.thesis.pdf_file.name)
+        self.assertEqual(response.content, b'')
+
+
+class PdfTextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        program = Program.objects.create(prog_name='BS Testing', college=College.objects.create(college_name='College'))
+        cls.thesis = Thesis.objects.create(title='Coastal ecology', abstract='Field notes.', authors='A. Author',
+                                           year_submitted=2024, uploaded_by=cls.user, college=program.college, program=program)
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        pages = [f'Chapter {number} survey notes' for number in range(1, 46)]
+        pages[41] = 'Mangrove carbon sequestration estimates'
+        self.thesis.pdf_file.save('ecology.pdf', SimpleUploadedFile('ecology.pdf', make_pdf(pages)))
+        self.client.force_login(self.user)
+
+    def test_extracts_every_page(self):
+        self.assertEqual(pdf_text.extract(self.thesis.pk), 45)
+        self.assertEqual(ThesisPage.objects.get(thesis=self.thesis, page_number=42).text,
+                         'Mangrove carbon sequestration estimates')
+
+    def test_body_matches_link_to_the_page(self):
+        pdf_text.extract(self.thesis.pk)
+        self.assertEqual(search.search_thesis_ids('mangrove'), [self.thesis.pk])
+
+        response = self.client.get(reverse('theses'), {'q': 'mangrove'})
+        thesis = response.context['page_obj'].object_list[0]
+        self.assertEqual(thesis.page_hit[0], 42)
+        self.assertContains(response, f"{reverse('thesis_pdf', args=[self.thesis.pk])}#page=42")
+        view_counter.flush()
+
+    def test_reextraction_and_delete_keep_the_index_in_sync(self):
+        pdf_text.extract(self.thesis.pk)
+        pdf_text.extract(self.thesis.pk)
+        self.assertEqual(ThesisPage.objects.filter(thesis=self.thesis).count(), 45)
+        self.assertEqual(search.search_thesis_ids('mangrove'), [self.thesis.pk])
+
+        self.thesis.delete()
+        self.assertEqual(search.search_thesis_ids('mangrove'), [])
+        with connection.cursor() as cursor:
+            # An external-content FTS5 index left with stale rows fails its integrity check.
+            cursor.execute("INSERT INTO thesis_page_search (thesis_page_search) VALUES ('integrity-check')")
+
+
+@override_settings(CHUNKED_UPLOADS={'MAX_CHUNK_SIZE': 1000})
+class ChunkedUploadTests(TestCase):
+    CONTENT = b'%PDF-1.4\n' + bytes(range(256)) * 10 + b'\n%%EOF\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', 'uploader@example.com', 'password')
+        cls.program = Program.objects.create(prog_name='BS Testing', college=College.objects.create(college_name='College'))
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.client.force_login(self.user)
+
+    def start(self, **extra):
+        response = self.client.post(reverse('upload_start'), {'filename': 'scan.pdf', 'size': len(self.CONTENT), **extra})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, state, offset, data, checksum=None):
+        return self.client.put(state['url'], data, content_type='application/octet-stream', headers={
+            'Upload-Offset': str(offset),
+            'Upload-Checksum': checksum or hashlib.sha256(data).hexdigest(),
+        })
+
+    def test_resumable_upload_is_attached_by_the_form(self):
+        state = self.start(sha256=hashlib.sha256(self.CONTENT).hexdigest())
+        self.assertEqual(self.put(state, 0, self.CONTENT[:1000]).json()['offset'], 1000)
+        # A corrupted chunk is rejected and the offset stays put.
+        response = self.put(state, 1000, self.CONTENT[1000:2000], checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 1000)
+        # A client resuming from the wrong place is told where to carry on.
+        response = self.put(state, 2000, self.CONTENT[2000:])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 1000))
+
+        self.assertEqual(self.client.get(state['url']).json()['offset'], 1000)
+        self.put(state, 1000, self.CONTENT[1000:2000])
+        self.assertEqual(self.client.post(state['complete_url']).status_code, 409)
+        self.put(state, 2000, self.CONTENT[2000:])
+        self.assertTrue(self.client.post(state['complete_url']).json()['completed'])
+        part = chunked_upload.part_path(UploadSession.objects.get())
+
+        response = self.client.post(reverse('thesis_upload'), {
+            'title': 'Scanned thesis', 'abstract': '-', 'authors': 'A. Author', 'year_submitted': 2024,
+            'college': self.program.college.pk, 'program': self.program.pk, 'upload_token': state['upload_id'],
+        })
+        self.assertEqual(response.status_code, 302)
+        thesis = Thesis.objects.get(title='Scanned thesis')
+        with thesis.pdf_file.open('rb') as pdf:
+            self.assertEqual(pdf.read(), self.CONTENT)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(part))
+        self.assertTrue(Job.objects.filter(name='extract_pdf_text', payload={'thesis_id': thesis.pk}).exists())
+
+    def test_whole_file_checksum_and_pdf_header_are_checked(self):
+        state = self.start(sha256='0' * 64)
+        for offset in range(0, len(self.CONTENT), 1000):
+            self.put(state, offset, self.CONTENT[offset:offset + 1000])
+        self.assertEqual(self.client.post(state['complete_url']).status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+        response = self.client.post(reverse('upload_start'), {'filename': 'notes.txt', 'size': 10})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sessions_belong_to_their_user(self):
+        state = self.start()
+        self.client.force_login(User.objects.create_user('other', 'other@example.com', 'password'))
+        self.assertEqual(self.put(state, 0, self.CONTENT[:1000]).status_code, 404)
+
+        response = self.client.post(reverse('thesis_upload'), {
+            'title': 'Borrowed scan', 'abstract': '-', 'authors': 'A. Author', 'year_submitted': 2024,
+            'college': self.program.college.pk, 'program': self.program.pk, 'upload_token': state['upload_id'],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('upload_token', response.context['form'].errors)
+
+    def test_abandoned_uploads_expire(self):
+        state = self.start()
+        self.put(state, 0, self.CONTENT[:1000])
+        UploadSession.objects.update(date_modified=timezone.now() - timedelta(days=2))
+        session_path = chunked_upload.part_path(UploadSession.objects.get())
+        self.assertEqual(chunked_upload.purge_expired(), 1)
+        self.assertFalse(os.path.exists(session_path))
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('archivist', 'archivist@example.com', 'password')
+        cls.existing = Tag.objects.create(name='Hydrology')
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_csv_import_in_batches(self):
+        rows = ['title,abstract,authors,year_submitted,college,program,tags']
+        rows += [
+            f'River study {i},Sediment transport,Author {i},{2010 + i % 5},College of Science,'
+            f'BS {"Biology" if i % 2 else "Geology"},Hydrology;Field work {i % 3}'
+            for i in range(25)
+        ]
+        rows.append(',No title,Author,2020,College of Science,BS Biology,')
+        path = self.write('catalog.csv', '\n'.join(rows) + '\n')
+        output, errors = io.StringIO(), io.StringIO()
+        colleges, programs, tags = College.objects.count(), Program.objects.count(), Tag.objects.count()
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_theses', path, uploader='archivist', batch_size=10, stdout=output, stderr=errors)
+
+        self.assertIn('Imported 25 theses', output.getvalue())
+        self.assertIn('1 skipped', output.getvalue())
+        self.assertIn('Line 27: missing title', errors.getvalue())
+        # Lookups and inserts are per batch (three here), never per row.
+        self.assertLess(len(queries), 60)
+
+        # "College of Science" is seeded by a migration and is reused, not duplicated.
+        self.assertEqual(College.objects.count(), colleges)
+        self.assertEqual(Program.objects.count(), programs + 2)
+        self.assertEqual(Tag.objects.count(), tags + 3)
+        thesis = Thesis.objects.get(title='River study 4')
+        self.assertEqual(thesis.program.prog_name, 'BS Geology')
+        tag_ids = set(thesis.tags.values_list('pk', flat=True))
+        self.assertIn(self.existing.pk, tag_ids)
+        self.assertEqual(set(tagging.decode(thesis.tag_ids)), tag_ids)
+        self.assertEqual(len(search.search_thesis_ids('sediment', limit=100)), 25)
+        self.assertEqual(get_site_stats()['thesis_count'], 25)
+
+    def test_jsonl_import_with_pdfs(self):
+        pdf_dir = os.path.join(self.directory, 'pdfs')
+        os.mkdir(pdf_dir)
+        with open(os.path.join(pdf_dir, 'delta.pdf'), 'wb') as handle:
+            handle.write(make_pdf(['Delta morphology']))
+        records = [
+            {'title': 'Delta morphology', 'authors': 'B. Author', 'year_submitted': 2021, 'college': 'College',
+             'program': 'BS Geology', 'tags': ['Deltas'], 'pdf': 'delta.pdf', 'panel_score': 92.5},
+            {'title': 'Missing scan', 'authors': 'C. Author', 'year_submitted': 2022, 'college': 'College',
+             'program': 'BS Geology', 'pdf': 'missing.pdf'},
+        ]
+        path = self.write('catalog.jsonl', '\n'.join(json.dumps(record) for record in records) + '\n{broken\n')
+        errors = io.StringIO()
+
+        call_command('import_theses', path, uploader='archivist', pdf_dir=pdf_dir, stdout=io.StringIO(), stderr=errors)
+
+        thesis = Thesis.objects.get()
+        self.assertEqual(thesis.panel_score, 92.5)
+        self.assertTrue(default_storage.exists(thesis.pdf_file.name))
+        self.assertIn("PDF 'missing.pdf' not found", errors.getvalue())
+        self.assertIn('Line 3: invalid JSON', errors.getvalue())
+        self.assertEqual(
+            sorted(Job.objects.values_list('name', flat=True)), ['extract_pdf_text', 'render_thumbnails']
+        )
+
+    def test_bad_records_are_skipped_one_at_a_time(self):
+        pdf_dir = os.path.join(self.directory, 'pdfs')
+        os.mkdir(pdf_dir)
+        for name in ('good.pdf', 'bad.pdf'):
+            with open(os.path.join(pdf_dir, name), 'wb') as handle:
+                handle.write(make_pdf([name]))
+        record = {'authors': 'D. Author', 'year_submitted': 2023, 'college': 'College', 'program': 'BS Geology'}
+        lines = [
+            json.dumps({**record, 'title': 'Good scan', 'pdf': 'good.pdf'}),
+            json.dumps({**record, 'title': 'Unreadable scan', 'pdf': 'bad.pdf'}),
+            json.dumps(['not', 'an', 'object']),
+            'null',
+            json.dumps({**record, 'title': 'Odd tags', 'tags': 5}),
+            json.dumps({**record, 'title': 'No scan'}),
+        ]
+        path = self.write('catalog.jsonl', '\n'.join(lines) + '\n')
+        save = default_storage.save
+
+        def failing_save(storage, name, content, **kwargs):
+            if 'bad' in name:
+                raise OSError('No space left on device')
+            return save(name, content, **kwargs)
+
+        errors = io.StringIO()
+        with mock.patch('django.core.files.storage.FileSystemStorage.save', autospec=True, side_effect=failing_save):
+            call_command('import_theses', path, uploader='archivist', pdf_dir=pdf_dir, stdout=io.StringIO(), stderr=errors)
+
+        self.assertEqual(sorted(Thesis.objects.values_list('title', flat=True)), ['Good scan', 'No scan'])
+        self.assertIn("Line 2: could not copy PDF 'bad.pdf': No space left on device", errors.getvalue())
+        self.assertIn('Line 3: expected a JSON object, not list', errors.getvalue())
+        self.assertIn('Line 4: expected a JSON object, not NoneType', errors.getvalue())
+        self.assertIn('Line 5: tags must be a list of names', errors.getvalue())
+        self.assertTrue(default_storage.exists(Thesis.objects.get(title='Good scan').pdf_file.name))
+
+
+class SeedAndBenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_catalog', theses=300, colleges=3, programs=2, tags=40, users=5, batch_size=100,
+                     stdout=io.StringIO())
+
+    def test_seeded_catalog_shape(self):
+        seeded = Thesis.objects.filter(uploaded_by__username__startswith='seed')
+        self.assertEqual(seeded.count(), 300)
+        self.assertEqual(User.objects.filter(username__startswith='seed').count(), 5)
+        tag_use = Counter(pk for value in seeded.values_list('tag_ids', flat=True) for pk in tagging.decode(value))
+        # Zipf-shaped: the most used tag is on many more theses than the median one.
+        counts = sorted(tag_use.values(), reverse=True)
+        self.assertGreater(counts[0], 4 * counts[len(counts) // 2])
+        self.assertTrue(search.search_thesis_ids(seeded.first().title.split()[-1]))
+
+    def test_benchmark_report(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'report.json')
+        call_command('benchmark_views', output=path, requests=3, stdout=io.StringIO())
+        view_counter.flush()
+        with open(path, encoding='utf-8') as handle:
+            report = json.load(handle)
+
+        cases = {case['label']: case for case in report['cases']}
+        self.assertEqual(report['user'], 'seed1')
+        self.assertIn('upload_chunk', report['skipped'])
+        self.assertIn('skipped', cases['upload_start'])
+        for label in ('home', 'theses', 'thesis_detail', 'api:thesis_list', 'api:thesis_recommendations'):
+            self.assertEqual(cases[label]['statuses'], {'200': 3}, label)
+            self.assertIsNotNone(cases[label]['p99_ms'])
+        self.assertGreater(cases['theses']['avg_queries'], 0)
+        self.assertTrue(any(label.startswith('theses?tag=') for label in cases))
+
+
+@override_settings(
+    EMAIL_BACKEND='thesis.outbox.OutboxBackend',
+    EMAIL_OUTBOX={'BACKEND': 'django.core.mail.backends.locmem.EmailBackend', 'BATCH_SIZE': 2, 'MAX_ATTEMPTS': 2},
+)
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('forgetful', 'forgetful@example.com', 'password')
+
+    def test_reset_request_only_queues_the_email(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages') as send:
+            response = self.client.post(reverse('password_reset'), {'email': 'forgetful@example.com'})
+        self.assertRedirects(response, reverse('password_reset_verify'))
+        send.assert_not_called()
+        queued = OutboxEmail.objects.get()
+        self.assertEqual(queued.recipients, 'forgetful@example.com')
+        self.assertIn(self.client.session['reset_code'], queued.message['body'])
+
+        self.assertEqual(outbox.deliver_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(self.client.session['reset_code'], mail.outbox[0].body)
+        sent = OutboxEmail.objects.get()
+        self.assertEqual(sent.status, OutboxEmail.STATUS_SENT)
+        # The code doesn't outlive delivery.
+        self.assertEqual(sent.message, {})
+
+    def test_admin_hides_messages_from_staff(self):
+        send_mail('Reset', 'Your verification code is: 123456', None, ['forgetful@example.com'])
+        email = OutboxEmail.objects.get()
+        staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_outboxemail'))
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('admin:thesis_outboxemail_changelist')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:thesis_outboxemail_change', args=[email.pk])).status_code, 403)
+
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:thesis_outboxemail_change', args=[email.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '123456')
+
+    def test_batches_share_one_connection(self):
+        for number in range(5):
+            send_mail(f'Notice {number}', 'Body', None, [f'reader{number}@example.com'],
+                      html_message=f'<p>Notice {number}</p>')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as opened:
+            self.assertEqual(outbox.deliver_pending(), (5, 0))
+        # Batches of two: three connections for five messages.
+        self.assertEqual(opened.call_count, 3)
+        self.assertEqual(mail.outbox[4].alternatives[0][0], '<p>Notice 4</p>')
+
+    def test_failures_back_off_then_die(self):
+        send_mail('Reset', 'Code', None, ['forgetful@example.com'])
+        failing = mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                             side_effect=ConnectionError('provider down'))
+        with failing:
+            self.assertEqual(outbox.deliver_pending(), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.STATUS_PENDING)
+        self.assertGreater(email.run_at, timezone.now())
+        self.assertIn('provider down', email.last_error)
+        # Not due yet, so nothing is tried.
+        self.assertEqual(outbox.deliver_pending(), (0, 0))
+
+        OutboxEmail.objects.update(run_at=timezone.now())
+        with failing:
+            outbox.deliver_pending()
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.STATUS_DEAD)
+        self.assertEqual(mail.outbox, [])
+
+
+def make_scan(color) -> bytes:
+    """A one-page PDF holding a single page-sized image, like a scanned manuscript."""
+    output = io.BytesIO()
+    Image.new('RGB', (850, 1100), color).save(output, 'PDF')
+    return output.getvalue()
+
+
+def make_letterhead() -> bytes:
+    """A Letter-size page with only a small banner image near the top, like a title page logo."""
+    banner = io.BytesIO()
+    Image.new('RGB', (276, 76), 'red').save(banner, 'PDF')
+    writer = PdfWriter()
+    page = writer.add_blank_page(612, 792)
+    image = PdfReader(io.BytesIO(banner.getvalue())).pages[0]
+    page.merge_transformed_page(image, (1, 0, 0, 1, 300, 700))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+real_pdfium = renditions.pypdfium2
+
+
+@mock.patch.object(renditions, 'pypdfium2', None)
+class RenditionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        program = Program.objects.create(prog_name='BS Testing', college=College.objects.create(college_name='College'))
+        cls.thesis = Thesis.objects.create(title='Scanned field notes', abstract='-', authors='A. Author',
+                                           year_submitted=2024, uploaded_by=cls.user, college=program.college, program=program)
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.thesis.pdf_file.save('scan.pdf', SimpleUploadedFile('scan.pdf', make_scan('red')))
+        self.client.force_login(self.user)
+
+    def test_renders_every_width_from_the_page_scan(self):
+        key = renditions.generate(self.thesis.pk)
+        self.thesis.refresh_from_db()
+        self.assertEqual(self.thesis.thumbnail_key, key)
+        for width in renditions.widths():
+            with default_storage.open(renditions.file_name(self.thesis.pk, key, width)) as stored:
+                image = Image.open(stored)
+                self.assertEqual(image.width, width)
+                red, green, _ = image.convert('RGB').getpixel((width // 2, width // 2))
+                self.assertGreater(red, 200)
+                self.assertLess(green, 50)
+
+    def test_small_images_are_not_passed_off_as_the_page(self):
+        with io.BytesIO(make_letterhead()) as pdf:
+            self.assertIsNone(renditions._page_scan(pdf))
+            image = renditions.render_first_page(pdf, 'Letterhead', 320)
+        # The placeholder card, not the 276x76 banner.
+        self.assertEqual(image.size, (320, round(320 * renditions.PAGE_RATIO)))
+
+    def test_text_only_pdf_gets_a_placeholder(self):
+        self.thesis.pdf_file.save('text.pdf', SimpleUploadedFile('text.pdf', make_pdf(['Abstract'])))
+        key = renditions.generate(self.thesis.pk)
+        self.assertTrue(default_storage.exists(renditions.file_name(self.thesis.pk, key, 160)))
+
+    def test_thumbnails_are_served_with_long_lived_urls(self):
+        key = renditions.generate(self.thesis.pk)
+        url = reverse('thesis_thumbnail', args=[self.thesis.pk, key, 320])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={renditions.max_age()}', response['Cache-Control'])
+
+        self.thesis.refresh_from_db()
+        response = self.client.get(reverse('thesis_detail', args=[self.thesis.pk]))
+        self.assertContains(response, url)
+        view_counter.flush()
+
+        # A new PDF moves the thumbnails to new URLs and drops the old files.
+        self.thesis.pdf_file.save('scan.pdf', SimpleUploadedFile('scan.pdf', make_scan('blue')))
+        new_key = renditions.generate(self.thesis.pk)
+        self.assertNotEqual(new_key, key)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(default_storage.exists(renditions.file_name(self.thesis.pk, key, 320)))
+
+    @unittest.skipUnless(real_pdfium, 'pypdfium2 is not installed')
+    def test_pdfium_renders_the_whole_page(self):
+        with mock.patch.object(renditions, 'pypdfium2', real_pdfium), io.BytesIO(make_letterhead()) as pdf:
+            image = renditions.render_first_page(pdf, 'Letterhead', 306)
+        # Letter paper, mostly white, with the banner drawn near the top right.
+        self.assertEqual(image.size, (306, 396))
+        self.assertEqual(image.convert('RGB').getpixel((10, 380)), (255, 255, 255))
+        red, green, _ = image.convert('RGB').getpixel((160, 40))
+        self.assertGreater(red, 200)
+        self.assertLess(green, 50)
+
+    @unittest.skipUnless(real_pdfium, 'pypdfium2 is not installed')
+    def test_pdfium_renders_from_several_threads(self):
+        active = peak = 0
+        counter = threading.Lock()
+        document = real_pdfium.PdfDocument
+
+        def tracked(*args, **kwargs):
+            nonlocal active, peak
+            with counter:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.01)
+            with counter:
+                active -= 1
+            return document(*args, **kwargs)
+
+        pdfs = [make_letterhead(), make_scan('red'), make_pdf(['Abstract'])] * 8
+
+        def render(data):
+            with io.BytesIO(data) as pdf:
+                return renditions.render_first_page(pdf, 'Concurrent', 160).size
+
+        with mock.patch.object(renditions, 'pypdfium2', real_pdfium), \
+                mock.patch.object(real_pdfium, 'PdfDocument', side_effect=tracked), \
+                ThreadPoolExecutor(max_workers=8) as executor:
+            sizes = list(executor.map(render, pdfs))
+        self.assertEqual(peak, 1)
+        self.assertEqual(len(sizes), len(pdfs))
+        self.assertTrue(all(width == 160 for width, _ in sizes))
+
+    def test_backfill_command(self):
+        output = io.StringIO()
+        call_command('backfill_renditions', workers=1, stdout=output)
+        self.assertIn('Rendered thumbnails for 1 of 1 theses', output.getvalue())
+        self.thesis.refresh_from_db()
+        self.assertTrue(self.thesis.thumbnail_key)
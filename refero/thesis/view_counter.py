@@ -0,0 +1,107 @@
+"""
+Buffered thesis view counts.
+
+``thesis_detail`` used to run an UPDATE plus a refresh_from_db() on every
+page view. Views are now added to an in-process buffer and written to
+``Thesis.view_count`` in batches: whenever FLUSH_INTERVAL seconds have passed
+or FLUSH_THRESHOLD views are pending, and when the process exits. Pages show
+the persisted count plus this process's pending delta.
+
+Repeat views of the same thesis by the same user within DEDUPE_WINDOW seconds
+are not counted. The "seen" markers are kept in process memory too (at most
+DEDUPE_MAX_ENTRIES, oldest dropped first) rather than in the database cache,
+which would put a write back on every page view. The window therefore holds
+per worker: a user bounced between workers can count once on each.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+
+from thesis.models import Thesis
+
+logger = logging.getLogger(__name__)
+
+_pending = Counter()
+# {(thesis_id, user_id): monotonic expiry}, in expiry order since the window is fixed.
+_seen = OrderedDict()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _config(name, default):
+    return getattr(settings, 'VIEW_COUNTER', {}).get(name, default)
+
+
+def record_view(thesis_id: int, user_id: int | None = None) -> bool:
+    """Counts one view unless ``user_id`` already viewed the thesis recently. Returns True if counted."""
+    window = _config('DEDUPE_WINDOW', 30 * 60)
+    with _lock:
+        if user_id is not None and window:
+            now = time.monotonic()
+            limit = _config('DEDUPE_MAX_ENTRIES', 100000)
+            while _seen and (next(iter(_seen.values())) <= now or len(_seen) >= limit):
+                _seen.popitem(last=False)
+            if (thesis_id, user_id) in _seen:
+                return False
+            _seen[(thesis_id, user_id)] = now + window
+        _pending[thesis_id] += 1
+    return True
+
+
+def pending(thesis_id: int) -> int:
+    with _lock:
+        return _pending.get(thesis_id, 0)
+
+
+def flush_if_due() -> int:
+    """Flushes when FLUSH_INTERVAL has passed or FLUSH_THRESHOLD views are pending."""
+    with _lock:
+        due = (
+            sum(_pending.values()) >= _config('FLUSH_THRESHOLD', 100)
+            or time.monotonic() - _last_flush >= _config('FLUSH_INTERVAL', 30)
+        )
+    return flush() if due else 0
+
+
+def flush() -> int:
+    """Writes buffered views to the database, one UPDATE per distinct delta. Returns views written."""
+    global _last_flush
+    with _lock:
+        buffered = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    if not buffered:
+        return 0
+
+    by_delta = defaultdict(list)
+    for thesis_id, delta in buffered.items():
+        by_delta[delta].append(thesis_id)
+
+    try:
+        for delta, thesis_ids in by_delta.items():
+            Thesis.objects.filter(pk__in=thesis_ids).update(view_count=F('view_count') + delta)
+    except DatabaseError:
+        logger.exception("Could not flush %s buffered thesis views; keeping them for the next flush", sum(buffered.values()))
+        with _lock:
+            _pending.update(buffered)
+        return 0
+    return sum(buffered.values())
+
+
+def reset() -> None:
+    """Drops pending views and dedupe markers without writing them, e.g. between tests."""
+    global _last_flush
+    with _lock:
+        _pending.clear()
+        _seen.clear()
+        _last_flush = time.monotonic()
+
+
+atexit.register(flush)
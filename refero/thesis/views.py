@@ -2,22 +2,29 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
-from django.db.models import Q, F, Sum, Avg
-from django.http import HttpResponseForbidden
+from django.db.models import Avg, Max, Sum
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.views.decorators.http import require_http_methods, require_POST
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.views.generic.list import ListView
 
+from thesis import autocomplete, chunked_upload, conditional, export, facets, fragments, jobs, renditions, search, similarity, tag_postings, view_counter
+from thesis.facets import FacetFilter
+from thesis.file_serving import serve_file, serve_path
+from thesis.pagination import approximate_count, paginate_keyset
+from thesis.stats import get_site_stats
+from thesis.tag_postings import TagFilter
 from thesis.forms import ThesisUploadForm
-from thesis.models import Thesis, Program, College, Tag
+from thesis.models import Thesis, Program, College, SimilarThesis, Tag, UploadSession
 
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
 from django.conf import settings
 import random
-import requests
 
 def password_reset_request(request):
     if request.method == 'POST':
@@ -27,7 +34,8 @@ def password_reset_request(request):
             code = str(random.randint(100000, 999999))
             request.session['reset_code'] = code
             request.session['reset_email'] = email
-            
+
+            # Only queued here (EMAIL_BACKEND is the outbox); run_worker sends it.
             send_mail(
                 'Password Reset Verification Code',
                 f'Your verification code is: {code}',
@@ -84,121 +92,46 @@ class HomePageView(LoginRequiredMixin, ListView):
     paginate_by = 3 
 
 
-SS_API_BASE_URL = "https://api.semanticscholar.org/graph/v1"
-SS_RECOMMENDATIONS_URL = "https://api.semanticscholar.org/recommendations/v1/papers/forpaper/"
-
-def get_paper_id(title: str) -> str | None:
-    """Uses the /paper/search endpoint to find a paper's unique ID."""
-    search_url = f"{SS_API_BASE_URL}/paper/search"
-    
-    headers = {
-        'x-api-key': settings.SEMANTIC_SCHOLAR_CONFIG.get("API_KEY"),
-        'Content-Type': 'application/json'
-    }
-    
-    params = {
-        'query': title,
-        'fields': 'paperId',
-        'limit': 1 
-    }
-    
-    try:
-        response = requests.get(search_url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Check if results exist and return the first paperId
-        if data.get('data') and len(data['data']) > 0:
-            return data['data'][0].get('paperId')
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error during Semantic Scholar ID lookup for '{title}': {e}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred during ID lookup: {e}")
-        return None
-    return None
-
-def get_thesis_recommendations(thesis_title: str, ss_paper_id: str = None) -> list:
-    """
-    Fetches related paper recommendations using a two-step process: lookup and recommendation.
-    Uses stored ss_paper_id if available, otherwise looks it up by title.
-    """
-    paper_id = ss_paper_id
-    
-    if not paper_id:
-        paper_id = get_paper_id(thesis_title)
-    
-    if not paper_id:
-        print(f"No Semantic Scholar ID found for: {thesis_title}")
-        return []
-
-    recommendations_url = f"{SS_RECOMMENDATIONS_URL}{paper_id}"
-    
-    headers = {
-        'x-api-key': settings.SEMANTIC_SCHOLAR_CONFIG.get("API_KEY"),
-        'Content-Type': 'application/json'
-    }
-
-    params = {
-        'fields': 'title,authors.name,year,abstract',
-        'limit': 5
-    }
-
-    try:
-        response = requests.get(recommendations_url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        # The recommendations endpoint returns a list of papers under 'recommendedPapers'
-        return data.get('recommendedPapers', [])
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching recommendations for ID {paper_id}: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred during recommendation fetch: {e}")
-        return []
-
-
 def _build_thesis_queryset():
     """Reusable queryset with the relations we always display."""
     return Thesis.objects.select_related('college', 'program').prefetch_related('tags')
 
 
-def _get_site_stats():
-    return {
-        'thesis_count': Thesis.objects.count(),
-        'college_count': College.objects.count(),
-        'program_count': Program.objects.count(),
-        'tag_count': Tag.objects.count(),
-    }
+# Program logos under static/; programs without one get the Refero logo.
+PROGRAM_LOGOS = {
+    'BS Information Technology': 'images/SITE-LOGO.jpg',
+    'BS Computer Science': 'images/ACS-LOGO.png',
+}
+DEFAULT_PROGRAM_LOGO = 'images/Refero.png'
+
+# Edits to these fields change a thesis's TF-IDF vector.
+SIMILARITY_FIELDS = {'title', 'abstract', 'tags'}
+
+# Tags listed in the theses sidebar, picked by how many results carry them.
+SIDEBAR_TAG_LIMIT = 30
 
 
 @login_required
+@conditional.conditional_page()
 def frontend_home(request):
+    # Every program, with thesis counts from the in-memory facet snapshot.
     filterable_programs = [
-        {
-            'name': 'BS Information Technology',
-            'logo_url': 'images/SITE-LOGO.jpg',
-            'id': 'it',
-        },
-        {
-            'name': 'BS Computer Science',
-            'logo_url': 'images/ACS-LOGO.png',
-            'id': 'cs',
-        },
+        {**program, 'logo_url': PROGRAM_LOGOS.get(program['name'], DEFAULT_PROGRAM_LOGO)}
+        for program in facets.programs_with_counts(tag_postings.snapshot())
     ]
 
     active_program_name = request.GET.get('program') or None
 
-    featured_theses = _build_thesis_queryset().order_by('-date_added')
+    featured_theses = fragments.stubs(Thesis.objects.order_by('-date_added'))
     if active_program_name:
-        featured_theses = featured_theses.filter(program__prog_name=active_program_name)
+        # Resolve the name first so the (program, -date_added) index serves the listing.
+        featured_theses = featured_theses.filter(
+            program__in=Program.objects.filter(prog_name=active_program_name).values('pk')
+        )
 
-    featured_theses = featured_theses[:6]
+    # Cards are cached HTML; only the ones not cached yet load their relations and tags.
+    featured_theses = fragments.hydrate(featured_theses[:6], 'home_card', '', _build_thesis_queryset())
     context = {
-        'stats': _get_site_stats(),
         'featured_theses': featured_theses,
         'filterable_programs': filterable_programs,
         'active_program_name': active_program_name,
@@ -206,26 +139,94 @@ def frontend_home(request):
     return render(request, 'home.html', context)
 
 
-@login_required
-def frontend_theses(request):
-    query = request.GET.get('q', '').strip()
-    tag_filters = request.GET.getlist('tag')
-    base_qs = _build_thesis_queryset().order_by('-date_added')
+def _in_rank_order(queryset, ranked_ids):
+    """Fetches ``ranked_ids`` from ``queryset`` and returns them in the given order."""
+    theses = queryset.in_bulk(ranked_ids)
+    return [theses[pk] for pk in ranked_ids if pk in theses]
 
-    if query:
-        base_qs = base_qs.filter(
-            Q(title__icontains=query)
-            | Q(authors__icontains=query)
-            | Q(abstract__icontains=query)
-            | Q(tags__name__icontains=query)
-        ).distinct()
 
-    if tag_filters:
-        base_qs = base_qs.filter(tags__name__in=tag_filters).distinct()
+def _upload_views(request):
+    # "My Theses" shows view counts, which change without touching date_modified.
+    return Thesis.objects.filter(uploaded_by=request.user).aggregate(views=Sum('view_count'))['views']
 
-    paginator = Paginator(base_qs, 9)
+
+@login_required
+@conditional.conditional_page(_upload_views)
+def frontend_theses(request):
+    query = request.GET.get('q', '').strip()
+    tag_filter = TagFilter.from_params(request.GET)
+    facet_filter = FacetFilter.from_params(request.GET)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pages are found with lightweight rows; fragments.hydrate() then fills in the cards.
+    base_qs = fragments.stubs(Thesis.objects.all())
+    card_variant = fragments.query_variant(request)
+    postings = tag_postings.snapshot()
+    # Sorted ids matching the tag and facet filters, or None when neither is set.
+    filtered_ids = None
+    if tag_filter or facet_filter:
+        filtered_ids = tag_filter.thesis_ids(postings) if tag_filter else postings.all_ids
+        if facet_filter:
+            filtered_ids = facet_filter.narrow(postings, filtered_ids)
+
+    if query and search.is_supported():
+        matched_ids = search.search_thesis_ids(query)
+        if filtered_ids is not None:
+            allowed = set(filtered_ids)
+            matched_ids = [pk for pk in matched_ids if pk in allowed]
+        result_ids = sorted(matched_ids)
+
+        # Paginate the ranked ids, then load only the theses on this page.
+        paginator = Paginator(matched_ids, 9)
+        page_obj = paginator.get_page(page_number)
+        page_obj.object_list = fragments.hydrate(
+            _in_rank_order(base_qs, page_obj.object_list), 'card', card_variant, _build_thesis_queryset(),
+        )
+        total_count = paginator.count
+
+        # Where the query appears in each PDF on this page, for a link to that page.
+        hits = search.page_hits(query, [thesis.pk for thesis in page_obj.object_list])
+        for thesis in page_obj.object_list:
+            thesis.page_hit = hits.get(thesis.pk)
+    else:
+        if query:
+            base_qs = base_qs.filter(search.contains_q(query)).distinct()
+
+        by_id = tag_postings.id_filter(filtered_ids) if filtered_ids is not None else None
+        if by_id is not None:
+            # Few matches: page over the snapshot's exact ids by primary key.
+            base_qs = base_qs.filter(by_id)
+        else:
+            if tag_filter:
+                # Broad filter: the same filter over the denormalized Thesis.tag_ids, so no join or DISTINCT.
+                base_qs = base_qs.filter(tag_filter.tag_ids_q(postings))
+            if facet_filter:
+                base_qs = base_qs.filter(facet_filter.q())
+
+        # Newest first by (date_added, id): each page is an index range scan, not an OFFSET.
+        page_obj = paginate_keyset(base_qs, request.GET.get('cursor'), 9)
+        page_obj.object_list = fragments.hydrate(page_obj.object_list, 'card', card_variant, _build_thesis_queryset())
+        if query:
+            total_count = approximate_count(base_qs)
+            result_ids = sorted(base_qs.values_list('pk', flat=True))
+        elif filtered_ids is not None:
+            total_count = len(filtered_ids)
+            result_ids = filtered_ids
+        else:
+            total_count = get_site_stats()['thesis_count']
+            result_ids = None
+
+    # The most common tags among the results (plus any in use by the filter), listed by name.
+    tag_counts = tag_postings.facet_counts(postings, postings.tag_ids_by_name.values(), within=result_ids)
+    in_filter = set(tag_filter.required) | set(tag_filter.excluded)
+    available_tags = sorted(
+        (
+            {'name': name, 'facet_count': tag_counts[pk]}
+            for name, pk in postings.tag_ids_by_name.items()
+            if tag_counts[pk] or name in in_filter
+        ),
+        key=lambda tag: (tag['name'] not in in_filter, -tag['facet_count']),
+    )[:SIDEBAR_TAG_LIMIT]
+    available_tags.sort(key=lambda tag: tag['name'].lower())
 
     user_uploads = []
     if request.user.is_authenticated and not query:
@@ -233,30 +234,56 @@ def frontend_theses(request):
 
     context = {
         'page_obj': page_obj,
+        'total_count': total_count,
         'query': query,
-        'selected_tags': tag_filters,
-        'available_tags': Tag.objects.order_by('name')[:30],
+        'selected_tags': tag_filter.required,
+        'excluded_tags': tag_filter.excluded,
+        'tag_match': tag_filter.match,
+        'available_tags': available_tags,
+        'facets': facets.facet_groups(postings, facet_filter, within=result_ids),
+        'facet_filter': facet_filter,
         'user_uploads': user_uploads,
-        'stats': _get_site_stats(),
     }
     return render(request, 'theses.html', context)
 
 
+@login_required
+def theses_export(request, fmt):
+    """The theses page's results (same query string) as a CSV or JSON Lines download, streamed."""
+    if fmt not in export.CONTENT_TYPES:
+        raise Http404("Unknown export format.")
+    rows = export.encode(export.matching_theses(request.GET), fmt)
+    response = StreamingHttpResponse(rows, content_type=export.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export.file_name(fmt)}"'
+    return response
+
+
+@login_required
+def theses_autocomplete(request):
+    """Titles, authors and tags starting with ``q`` (at a word start), for the search box."""
+    query = request.GET.get('q', '').strip()[:100]
+    suggestions = autocomplete.suggest(query)
+    for item in suggestions['titles']:
+        item['url'] = reverse('thesis_detail', kwargs={'pk': item['id']})
+    return JsonResponse({'query': query, **suggestions})
+
+
 @login_required
 def frontend_upload(request):
     if request.method == 'POST':
-        form = ThesisUploadForm(request.POST, request.FILES)
+        form = ThesisUploadForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             thesis = form.save(commit=False)
             thesis.uploaded_by = request.user
             thesis.save()
             form.save_m2m()
 
-            # Part 2: Integrate Lookup into the Creation Logic
-            ss_id = get_paper_id(thesis.title)
-            if ss_id:
-                thesis.ss_paper_id = ss_id
-                thesis.save()
+            # The Semantic Scholar ID and similar theses are computed by the background worker.
+            jobs.enqueue('lookup_paper_id', thesis_id=thesis.pk)
+            jobs.enqueue('update_similar_theses', thesis_ids=[thesis.pk])
+            if thesis.pdf_file:
+                jobs.enqueue('extract_pdf_text', thesis_id=thesis.pk)
+                jobs.enqueue('render_thumbnails', thesis_id=thesis.pk)
 
             messages.success(request, 'Thesis uploaded successfully.')
             return redirect('theses')
@@ -265,10 +292,82 @@ def frontend_upload(request):
 
     return render(request, 'thesis_upload.html', {
         'form': form,
-        'stats': _get_site_stats(),
+        'chunk_size': chunked_upload.max_chunk_size(),
     })
 
 
+def _upload_state(session):
+    return {
+        'upload_id': str(session.pk),
+        'url': reverse('upload_chunk', args=[session.pk]),
+        'complete_url': reverse('upload_complete', args=[session.pk]),
+        'offset': session.received,
+        'size': session.size,
+        'completed': session.completed,
+    }
+
+
+def _upload_error(error):
+    return JsonResponse({'error': str(error)}, status=error.status)
+
+
+@login_required
+@require_POST
+def upload_start(request):
+    """Opens a chunked upload (see thesis/chunked_upload.py) from ``filename``, ``size`` and optional ``sha256``."""
+    try:
+        session = chunked_upload.start(
+            request.user,
+            request.POST.get('filename', ''),
+            int(request.POST.get('size') or 0),
+            request.POST.get('sha256', ''),
+        )
+    except ValueError:
+        return JsonResponse({'error': 'size must be a whole number of bytes.'}, status=400)
+    except chunked_upload.UploadError as e:
+        return _upload_error(e)
+    state = _upload_state(session)
+    state['chunk_size'] = chunked_upload.max_chunk_size()
+    return JsonResponse(state, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def upload_chunk(request, upload_id):
+    """GET reports the offset to resume from, PUT stores the next chunk and DELETE abandons the upload."""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method == 'DELETE':
+        chunked_upload.discard(session)
+        return HttpResponse(status=204)
+    if request.method == 'PUT':
+        try:
+            chunked_upload.write_chunk(
+                session,
+                int(request.headers.get('Upload-Offset', '')),
+                int(request.META.get('CONTENT_LENGTH') or 0),
+                request,
+                request.headers.get('Upload-Checksum', ''),
+            )
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset must be a whole number of bytes.'}, status=400)
+        except chunked_upload.UploadError as e:
+            # Tell the client where to carry on from.
+            session.refresh_from_db()
+            return JsonResponse({'error': str(e), **_upload_state(session)}, status=e.status)
+    return JsonResponse(_upload_state(session))
+
+
+@login_required
+@require_POST
+def upload_complete(request, upload_id):
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    try:
+        chunked_upload.complete(session)
+    except chunked_upload.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(_upload_state(session))
+
+
 @login_required
 def frontend_profile(request):
     uploads = _build_thesis_queryset().filter(uploaded_by=request.user).order_by('-date_added')
@@ -278,7 +377,6 @@ def frontend_profile(request):
     average_score = average_score_data['average_score']
     context = {
         'uploads': uploads,
-        'stats': _get_site_stats(),
         'total_views': total_views,
         'average_score': average_score,
     }
@@ -287,18 +385,48 @@ def frontend_profile(request):
 
 @login_required
 def thesis_detail(request, pk):
-    thesis = get_object_or_404(_build_thesis_queryset(), pk=pk)
-    Thesis.objects.filter(pk=pk).update(view_count=F('view_count') + 1)
-    thesis.refresh_from_db()
-    
-    recommendations = get_thesis_recommendations(thesis.title, thesis.ss_paper_id)
-    
+    # Tags are only read when the cached header and abstract fragment has to be rendered again.
+    thesis = get_object_or_404(Thesis.objects.select_related('college', 'program', 'uploaded_by'), pk=pk)
+    view_counter.record_view(thesis.pk, request.user.pk)
+    # Show the stored count plus views still waiting in this process's buffer.
+    thesis.view_count += view_counter.pending(thesis.pk)
+    view_counter.flush_if_due()
+
+    # The similar list is rewritten by the worker without touching the thesis.
+    similar_updated = SimilarThesis.objects.filter(thesis=thesis).aggregate(latest=Max('date_added'))['latest']
+    validators = conditional.Validators(
+        request, thesis.date_modified, thesis.view_count, similar_updated,
+        last_modified=max(thesis.date_modified, similar_updated or thesis.date_modified).timestamp(),
+    )
+    not_modified = validators.not_modified()
+    if not_modified is not None:
+        return not_modified
+
+    # Recommendations are fetched by the page from api:thesis_recommendations.
     context = {
         'thesis': thesis,
-        'stats': _get_site_stats(),
-        'recommendations': recommendations,
+        'similar_theses': similarity.similar_theses(thesis),
     }
-    return render(request, 'thesis_detail.html', context)
+    return validators.apply(render(request, 'thesis_detail.html', context))
+
+
+@login_required
+def thesis_pdf(request, pk):
+    thesis = get_object_or_404(Thesis.objects.only('pdf_file'), pk=pk)
+    if not thesis.pdf_file or not thesis.pdf_file.storage.exists(thesis.pdf_file.name):
+        raise Http404("This thesis has no PDF file.")
+    return serve_file(request, thesis.pdf_file, as_attachment='download' in request.GET)
+
+
+@login_required
+def thesis_thumbnail(request, pk, key, width):
+    thesis = get_object_or_404(Thesis.objects.only('thumbnail_key'), pk=pk)
+    name = renditions.file_name(pk, key, width)
+    # Only the current key is served, so a replaced PDF's old preview can't be fetched by guessing.
+    if key != thesis.thumbnail_key or width not in renditions.widths() or not default_storage.exists(name):
+        raise Http404("No such thumbnail.")
+    return serve_path(request, default_storage.path(name), content_type='image/jpeg',
+                      max_age=renditions.max_age(), immutable=True)
 
 
 @login_required
@@ -308,9 +436,22 @@ def thesis_edit(request, pk):
         return HttpResponseForbidden("You do not have permission to edit this thesis.")
 
     if request.method == 'POST':
-        form = ThesisUploadForm(request.POST, request.FILES, instance=thesis)
+        form = ThesisUploadForm(request.POST, request.FILES, instance=thesis, user=request.user)
         if form.is_valid():
-            form.save()
+            thesis = form.save(commit=False)
+            retitled = 'title' in form.changed_data
+            if retitled:
+                # The old ID belongs to the old title; the worker looks up a new one.
+                thesis.ss_paper_id = None
+            thesis.save()
+            form.save_m2m()
+            if retitled:
+                jobs.enqueue('lookup_paper_id', thesis_id=thesis.pk)
+            if SIMILARITY_FIELDS.intersection(form.changed_data):
+                jobs.enqueue('update_similar_theses', thesis_ids=[thesis.pk])
+            if form.replaces_pdf:
+                jobs.enqueue('extract_pdf_text', thesis_id=thesis.pk)
+                jobs.enqueue('render_thumbnails', thesis_id=thesis.pk)
             messages.success(request, 'Thesis updated successfully.')
             return redirect('profile')
     else:
@@ -319,7 +460,7 @@ def thesis_edit(request, pk):
     return render(request, 'thesis_edit.html', {
         'form': form,
         'thesis': thesis,
-        'stats': _get_site_stats(),
+        'chunk_size': chunked_upload.max_chunk_size(),
     })
 
 
@@ -330,11 +471,14 @@ def thesis_delete(request, pk):
         return HttpResponseForbidden("You do not have permission to delete this thesis.")
 
     if request.method == 'POST':
+        # Theses listing this one as similar lose a neighbour; the worker refills their lists.
+        neighbours_of = list(SimilarThesis.objects.filter(similar=thesis).values_list('thesis_id', flat=True))
         thesis.delete()
+        if neighbours_of:
+            jobs.enqueue('update_similar_theses', thesis_ids=neighbours_of)
         messages.success(request, 'Thesis deleted successfully.')
         return redirect('profile')
 
     return render(request, 'thesis_confirm_delete.html', {
         'thesis': thesis,
-        'stats': _get_site_stats(),
     })